@@ -0,0 +1,421 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pygame
+from pygame.locals import K_w
+
+from main import Game, RENDER_BACKENDS
+from headless import ScriptedKeys
+from level_file import export_levels
+from texture_cache import TextureCache
+from texture_registry import TextureRegistry, image_files
+from player import Player
+from player_batch import PlayerBatch
+import numpy as np
+from floating_island import FloatingIsland, transform_cube
+
+SEED = 1234
+LEVELS = (1, 2, 3, 4)
+PLATFORM_COUNTS = (10, 100, 1000, 10000)
+BOT_COUNTS = (10, 100, 1000)
+BOT_LEVEL = 4
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.25
+RENDER_FRAMES = 300
+RENDER_WARMUP_FRAMES = 20
+
+class Benchmark:
+    """A named benchmark; setup() builds its state and returns the callable to time."""
+
+    def __init__(self, name, setup):
+        self.name = name
+        self.setup = setup
+
+def time_rounds(func, rounds, min_time):
+    """Return ops/sec for each round, with the loop count calibrated once."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4 or number >= 1 << 20:
+            break
+        number *= 2
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+
+    results = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        results.append(number / elapsed)
+    return results
+
+def level_build_benchmarks():
+    benchmarks = []
+    for level in LEVELS:
+        def setup(level=level):
+            game = Game(headless=True, seed=SEED)
+            return lambda: game.build_level(level)
+        benchmarks.append(Benchmark(f"build_level[{level}]", setup))
+    return benchmarks
+
+def level_file_benchmarks():
+    benchmarks = []
+    for level in LEVELS:
+        def setup(level=level):
+            directory = tempfile.TemporaryDirectory()
+            export_levels(directory.name, SEED, [level])
+            game = Game(headless=True, seed=SEED, level_dir=directory.name)
+
+            def run():
+                # Holding the directory here keeps it alive while timing
+                return directory, game.build_level(level)
+            return run
+        benchmarks.append(Benchmark(f"build_level_from_file[{level}]", setup))
+    return benchmarks
+
+def update_benchmarks():
+    benchmarks = []
+    for level in LEVELS:
+        def setup(level=level):
+            game = Game(headless=True, seed=SEED, start_level=level)
+            return game.update
+        benchmarks.append(Benchmark(f"game_update[{level}]", setup))
+    return benchmarks
+
+def collision_benchmarks():
+    benchmarks = []
+    for count in PLATFORM_COUNTS:
+        def setup(count=count):
+            rng = random.Random(SEED)
+            side = max(1, int(count ** 0.5))
+            platforms = [[(i % side) * 2.0 + rng.uniform(-0.2, 0.2),
+                          rng.uniform(-0.5, 0.5),
+                          (i // side) * 2.0 + rng.uniform(-0.2, 0.2)] for i in range(count)]
+            player = Player([side * 0.5, 1.6, side * 0.5])
+
+            def run():
+                player.position[1] = 1.6
+                player.velocity = [0.0, -5.0, 0.0]
+                player.handle_collision(platforms)
+            return run
+        benchmarks.append(Benchmark(f"handle_collision[{count}]", setup))
+    return benchmarks
+
+def collision_box_benchmarks():
+    def setup():
+        island = FloatingIsland([3.0, 1.0, -2.0], rng=random.Random(SEED))
+        return island.get_collision_boxes
+    return [Benchmark("get_collision_boxes", setup)]
+
+def bot_inputs(count):
+    """Fixed headings and staggered jump timings for count simulated players."""
+    rng = np.random.default_rng(SEED)
+    angles = rng.uniform(0, 2 * np.pi, count)
+    directions = np.stack([np.cos(angles), np.zeros(count), np.sin(angles)], axis=1)
+    starts = rng.uniform(-3, 3, (count, 3)) * [1, 0, 1]
+    jump_phase = rng.integers(0, 60, count)
+    return starts, directions, jump_phase
+
+def bot_benchmarks():
+    benchmarks = []
+    for count in BOT_COUNTS:
+        def setup(count=count):
+            game = Game(headless=True, seed=SEED, start_level=BOT_LEVEL)
+            starts, directions, jump_phase = bot_inputs(count)
+            batch = PlayerBatch(starts + game.player.start_position)
+            tick = [0]
+
+            def run():
+                batch.steer(directions, game.dt)
+                batch.jump(jump_phase == tick[0] % 60)
+                batch.update(game.dt, game.collision_world)
+                tick[0] += 1
+            return run
+        benchmarks.append(Benchmark(f"player_batch[{count}]", setup))
+
+    def setup():
+        game = Game(headless=True, seed=SEED, start_level=BOT_LEVEL)
+        starts, directions, jump_phase = bot_inputs(BOT_COUNTS[1])
+        players = [Player((start + game.player.start_position).tolist()) for start in starts]
+        keys = ScriptedKeys([K_w])
+        tick = [0]
+
+        def run():
+            # The same crowd stepped one Player at a time, for comparison
+            for player, direction, phase in zip(players, directions, jump_phase):
+                player.update_movement(keys, -direction, game.dt)
+                if phase == tick[0] % 60:
+                    player.jump()
+                speed = float(np.linalg.norm(player.velocity))
+                player.update(game.dt, game.collision_world.query(player.position, player.radius,
+                                                                  speed * game.dt * 2 + 0.5))
+            tick[0] += 1
+        return run
+    benchmarks.append(Benchmark(f"player_update[{BOT_COUNTS[1]}]", setup))
+    return benchmarks
+
+def all_benchmarks():
+    return (level_build_benchmarks() + level_file_benchmarks() + update_benchmarks() + collision_benchmarks() +
+            collision_box_benchmarks() + bot_benchmarks())
+
+def level_fingerprints():
+    game = Game(headless=True, seed=SEED)
+    fingerprints = {str(level): game.build_level(level)['fingerprint'] for level in LEVELS}
+    game.prefetcher.shutdown()
+    return fingerprints
+
+def mesh_area(mesh):
+    corners = mesh[:, 0:3].reshape(-1, 3, 3)
+    return 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1).sum()
+
+def mesh_stats():
+    """Print island triangle counts and surface area per level before and after baking."""
+    game = Game(headless=True, seed=SEED)
+    for level in LEVELS:
+        islands = game.build_level(level)['islands']
+        full_area = 0.0
+        for island in islands:
+            blocks, stalactites = island.block_boxes()
+            full_area += sum(mesh_area(transform_cube(high - low, (low + high) / 2)) for low, high in blocks + stalactites)
+        before = after = 0
+        area = 0.0
+        for island in islands:
+            mesh = island.build_mesh(use_atlas=False)
+            before += island.triangle_counts[0]
+            after += island.triangle_counts[1]
+            area += mesh_area(mesh)
+        print(f"level {level} {before:>7} -> {after:>7} triangles, "
+              f"surface {full_area:8.1f} -> {area:8.1f}")
+    game.prefetcher.shutdown()
+
+def texture_startup():
+    """Time decoding every texture and packing the atlas with a cold and a warm cache.
+
+    Covers the work that runs before the first GL upload, in one thread
+    and on the thread pool.
+    """
+    paths = image_files()
+
+    def load(directory, workers):
+        registry = TextureRegistry(TextureCache(directory))
+        start = time.perf_counter()
+        registry.preload(paths, workers=workers)
+        registry.atlas_levels(paths)
+        return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as serial, tempfile.TemporaryDirectory() as parallel:
+        timings = [
+            ("cold, 1 thread", load(serial, 1)),
+            ("cold, thread pool", load(parallel, None)),
+            ("warm", load(parallel, None)),
+        ]
+    print(f"{len(paths)} textures")
+    for label, seconds in timings:
+        print(f"{label:<20} {1000.0 * seconds:9.1f} ms")
+    return timings
+
+def render_levels(game, frames):
+    """Time draw_scene() and the flip per level while the camera turns; GL must be initialised."""
+    from OpenGL.GL import glFinish
+    results = {}
+    for level in LEVELS:
+        game.load_level(level)
+        samples = []
+        for frame in range(RENDER_WARMUP_FRAMES + frames):
+            game.handle_input(ScriptedKeys(), (4, 0))
+            game.update()
+            start = time.perf_counter()
+            game.draw_scene()
+            pygame.display.flip()
+            # Wait for the frame so the time covers rasterisation too
+            glFinish()
+            if frame >= RENDER_WARMUP_FRAMES:
+                samples.append(1000.0 * (time.perf_counter() - start))
+        samples.sort()
+        results[str(level)] = {
+            'avg_ms': round(statistics.mean(samples), 3),
+            'p50_ms': round(samples[len(samples) // 2], 3),
+            'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        }
+    return results
+
+def render_backend(name, frames):
+    """Open a hidden window for one backend and print its timings as JSON."""
+    import pygame
+    from OpenGL.GL import glGetString, GL_RENDERER, GL_VERSION
+    from main import create_window
+    pygame.init()
+    backend = RENDER_BACKENDS[name]()
+    create_window(backend, vsync=False, flags=pygame.HIDDEN)
+    game = Game(seed=SEED, backend=backend)
+    game.init_gl()
+    report = {
+        'backend': name,
+        'renderer': glGetString(GL_RENDERER).decode(),
+        'version': glGetString(GL_VERSION).decode(),
+        'levels': render_levels(game, frames),
+    }
+    game.prefetcher.shutdown()
+    pygame.quit()
+    print(json.dumps(report))
+
+def render_comparison(frames, software):
+    """Run every render backend in its own process and compare frame times.
+
+    A window's GL profile is fixed when it is created, so each backend gets
+    a fresh process. software forces Mesa's llvmpipe rasteriser.
+    """
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    if software:
+        env.update(LIBGL_ALWAYS_SOFTWARE="1", GALLIUM_DRIVER="llvmpipe")
+    reports = {}
+    for name in RENDER_BACKENDS:
+        child = subprocess.run([sys.executable, __file__, '--render-backend', name, '--frames', str(frames)],
+                               env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(f"{name}: failed\n{child.stderr.strip()}")
+            continue
+        reports[name] = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"{name}: {reports[name]['renderer']} / {reports[name]['version']}")
+
+    names = list(reports)
+    if not names:
+        return reports
+    print("level  " + "".join(f"{name + ' avg / p99 ms':>25}" for name in names))
+    for level in LEVELS:
+        row = [reports[name]['levels'][str(level)] for name in names]
+        print(f"{level:<7}" + "".join(f"{r['avg_ms']:>16.2f} / {r['p99_ms']:6.2f}" for r in row))
+    return reports
+
+def run(benchmarks, rounds, min_time):
+    results = {}
+    for benchmark in benchmarks:
+        func = benchmark.setup()
+        samples = time_rounds(func, rounds, min_time)
+        mean = statistics.mean(samples)
+        stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+        results[benchmark.name] = {
+            'ops_per_sec': round(mean, 2),
+            'stdev': round(stdev, 2),
+            'rounds': [round(sample, 2) for sample in samples],
+        }
+        print(f"{benchmark.name:<28} {mean:>12.1f} ops/s  +- {100.0 * stdev / mean:5.1f}%")
+    return results
+
+def compare_loading(results):
+    """Print how much faster each level loads from its file than it generates.
+
+    Returns the levels whose file is not faster, which defeats the point of
+    level files.
+    """
+    slower = []
+    for level in LEVELS:
+        generated = results.get(f"build_level[{level}]")
+        loaded = results.get(f"build_level_from_file[{level}]")
+        if generated is None or loaded is None:
+            continue
+        speedup = loaded['ops_per_sec'] / generated['ops_per_sec']
+        marker = ""
+        if speedup <= 1.0:
+            marker = "  SLOWER THAN GENERATING"
+            slower.append(level)
+        print(f"{f'level {level} from file':<28} {speedup:7.2f}x generation{marker}")
+    return slower
+
+def compare(results, baseline, tolerance):
+    """Print the change against baseline; return the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get('results', {}).get(name)
+        if expected is None:
+            continue
+        change = result['ops_per_sec'] / expected['ops_per_sec'] - 1.0
+        marker = ""
+        if change < -tolerance:
+            marker = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<28} {100.0 * change:+7.1f}% vs baseline{marker}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths headlessly.")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per round")
+    parser.add_argument('--filter', default="", help="only run benchmarks whose name contains this")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction of baseline ops/sec")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--mesh-stats', action='store_true', help="report island triangle counts and exit")
+    parser.add_argument('--textures', action='store_true', help="time texture decoding with a cold and a warm cache and exit")
+    parser.add_argument('--render', action='store_true', help="compare frame times of the render backends and exit")
+    parser.add_argument('--software', action='store_true', help="render on Mesa's llvmpipe software rasteriser")
+    parser.add_argument('--frames', type=int, default=RENDER_FRAMES, help="timed frames per level for --render")
+    parser.add_argument('--render-backend', choices=sorted(RENDER_BACKENDS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mesh_stats:
+        mesh_stats()
+        return 0
+
+    if args.textures:
+        texture_startup()
+        return 0
+
+    if args.render_backend:
+        render_backend(args.render_backend, args.frames)
+        return 0
+
+    if args.render:
+        reports = render_comparison(args.frames, args.software)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(reports, f, indent=2)
+        return 0 if len(reports) == len(RENDER_BACKENDS) else 1
+
+    fingerprints = level_fingerprints()
+    benchmarks = [b for b in all_benchmarks() if args.filter in b.name]
+    results = run(benchmarks, args.rounds, args.min_time)
+    slower = compare_loading(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'seed': SEED, 'fingerprints': fingerprints, 'results': results}, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'seed': SEED, 'fingerprints': fingerprints, 'results': results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if slower else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1 if slower else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if baseline.get('fingerprints') != fingerprints:
+        print("Level layouts differ from the baseline; the numbers are not comparable")
+        return 1
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {100.0 * args.tolerance:.0f}%")
+        return 1
+    return 1 if slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,53 +1,161 @@
 import math
 import random
-import time
 import os
+import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import pygame
-from utils import load_texture
-
-def load_texture(filename):
-    textureSurface = pygame.image.load(filename)
-    textureData = pygame.image.tostring(textureSurface, "RGBA", 1)
-    width = textureSurface.get_width()
-    height = textureSurface.get_height()
-    
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, textureData)
-    
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    
-    return texture
+from texture_registry import registry
+from mesh_cache import mesh_cache, DISC_LODS
+
+COIN_THICKNESS = 0.05
+COIN_RADIUS = 0.3
+COIN_HOVER_SPEED = 3.0
+COIN_ROTATION_SPEED = 180.0
+
+def coin_vertices(radius, segments):
+    """Triangles of the coin drawn by create_coin_geometry, face up on y.
+
+    Returns a float32 (V, 8) array of position, normal and UV with the same
+    side UVs as gluCylinder and the same cap UVs as the display list.
+    """
+    angles = np.linspace(0.0, 2 * np.pi, segments + 1)
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+
+    # Built along z like the quadric, then turned by the list's glRotatef(90, 1, 0, 0)
+    side = np.zeros((2, segments + 1, 8))
+    side[:, :, 0] = np.sin(angles) * radius
+    side[:, :, 1] = np.cos(angles) * radius
+    side[1, :, 2] = COIN_THICKNESS
+    side[:, :, 3] = np.sin(angles)
+    side[:, :, 4] = np.cos(angles)
+    side[:, :, 6] = np.arange(segments + 1) / segments
+    side[1, :, 7] = 1.0
+    side = np.stack([side[0, :-1], side[0, 1:], side[1, 1:],
+                     side[0, :-1], side[1, 1:], side[1, :-1]], axis=1).reshape(-1, 8)
+
+    caps = []
+    for z, v_sign in ((COIN_THICKNESS, 1.0), (0.0, -1.0)):
+        rim = np.zeros((segments + 1, 8))
+        rim[:, 0] = cos * radius
+        rim[:, 1] = sin * radius
+        rim[:, 2] = z
+        rim[:, 5] = v_sign
+        rim[:, 6] = 0.5 + 0.5 * cos
+        rim[:, 7] = 0.5 + v_sign * 0.5 * sin
+        center = np.array([0.0, 0.0, z, 0.0, 0.0, v_sign, 0.5, 0.5])
+        caps.append(np.stack([np.broadcast_to(center, rim[:-1].shape), rim[:-1], rim[1:]], axis=1).reshape(-1, 8))
+
+    vertices = np.concatenate([side] + caps)
+    for y_column, z_column in ((1, 2), (4, 5)):
+        y = vertices[:, y_column].copy()
+        vertices[:, y_column] = -vertices[:, z_column]
+        vertices[:, z_column] = y
+    return vertices.astype(np.float32)
 
 class Coin:
-    def __init__(self, position, texture_type="gold"):
+    def __init__(self, position, texture_type="gold", rng=None, hover_time_offset=None):
+        rng = rng or random
+        self.field = None
+        self.field_index = None
         self.position = position
         self.rotation = 0
         self.collected = False
-        self.radius = 0.3
+        self.radius = COIN_RADIUS
         self.hover_offset = 0
-        self.hover_speed = 3.0
-        self.rotation_speed = 180.0
-        self.hover_time_offset = random.random() * math.pi * 2
+        self.hover_speed = COIN_HOVER_SPEED
+        self.rotation_speed = COIN_ROTATION_SPEED
+        if hover_time_offset is None:
+            hover_time_offset = rng.random() * math.pi * 2
+        self.hover_time_offset = hover_time_offset
         
-        # Load texture based on type
-        texture_file = texture_type + ".png"
-        self.texture = load_texture(os.path.join("textures", texture_file))
+        self.texture_type = texture_type
+        self.texture = None
+        self.coin_lists = None
+
+    @property
+    def rotation(self):
+        if self.field is not None:
+            return self.field.rotation[self.field_index]
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value):
+        if self.field is not None:
+            self.field.rotation[self.field_index] = value
+        else:
+            self._rotation = value
+
+    @property
+    def hover_offset(self):
+        if self.field is not None:
+            return self.field.hover[self.field_index]
+        return self._hover_offset
+
+    @hover_offset.setter
+    def hover_offset(self, value):
+        if self.field is not None:
+            self.field.hover[self.field_index] = value
+        else:
+            self._hover_offset = value
+
+    @property
+    def collected(self):
+        if self.field is not None:
+            return bool(self.field.collected[self.field_index])
+        return self._collected
+
+    @collected.setter
+    def collected(self, value):
+        if self.field is not None:
+            self.field.set_collected(self.field_index, value)
+        else:
+            self._collected = value
+
+    def bind_field(self, field, index):
+        """Back this coin's state with row `index` of a CoinField."""
+        self.field = field
+        self.field_index = index
+        self.position = field.positions[index]
+
+    def bounding_sphere(self):
+        # Pad the radius by the coin's thickness
+        return [self.position[0], self.position[1] + self.hover_offset, self.position[2]], self.radius + COIN_THICKNESS
+
+    def texture_path(self):
+        return os.path.join("textures", self.texture_type + ".png")
+
+    def load_texture(self):
+        texture_path = self.texture_path()
+        self.texture = registry.get(texture_path)
+        self.atlas_region = registry.atlas_region(texture_path)
+
+    def init_gl_resources(self):
+        self.load_texture()
         
-        # Create coin display list
-        self.coin_list = glGenLists(1)
-        glNewList(self.coin_list, GL_COMPILE)
-        self.create_coin_geometry()
-        glEndList()
+        # Coins of the same type share one display list per detail level
+        self.coin_lists = {}
+        for _, segments in DISC_LODS:
+            key = ('coin', self.texture_path(), self.radius, segments)
+            self.coin_lists[segments] = mesh_cache.get(key, lambda segments=segments: self.create_coin_geometry(segments))
         
-    def create_coin_geometry(self):
+    def create_coin_geometry(self, segments=32):
         glPushMatrix()
         
         glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, self.texture)
+        if self.atlas_region:
+            # Quadric texture coordinates are fixed to 0..1, so map them into
+            # the atlas tile through the texture matrix.
+            u0, v0, u1, v1 = self.atlas_region
+            glMatrixMode(GL_TEXTURE)
+            glPushMatrix()
+            glLoadIdentity()
+            glTranslatef(u0, v0, 0)
+            glScalef(u1 - u0, v1 - v0, 1)
+            glMatrixMode(GL_MODELVIEW)
+        else:
+            glBindTexture(GL_TEXTURE_2D, self.texture)
         glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)  # Use texture color directly
         
         glDisable(GL_LIGHTING)
@@ -57,24 +165,22 @@ class Coin:
 
         glRotatef(90, 1, 0, 0)  
         glColor3f(1.0, 0.84, 0.0)  
-        gluCylinder(quad, self.radius, self.radius, 0.05, 32, 1)
+        gluCylinder(quad, self.radius, self.radius, COIN_THICKNESS, segments, 1)
+        gluDeleteQuadric(quad)
         
 
         glPushMatrix()
-        glTranslatef(0, 0, 0.05)
+        glTranslatef(0, 0, COIN_THICKNESS)
         
         glBegin(GL_TRIANGLE_FAN)
         glColor3f(1.0, 0.84, 0.0)  
         glTexCoord2f(0.5, 0.5) 
         glVertex3f(0, 0, 0) 
         
-        segments = 32
-        for i in range(segments + 1):
-            angle = (i / segments) * 2 * math.pi
-            x = math.cos(angle) * self.radius
-            y = math.sin(angle) * self.radius
-            glTexCoord2f(0.5 + 0.5 * math.cos(angle), 0.5 + 0.5 * math.sin(angle))
-            glVertex3f(x, y, 0)
+        circle = mesh_cache.circle(segments)
+        for angle, cos, sin in circle:
+            glTexCoord2f(0.5 + 0.5 * cos, 0.5 + 0.5 * sin)
+            glVertex3f(cos * self.radius, sin * self.radius, 0)
         glEnd()
         
         glPopMatrix()
@@ -86,12 +192,9 @@ class Coin:
         glTexCoord2f(0.5, 0.5)  
         glVertex3f(0, 0, 0)  
         
-        for i in range(segments + 1):
-            angle = (i / segments) * 2 * math.pi
-            x = math.cos(angle) * self.radius
-            y = math.sin(angle) * self.radius
-            glTexCoord2f(0.5 + 0.5 * math.cos(-angle), 0.5 + 0.5 * math.sin(-angle))
-            glVertex3f(x, y, 0)
+        for angle, cos, sin in circle:
+            glTexCoord2f(0.5 + 0.5 * cos, 0.5 - 0.5 * sin)
+            glVertex3f(cos * self.radius, sin * self.radius, 0)
         glEnd()
         glPopMatrix()
         
@@ -99,47 +202,13 @@ class Coin:
         glEnable(GL_LIGHTING)
         glDisable(GL_TEXTURE_2D)
         glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE) 
+        if self.atlas_region:
+            glMatrixMode(GL_TEXTURE)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
         glPopMatrix()
         
-    def draw(self):
-        if not self.collected:
-            glPushMatrix()
-
-            glTranslatef(
-                self.position[0],
-                self.position[1] + self.hover_offset,
-                self.position[2]
-            )
-            
-     
-            glRotatef(self.rotation, 0, 1, 0)
-            
-       
-            glRotatef(15, 1, 0, 0)
-            
-     
-            glCallList(self.coin_list)
-            
-            glPopMatrix()
-            
-    def update(self, dt):
-        if not self.collected:
-
-            self.rotation += self.rotation_speed * dt
-            
-            time_val = time.time() + self.hover_time_offset
-            primary_wave = math.sin(time_val * self.hover_speed) * 0.2
-            secondary_wave = math.sin(time_val * self.hover_speed * 2) * 0.05
-            self.hover_offset = primary_wave + secondary_wave
-
-    def check_collection(self, player_pos):
+    def draw(self, backend, eye=None):
         if not self.collected:
-            dx = self.position[0] - player_pos[0]
-            dy = (self.position[1] + self.hover_offset) - player_pos[1]
-            dz = self.position[2] - player_pos[2]
-            distance = math.sqrt(dx*dx + dy*dy + dz*dz)
-            
-            if distance < (self.radius + 0.5):  
-                self.collected = True
-                return True
-        return False 
\ No newline at end of file
+            segments = mesh_cache.select(DISC_LODS, self.radius, self.position, eye)
+            backend.draw_coin(self, segments)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from coin import COIN_HOVER_SPEED, COIN_RADIUS, COIN_ROTATION_SPEED, COIN_THICKNESS
+
+PICKUP_REACH = 0.5
+
+class CoinField:
+    """Animates and collects every coin of a level in array form.
+
+    Positions, hover phases, rotations and the collected mask live in
+    arrays, and each Coin is bound to its row the same way islands are
+    bound to IslandMotionSystem. Animation and the pickup test run over
+    the whole arrays, which for a level's worth of coins is cheaper than
+    gathering; `active` holds the indices of the coins still in play and
+    is compacted whenever one is collected, so drawing skips the rest.
+
+    The constructor takes positions and hover phases, as a level file
+    stores them, for fresh coins; from_coins() gathers them from Coins.
+    coins is the sequence active_coins() draws from, and each of its
+    Coins must be bound to its row.
+    """
+
+    def __init__(self, positions, phase, coins=()):
+        count = len(phase)
+        self.coins = coins
+
+        self.positions = np.array(positions, dtype=float).reshape(count, 3)
+        self.phase = np.array(phase, dtype=float)
+        self.hover_speed = np.full(count, COIN_HOVER_SPEED)
+        self.rotation_speed = np.full(count, COIN_ROTATION_SPEED)
+        self.radius = np.full(count, COIN_RADIUS)
+        self.rotation = np.zeros(count)
+        self.hover = np.zeros(count)
+        self.collected = np.zeros(count, dtype=bool)
+        self.reach_squared = (self.radius + PICKUP_REACH) ** 2
+        self.active = np.arange(count)
+
+    @classmethod
+    def from_coins(cls, coins):
+        field = cls([coin.position for coin in coins], [coin.hover_time_offset for coin in coins], coins)
+        field.hover_speed[:] = [coin.hover_speed for coin in coins]
+        field.rotation_speed[:] = [coin.rotation_speed for coin in coins]
+        field.radius[:] = [coin.radius for coin in coins]
+        field.rotation[:] = [coin.rotation for coin in coins]
+        field.hover[:] = [coin.hover_offset for coin in coins]
+        field.collected[:] = [coin.collected for coin in coins]
+        field.reach_squared = (field.radius + PICKUP_REACH) ** 2
+        field.active = np.flatnonzero(~field.collected)
+        for index, coin in enumerate(coins):
+            coin.bind_field(field, index)
+        return field
+
+    def set_collected(self, index, value):
+        self.collected[index] = value
+        self.active = np.flatnonzero(~self.collected)
+
+    def update(self, dt, time_value):
+        if not len(self.active):
+            return
+        self.rotation += self.rotation_speed * dt
+        angle = (time_value + self.phase) * self.hover_speed
+        self.hover[:] = np.sin(angle) * 0.2 + np.sin(angle * 2) * 0.05
+
+    def collect(self, player_pos):
+        """Mark coins within reach of player_pos collected and return their indices."""
+        if not len(self.active):
+            return self.active
+        offset = self.positions - player_pos
+        offset[:, 1] += self.hover
+        in_reach = np.einsum('ij,ij->i', offset, offset) < self.reach_squared
+        hits = np.flatnonzero(in_reach & ~self.collected)
+        if len(hits):
+            self.collected[hits] = True
+            self.active = np.flatnonzero(~self.collected)
+        return hits
+
+    def bounding_spheres(self):
+        """(centers, radii) of the active coins, in the order of `active`."""
+        active = self.active
+        centers = self.positions[active]
+        centers[:, 1] += self.hover[active]
+        # Pad the radius by the coin's thickness, as Coin.bounding_sphere does
+        return centers, self.radius[active] + COIN_THICKNESS
+
+    def active_coins(self):
+        coins = self.coins
+        return [coins[index] for index in self.active]
+
+    def remaining(self):
+        return len(self.active)
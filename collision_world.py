@@ -0,0 +1,187 @@
+import math
+import numpy as np
+
+from player import CUBE_SIZE
+
+CELL_SIZE = 2.0
+
+class CollisionWorld:
+    """Persistent collision index for the islands of one level.
+
+    Static islands have their block centres hashed into a uniform xz grid
+    once. Moving islands keep island-local boxes and are hashed by the whole
+    area their movement can cover, so a query only visits nearby cells no
+    matter how many islands the level has.
+
+    index takes a previously built (cells, static_boxes, static_owners,
+    static_order, dynamic) tuple, as stored in a level file, in place of
+    hashing the islands again. Given the level's IslandMotionSystem as
+    motion and the moving islands' block offsets by island index as
+    block_offsets too, the islands themselves are never touched.
+    """
+
+    def __init__(self, islands, cell_size=CELL_SIZE, index=None, motion=None, block_offsets=None):
+        self.cell_size = cell_size
+        self.islands = islands
+        self.gathered = {}
+        self.extent = None
+        # With an IslandMotionSystem bound, positions, hover and velocity can
+        # be gathered straight from its arrays instead of island by island.
+        if motion is None:
+            motions = {id(island.motion) for island in islands}
+            motion = islands[0].motion if islands and len(motions) == 1 else None
+        self.motion = motion
+
+        if index is None:
+            index = self.build_index(islands)
+        self.index = index
+        self.cells, self.static_boxes, self.static_owners, self.static_order, dynamic = index
+        if block_offsets is None:
+            block_offsets = {island_index: islands[island_index].block_offsets for island_index, _ in dynamic}
+        self.dynamic = [(island_index, block_offsets[island_index], order) for island_index, order in dynamic]
+
+    def build_index(self, islands):
+        """Hash the islands into cells.
+
+        dynamic lists (island index, order of its first block) per moving
+        island.
+        """
+        cells = {}
+        static_boxes = []
+        static_owners = []
+        static_order = []
+        dynamic = []
+
+        order = 0
+        for island_index, island in enumerate(islands):
+            scale = island.size * 0.9
+            local = island.block_offsets
+
+            if island.movement_type:
+                reach = island.movement_amplitude + scale
+                dynamic.append((island_index, order))
+                self.insert(cells, ('dynamic', len(dynamic) - 1),
+                            island.original_pos[0] - reach, island.original_pos[2] - reach,
+                            island.original_pos[0] + reach, island.original_pos[2] + reach)
+            else:
+                for block_index, offset in enumerate(local):
+                    box_index = len(static_boxes)
+                    static_boxes.append([island.center_pos[0] + offset[0],
+                                         island.base_y + offset[1],
+                                         island.center_pos[2] + offset[2]])
+                    static_owners.append(island_index)
+                    static_order.append(order + block_index)
+                    x, z = static_boxes[-1][0], static_boxes[-1][2]
+                    self.insert(cells, ('static', box_index), x, z, x, z)
+            order += len(island.blocks)
+
+        return (cells,
+                np.array(static_boxes, dtype=float).reshape(-1, 3),
+                np.array(static_owners, dtype=int),
+                np.array(static_order, dtype=int),
+                dynamic)
+
+    def cell(self, x, z):
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+
+    def insert(self, cells, entry, min_x, min_z, max_x, max_z):
+        x0, z0 = self.cell(min_x, min_z)
+        x1, z1 = self.cell(max_x, max_z)
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                cells.setdefault((cx, cz), []).append(entry)
+
+    def gather(self, x0, z0, x1, z1):
+        """Static boxes and moving islands in a block of cells.
+
+        Cached per block, since the player stays in the same few cells for
+        many ticks. Also returns the permutation that puts the combined
+        boxes in get_collision_boxes order, or None when no moving island
+        is involved and the static boxes are already in order.
+        """
+        key = (x0, z0, x1, z1)
+        gathered = self.gathered.get(key)
+        if gathered is not None:
+            return gathered
+
+        static_hits = set()
+        dynamic_hits = set()
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                for kind, index in self.cells.get((cx, cz), ()):
+                    if kind == 'static':
+                        static_hits.add(index)
+                    else:
+                        dynamic_hits.add(index)
+
+        indices = np.array(sorted(static_hits), dtype=int)
+        dynamic = sorted(dynamic_hits)
+        permutation = None
+        if dynamic:
+            orders = [self.static_order[indices]]
+            for index in dynamic:
+                _, local, order = self.dynamic[index]
+                orders.append(np.arange(order, order + len(local)))
+            permutation = np.argsort(np.concatenate(orders), kind='stable')
+
+        gathered = (self.static_boxes[indices], self.static_owners[indices], dynamic, permutation)
+        self.gathered[key] = gathered
+        return gathered
+
+    def query(self, position, radius, margin=0.0):
+        """Return an (N, 6) array of block centres the player could touch.
+
+        Columns 3:6 hold the owning island's velocity so the player can ride
+        moving platforms. Boxes come back in the same order
+        get_collision_boxes would list them.
+        """
+        reach = CUBE_SIZE + radius + margin
+        x0, z0 = self.cell(position[0] - reach, position[2] - reach)
+        x1, z1 = self.cell(position[0] + reach, position[2] + reach)
+        return self.assemble(*self.gather(x0, z0, x1, z1))
+
+    def all_boxes(self):
+        """Every box of the level, laid out as query() lays out a region."""
+        if not self.cells:
+            return np.empty((0, 6))
+        if self.extent is None:
+            xs = [cx for cx, _ in self.cells]
+            zs = [cz for _, cz in self.cells]
+            self.extent = (min(xs), min(zs), max(xs), max(zs))
+        return self.assemble(*self.gather(*self.extent))
+
+    def assemble(self, static_boxes, owners, dynamic, permutation):
+        boxes = []
+        if len(owners):
+            if self.motion is not None:
+                hover = self.motion.hover[owners]
+                velocity = self.motion.velocity[owners]
+            else:
+                hover = np.array([self.islands[owner].hover_offset for owner in owners])
+                velocity = np.array([self.islands[owner].velocity for owner in owners], dtype=float)
+            static = np.empty((len(owners), 6))
+            static[:, 0:3] = static_boxes
+            static[:, 1] += hover
+            static[:, 3:6] = velocity
+            boxes.append(static)
+
+        for index in dynamic:
+            island_index, local, order = self.dynamic[index]
+            if self.motion is not None:
+                position = self.motion.positions[island_index]
+                origin = (position[0], position[1] + self.motion.hover[island_index], position[2])
+                velocity = self.motion.velocity[island_index]
+            else:
+                island = self.islands[island_index]
+                origin = (island.center_pos[0], island.center_pos[1] + island.hover_offset, island.center_pos[2])
+                velocity = island.velocity
+            moving = np.empty((len(local), 6))
+            moving[:, 0:3] = local + origin
+            moving[:, 3:6] = velocity
+            boxes.append(moving)
+
+        if not boxes:
+            return np.empty((0, 6))
+        if permutation is None:
+            return boxes[0]
+        return np.concatenate(boxes)[permutation]
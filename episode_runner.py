@@ -0,0 +1,137 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from headless import HeadlessSimulation, SCRIPTS
+from main import SIMULATION_DT
+from player import FALL_LIMIT
+
+LEVELS = (1, 2, 3, 4)
+MAX_TICKS = 60 * 60 * 2
+# Chunks per worker; more balances uneven episodes, fewer saves round trips
+CHUNKS_PER_WORKER = 4
+
+def run_episode(episode):
+    """Play one level from its start until the portal is taken or time runs out.
+
+    episode is (level, seed, script name, max ticks, dt, level_dir) so it
+    pickles cheaply. Returns a small dict; times are simulated seconds.
+    Levels are not prefetched, since the episode ends at the portal.
+    """
+    level, seed, script, max_ticks, dt, level_dir = episode
+    sim = HeadlessSimulation(level, SCRIPTS[script], seed, level_dir, dt, prefetch=False)
+    game = sim.game
+
+    deaths = 0
+    reached = False
+    score = game.total_score
+    while sim.tick < max_ticks:
+        falling = game.player.position[1] < FALL_LIMIT
+        score = game.total_score
+        pressed, mouse_delta = sim.script(sim.tick, game)
+        sim.step(pressed, mouse_delta)
+        if falling:
+            deaths += 1
+        if game.completed or game.level_index != level:
+            reached = True
+            break
+
+    # Taking the portal loads the next level, which resets the coin count
+    coins = game.total_score - score if reached and not game.completed else game.coins_collected
+    game.prefetcher.shutdown()
+    return {
+        'level': level,
+        'seed': game.seed,
+        'fingerprint': game.levels[level]['fingerprint'],
+        'ticks': sim.tick,
+        'time': sim.tick * dt,
+        'coins': coins,
+        'deaths': deaths,
+        'reached_portal': reached,
+    }
+
+def run_episodes(episodes, workers=None):
+    """Yield run_episode() results, in episode order, from a process pool."""
+    episodes = list(episodes)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, math.ceil(len(episodes) / (workers * CHUNKS_PER_WORKER)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(run_episode, episodes, chunksize=chunksize)
+
+def merge_results(results):
+    """Fold episode results into one report, per level and overall."""
+    report = {'levels': {}, 'episodes': 0, 'reached_portal': 0, 'deaths': 0}
+    by_level = {}
+    for result in results:
+        by_level.setdefault(result['level'], []).append(result)
+
+    for level, level_results in sorted(by_level.items()):
+        times = [result['time'] for result in level_results if result['reached_portal']]
+        reached = len(times)
+        deaths = sum(result['deaths'] for result in level_results)
+        report['levels'][level] = {
+            'episodes': len(level_results),
+            'reached_portal': reached,
+            'reach_rate': reached / len(level_results),
+            'mean_time': statistics.mean(times) if times else None,
+            'best_time': min(times) if times else None,
+            'mean_coins': statistics.mean(result['coins'] for result in level_results),
+            'deaths': deaths,
+            'mean_deaths': deaths / len(level_results),
+            # Seeds that never made it, for replaying the failures
+            'failed_seeds': [result['seed'] for result in level_results if not result['reached_portal']],
+        }
+        report['episodes'] += len(level_results)
+        report['reached_portal'] += reached
+        report['deaths'] += deaths
+    return report
+
+def print_report(report):
+    for level, stats in report['levels'].items():
+        best = f"{stats['best_time']:.2f}s" if stats['best_time'] is not None else "--"
+        mean = f"{stats['mean_time']:.2f}s" if stats['mean_time'] is not None else "--"
+        print(f"Level {level}: {stats['episodes']} episodes, portal {stats['reached_portal']} "
+              f"({100.0 * stats['reach_rate']:.1f}%), time mean {mean} best {best}, "
+              f"coins {stats['mean_coins']:.2f}, deaths {stats['mean_deaths']:.2f}/episode")
+    print(f"Total: {report['episodes']} episodes, portal {report['reached_portal']}, deaths {report['deaths']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many seeded headless episodes across all cores.")
+    parser.add_argument('--episodes', type=int, default=100, help="seeds to play per level")
+    parser.add_argument('--seed', type=int, default=0, help="first seed; episodes use consecutive seeds")
+    parser.add_argument('--level', type=int, action='append', help="level to play; repeat for several (default: all)")
+    parser.add_argument('--script', choices=sorted(SCRIPTS), default='forward')
+    parser.add_argument('--ticks', type=int, default=MAX_TICKS, help="tick limit per episode")
+    parser.add_argument('--dt', type=float, default=SIMULATION_DT, help="simulation step in seconds")
+    parser.add_argument('--workers', type=int, default=None, help="processes to use (default: one per core)")
+    parser.add_argument('--levels', default=None, help="load level files exported by level_file.py from this directory")
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    episodes = [(level, seed, args.script, args.ticks, args.dt, args.levels)
+                for seed in range(args.seed, args.seed + args.episodes)
+                for level in args.level or LEVELS]
+
+    start = time.perf_counter()
+    results = []
+    for result in run_episodes(episodes, args.workers):
+        results.append(result)
+        if len(results) % 100 == 0:
+            print(f"{len(results)}/{len(episodes)} episodes")
+    elapsed = time.perf_counter() - start
+
+    report = merge_results(results)
+    report['seconds'] = elapsed
+    print_report(report)
+    print(f"{len(results)} episodes in {elapsed:.1f}s ({len(results) / elapsed:.1f} episodes/s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'report': report, 'episodes': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
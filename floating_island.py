@@ -1,32 +1,94 @@
 import math
 import random
 import os
-import time
+import numpy as np
 import pygame
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from utils import load_texture
+from texture_registry import registry, upload_surface
+from island_mesher import cube_faces, mesh_boxes
 
-def load_texture(filename):
-    textureSurface = pygame.image.load(filename)
-    textureData = pygame.image.tostring(textureSurface, "RGBA", 1)
-    width = textureSurface.get_width()
-    height = textureSurface.get_height()
-    
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, textureData)
-    
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    
-    return texture
+CUBE_VERTICES = [
+    [-0.5, -0.5, -0.5],  
+    [0.5, -0.5, -0.5],   
+    [0.5, 0.5, -0.5],  
+    [-0.5, 0.5, -0.5],  
+    [-0.5, -0.5, 0.5],  
+    [0.5, -0.5, 0.5],   
+    [0.5, 0.5, 0.5],    
+    [-0.5, 0.5, 0.5]   
+]
+
+CUBE_UVS = [[0, 0], [1, 0], [1, 1], [0, 1]]
+
+# front, back, right, left, top, bottom
+CUBE_FACES = [
+    [0, 1, 2, 3],
+    [5, 4, 7, 6],
+    [1, 5, 6, 2],
+    [4, 0, 3, 7],
+    [3, 2, 6, 7],
+    [1, 0, 4, 5]
+]
+
+def face_normal(face):
+    v1 = CUBE_VERTICES[face[1]]
+    v2 = CUBE_VERTICES[face[2]]
+    v3 = CUBE_VERTICES[face[0]]
+    return [
+        (v2[1] - v1[1]) * (v3[2] - v1[2]) - (v2[2] - v1[2]) * (v3[1] - v1[1]),
+        (v2[2] - v1[2]) * (v3[0] - v1[0]) - (v2[0] - v1[0]) * (v3[2] - v1[2]),
+        (v2[0] - v1[0]) * (v3[1] - v1[1]) - (v2[1] - v1[1]) * (v3[0] - v1[0])
+    ]
+
+def build_unit_cube():
+    # Each quad becomes two triangles: (0, 1, 2) and (0, 2, 3)
+    rows = []
+    for face in CUBE_FACES:
+        normal = face_normal(face)
+        for i in (0, 1, 2, 0, 2, 3):
+            rows.append(CUBE_VERTICES[face[i]] + normal + CUBE_UVS[i])
+    return np.array(rows, dtype=np.float32)
+
+UNIT_CUBE = build_unit_cube()
+CUBE_FACE_INFO = cube_faces(UNIT_CUBE)
+# A stalactite's top face is always inside the block it hangs from
+STALACTITE_FACE_INFO = [face for face in CUBE_FACE_INFO if not (face[0] == 1 and face[1] > 0)]
+
+def remap_uvs(mesh, region):
+    u0, v0, u1, v1 = region
+    mesh[:, 6] = u0 + mesh[:, 6] * (u1 - u0)
+    mesh[:, 7] = v0 + mesh[:, 7] * (v1 - v0)
+    return mesh
+
+def transform_cube(scale, offset):
+    cube = UNIT_CUBE.copy()
+    cube[:, 0:3] = cube[:, 0:3] * scale + offset
+    return cube
 
 class FloatingIsland:
    
     block_textures = {}
     
-    def __init__(self, center_pos, size=1.0, movement_type=None, block_type="grass"):
+    texture_files = {
+        'grass': 'grass.png',
+        'netherrack': 'nether.png',
+        'soul_sand': 'nether.png', 
+        'end_stone': 'end.png',
+        'obsidian': 'end.png',  
+        'diamond': 'lapis.png',  
+        'emerald': 'emerald.png',
+        'gold': 'gold.png',
+        'purple': 'purple.png'  
+    }
+    
+    def __init__(self, center_pos, size=1.0, movement_type=None, block_type="grass", rng=None, layout=None):
+        # Layout randomness comes from the level's generator when one is
+        # given; a stored (movement_time, blocks, stalactites) skips it.
+        if layout is None:
+            layout = self.roll_layout(rng or random)
+        self.motion = None
+        self.motion_index = None
         self.center_pos = center_pos
         self.size = size
         self.base_y = center_pos[1]
@@ -37,39 +99,84 @@ class FloatingIsland:
         
 
         self.movement_type = movement_type
-        self.movement_time = random.random() * math.pi * 2 
+        self.movement_time, self.blocks, self.stalactites = layout
         self.movement_speed = 0.5
         self.movement_amplitude = 2.0
         self.original_pos = center_pos.copy()
-        
+        self.previous_pos = center_pos.copy()
+        self.previous_hover_offset = self.hover_offset
+        self.velocity = [0, 0, 0]
+
+        self.block_offsets = np.array(self.blocks, dtype=float) * (self.size * 0.9)
 
-        self.blocks = []
+        self.display_list = None
+        self.local_bounds = None
+        self.triangle_counts = None
+
+    @staticmethod
+    def roll_layout(rng):
+        movement_time = rng.random() * math.pi * 2 
+
+        blocks = []
         for x in range(-1, 2):
             for z in range(-1, 2):
                 if x == 0 and z == 0:
-                    self.blocks.append([x, 0, z])
-                elif random.random() < 0.8:
-                    y_offset = random.uniform(-0.2, 0.2)
-                    self.blocks.append([x, y_offset, z])
-
-        if not FloatingIsland.block_textures:
-  
-            texture_files = {
-                'grass': 'grass.png',
-                'netherrack': 'nether.png',
-                'soul_sand': 'nether.png', 
-                'end_stone': 'end.png',
-                'obsidian': 'end.png',  
-                'diamond': 'lapis.png',  
-                'emerald': 'emerald.png',
-                'gold': 'gold.png',
-                'purple': 'purple.png'  
-            }
-            
-            for block_name, filename in texture_files.items():
+                    blocks.append([x, 0, z])
+                elif rng.random() < 0.8:
+                    y_offset = rng.uniform(-0.2, 0.2)
+                    blocks.append([x, y_offset, z])
+
+        # Stalactite heights are part of the layout, so roll them here rather
+        # than while recording the display list.
+        stalactites = []
+        for block in blocks:
+            if rng.random() < 0.5:
+                stalactites.append(rng.uniform(0.3, 0.8))
+            else:
+                stalactites.append(None)
+        return movement_time, blocks, stalactites
+
+    @property
+    def hover_offset(self):
+        if self.motion is not None:
+            return self.motion.hover[self.motion_index]
+        return self._hover_offset
+
+    @hover_offset.setter
+    def hover_offset(self, value):
+        if self.motion is not None:
+            self.motion.hover[self.motion_index] = value
+        else:
+            self._hover_offset = value
+
+    @property
+    def previous_hover_offset(self):
+        if self.motion is not None:
+            return self.motion.previous_hover[self.motion_index]
+        return self._previous_hover_offset
+
+    @previous_hover_offset.setter
+    def previous_hover_offset(self, value):
+        if self.motion is not None:
+            self.motion.previous_hover[self.motion_index] = value
+        else:
+            self._previous_hover_offset = value
+
+    def bind_motion(self, motion, index):
+        """Hand this island's movement over to an IslandMotionSystem row."""
+        self.motion = motion
+        self.motion_index = index
+        self.center_pos = motion.positions[index]
+        self.previous_pos = motion.previous[index]
+        self.velocity = motion.velocity[index]
+
+    @classmethod
+    def load_block_textures(cls):
+        if not cls.block_textures:
+            for block_name, filename in cls.texture_files.items():
                 try:
-                    texture = load_texture(os.path.join("textures", filename))
-                    FloatingIsland.block_textures[block_name] = texture
+                    texture = registry.get(os.path.join("textures", filename))
+                    cls.block_textures[block_name] = texture
                 except:
                     print(f"Warning: Could not load texture {filename}")
                  
@@ -84,145 +191,102 @@ class FloatingIsland:
                     elif block_name == 'diamond':
                         surface.fill((0, 191, 255)) 
                     
-                    texture_id = glGenTextures(1)
-                    glBindTexture(GL_TEXTURE_2D, texture_id)
-                    texture_data = pygame.image.tostring(surface, "RGBA", 1)
-                    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, size, size, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-                    FloatingIsland.block_textures[block_name] = texture_id
-        
+                    cls.block_textures[block_name] = upload_surface(surface, "RGBA", GL_NEAREST)
 
+    def init_gl_resources(self):
+        FloatingIsland.load_block_textures()
         self.display_list = glGenLists(1)
         glNewList(self.display_list, GL_COMPILE)
         self.create_island_geometry()
         glEndList()
     
+    def atlas_region(self):
+        filename = FloatingIsland.texture_files.get(self.block_type)
+        if filename is None:
+            return None
+        return registry.atlas_region(os.path.join("textures", filename))
+    
     def create_island_geometry(self):
+        # Record the baked arrays; glDrawArrays copies them into the list
+        region = self.atlas_region()
+        mesh = self.build_mesh()
         glEnable(GL_TEXTURE_2D)
-        
-        for block in self.blocks:
-            x, y, z = block
-   
-            scale = self.size * 0.9
-            
-            glPushMatrix()
-            glTranslatef(x * scale, y * scale, z * scale)
-            glScalef(scale, scale * 0.8, scale)  
-            
-   
-            self.draw_textured_cube()
-  
-            if random.random() < 0.5: 
-                glPushMatrix()
-                glTranslatef(0, -0.5, 0)
-                glScalef(0.3, random.uniform(0.3, 0.8), 0.3)
-                self.draw_textured_cube(is_stalactite=True)
-                glPopMatrix()
-            
-            glPopMatrix()
-            
+        if not region:
+            glBindTexture(GL_TEXTURE_2D, FloatingIsland.block_textures[self.block_type])
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, np.ascontiguousarray(mesh[:, 0:3]))
+        glNormalPointer(GL_FLOAT, 0, np.ascontiguousarray(mesh[:, 3:6]))
+        glTexCoordPointer(2, GL_FLOAT, 0, np.ascontiguousarray(mesh[:, 6:8]))
+        glDrawArrays(GL_TRIANGLES, 0, len(mesh))
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
         glDisable(GL_TEXTURE_2D)
     
-    def draw_textured_cube(self, is_stalactite=False):
-        if is_stalactite:
-       
-            texture = FloatingIsland.block_textures[self.block_type]
-        else:
-            glEnable(GL_TEXTURE_2D)
-            
-            # Define vertices
-            vertices = [
-                [-0.5, -0.5, -0.5],  
-                [0.5, -0.5, -0.5],   
-                [0.5, 0.5, -0.5],  
-                [-0.5, 0.5, -0.5],  
-                [-0.5, -0.5, 0.5],  
-                [0.5, -0.5, 0.5],   
-                [0.5, 0.5, 0.5],    
-                [-0.5, 0.5, 0.5]   
-            ]
-            
-   
-            uvs = [[0, 0], [1, 0], [1, 1], [0, 1]]
-            
-       
-            faces = [
-                ([0, 1, 2, 3], 'front'),  
-                ([5, 4, 7, 6], 'front'),   
-                ([1, 5, 6, 2], 'front'),    
-                ([4, 0, 3, 7], 'front'),   
-                ([3, 2, 6, 7], 'top'),     
-                ([1, 0, 4, 5], 'bottom')   
-            ]
-            
-            texture = FloatingIsland.block_textures[self.block_type]
-            glBindTexture(GL_TEXTURE_2D, texture)
-            
-            for face, _ in faces:
-                glBegin(GL_QUADS)
-              
-                v1 = vertices[face[1]]
-                v2 = vertices[face[2]]
-                v3 = vertices[face[0]]
-                normal = [
-                    (v2[1] - v1[1]) * (v3[2] - v1[2]) - (v2[2] - v1[2]) * (v3[1] - v1[1]),
-                    (v2[2] - v1[2]) * (v3[0] - v1[0]) - (v2[0] - v1[0]) * (v3[2] - v1[2]),
-                    (v2[0] - v1[0]) * (v3[1] - v1[1]) - (v2[1] - v1[1]) * (v3[0] - v1[0])
-                ]
-                glNormal3f(normal[0], normal[1], normal[2])
-                
-                for i, vertex_index in enumerate(face):
-                    glTexCoord2f(uvs[i][0], uvs[i][1])
-                    v = vertices[vertex_index]
-                    glVertex3f(v[0], v[1], v[2])
-                glEnd()
-            
-            glDisable(GL_TEXTURE_2D)
-    
-    def update(self, dt):
-      
-        self.hover_offset = self.hover_amplitude * math.sin(time.time() * self.hover_speed)
+    def block_boxes(self):
+        """Island-local (low, high) corners of the blocks and of the stalactites."""
+        scale = self.size * 0.9
+        block_scale = np.array([scale, scale * 0.8, scale], dtype=np.float32)
         
-        if self.movement_type:
-            self.movement_time += dt
+        blocks = []
+        stalactites = []
+        for block, stalactite in zip(self.blocks, self.stalactites):
+            offset = np.array(block, dtype=np.float32) * scale
+            blocks.append((offset - block_scale / 2, offset + block_scale / 2))
             
-            if self.movement_type == "circular":
-  
-                angle = self.movement_time * self.movement_speed
-                self.center_pos[0] = self.original_pos[0] + math.cos(angle) * self.movement_amplitude
-                self.center_pos[2] = self.original_pos[2] + math.sin(angle) * self.movement_amplitude
-                
-            elif self.movement_type == "horizontal":
-        
-                self.center_pos[0] = self.original_pos[0] + math.sin(self.movement_time * self.movement_speed) * self.movement_amplitude
-                
-            elif self.movement_type == "vertical":
-      
-                self.center_pos[1] = self.original_pos[1] + math.sin(self.movement_time * self.movement_speed) * self.movement_amplitude
-                
-            elif self.movement_type == "figure8":
-            
-                angle = self.movement_time * self.movement_speed
-                self.center_pos[0] = self.original_pos[0] + math.sin(angle * 2) * self.movement_amplitude
-                self.center_pos[2] = self.original_pos[2] + math.sin(angle) * self.movement_amplitude
+            if stalactite is not None:
+                size = np.array([0.3, stalactite, 0.3], dtype=np.float32) * block_scale
+                center = np.array([0.0, -0.5, 0.0], dtype=np.float32) * block_scale + offset
+                stalactites.append((center - size / 2, center + size / 2))
+        return blocks, stalactites
+
+    def build_mesh(self, use_atlas=True):
+        """Bake the island into island-local triangles.
+
+        Returns a float32 (V, 8) array of position, normal and UV. Block
+        faces hidden by a neighbouring block are dropped by island_mesher,
+        and so are the stalactites' tops, which sit inside their blocks.
+        Faces of different blocks are not merged: block heights are
+        jittered, so neighbouring faces never line up into fewer
+        rectangles. With use_atlas=False the UVs stay in
+        0..1 even if the atlas exists. triangle_counts records the counts
+        before and after baking.
+        """
+        blocks, stalactites = self.block_boxes()
+        mesh = np.concatenate([mesh_boxes(blocks, CUBE_FACE_INFO), mesh_boxes(stalactites, STALACTITE_FACE_INFO)])
+        self.triangle_counts = ((len(blocks) + len(stalactites)) * 12, len(mesh) // 3)
+        region = self.atlas_region() if use_atlas else None
+        if region:
+            remap_uvs(mesh, region)
+        return mesh
     
-    def draw(self):
-        glPushMatrix()
-       
-        glTranslatef(
-            self.center_pos[0],
-            self.base_y + self.hover_offset,
-            self.center_pos[2]
+    def render_offset(self, alpha=1.0):
+        """Interpolated (x, y, z) translation between the last two updates."""
+        hover = self.previous_hover_offset + (self.hover_offset - self.previous_hover_offset) * alpha
+        return (
+            self.previous_pos[0] + (self.center_pos[0] - self.previous_pos[0]) * alpha,
+            self.previous_pos[1] + (self.center_pos[1] - self.previous_pos[1]) * alpha + hover,
+            self.previous_pos[2] + (self.center_pos[2] - self.previous_pos[2]) * alpha
         )
-        glCallList(self.display_list)
-        glPopMatrix()
+    
+    def bounding_sphere(self, alpha=1.0):
+        """World-space (center, radius) enclosing the island and its stalactites."""
+        if self.local_bounds is None:
+            blocks, stalactites = self.block_boxes()
+            corners = np.concatenate(blocks + stalactites)
+            low = corners.min(axis=0)
+            high = corners.max(axis=0)
+            self.local_bounds = ((low + high) / 2, float(np.linalg.norm(high - low) / 2))
+        center, radius = self.local_bounds
+        return np.add(self.render_offset(alpha), center), radius
+
+    def draw(self, backend, alpha=1.0):
+        backend.draw_island(self, self.render_offset(alpha))
     
     def get_collision_boxes(self):
-        boxes = []
-        for block in self.blocks:
-            x = self.center_pos[0] + block[0] * self.size * 0.9
-            y = self.base_y + self.hover_offset + block[1] * self.size * 0.9
-            z = self.center_pos[2] + block[2] * self.size * 0.9
-            boxes.append([x, y, z])
-        return boxes 
\ No newline at end of file
+        origin = np.array([self.center_pos[0], self.center_pos[1] + self.hover_offset, self.center_pos[2]])
+        return self.block_offsets + origin
@@ -0,0 +1,66 @@
+import math
+import numpy as np
+
+def normalize(v):
+    return v / np.linalg.norm(v)
+
+class Culler:
+    """Tests bounding spheres against the camera's view frustum.
+
+    The six planes are rebuilt every frame from the same parameters the
+    game hands to gluPerspective and gluLookAt, with inward-facing normals
+    in world space, so a sphere is outside when it lies fully behind any
+    plane. The far plane doubles as the distance cull. `drawn` and
+    `culled` count the tests since the last begin().
+    """
+
+    def __init__(self, fov, aspect, near, far):
+        self.fov = fov
+        self.aspect = aspect
+        self.near = near
+        self.far = far
+        self.normals = np.zeros((6, 3))
+        self.offsets = np.zeros(6)
+        self.drawn = 0
+        self.culled = 0
+
+    def begin(self, eye, target, up=(0, 1, 0)):
+        eye = np.asarray(eye, dtype=float)
+        forward = normalize(np.asarray(target, dtype=float) - eye)
+        side = normalize(np.cross(forward, up))
+        upward = np.cross(side, forward)
+
+        half_y = math.radians(self.fov) / 2
+        half_x = math.atan(math.tan(half_y) * self.aspect)
+
+        self.normals[:] = (
+            forward,
+            -forward,
+            math.sin(half_x) * forward - math.cos(half_x) * side,
+            math.sin(half_x) * forward + math.cos(half_x) * side,
+            math.sin(half_y) * forward - math.cos(half_y) * upward,
+            math.sin(half_y) * forward + math.cos(half_y) * upward,
+        )
+        self.offsets[:] = -self.normals @ eye
+        depth = forward @ eye
+        self.offsets[0] = -(depth + self.near)
+        self.offsets[1] = depth + self.far
+
+        self.drawn = 0
+        self.culled = 0
+
+    def visible(self, center, radius):
+        inside = bool((self.normals @ center + self.offsets >= -radius).all())
+        if inside:
+            self.drawn += 1
+        else:
+            self.culled += 1
+        return inside
+
+    def visible_mask(self, centers, radii):
+        """Vectorised visible() for (N, 3) centers and (N,) radii."""
+        inside = (centers @ self.normals.T + self.offsets >= -np.asarray(radii)[:, None]).all(axis=1)
+        drawn = int(np.count_nonzero(inside))
+        self.drawn += drawn
+        self.culled += len(inside) - drawn
+        return inside
@@ -0,0 +1,59 @@
+import math
+import time
+
+class FixedTimestepLoop:
+    """Runs the simulation at a fixed tick rate independent of frame rate.
+
+    Real elapsed time goes into an accumulator that is drained in whole
+    simulation steps. At most max_steps run per frame; any backlog beyond
+    that is dropped, so a long stall slows the game down briefly instead
+    of locking it into catch-up. Rendering gets the fraction of a step left
+    in the accumulator so it can interpolate between the last two states.
+
+    With a SimClock, real time is converted through its scale and pause
+    before it is accumulated, and the per-frame step limit grows with the
+    scale so fast-forward is not capped by it.
+    """
+
+    def __init__(self, step, render, dt=0.016, max_steps=5, clock=time.perf_counter, sim_clock=None):
+        self.step = step
+        self.render = render
+        self.dt = dt
+        self.max_steps = max_steps
+        self.clock = clock
+        self.sim_clock = sim_clock
+        self.accumulator = 0.0
+        self.last_time = None
+        self.total_steps = 0
+        self.dropped_time = 0.0
+
+    @property
+    def tick_rate(self):
+        return 1.0 / self.dt
+
+    def advance(self):
+        now = self.clock()
+        if self.last_time is None:
+            self.last_time = now
+        elapsed = now - self.last_time
+        self.last_time = now
+        max_steps = self.max_steps
+        if self.sim_clock is not None:
+            elapsed = self.sim_clock.simulated(elapsed)
+            max_steps *= max(1, math.ceil(self.sim_clock.scale))
+        self.accumulator += elapsed
+
+        steps = 0
+        while self.accumulator >= self.dt and steps < max_steps:
+            self.step()
+            self.accumulator -= self.dt
+            steps += 1
+
+        if self.accumulator >= self.dt:
+            backlog = self.accumulator - self.accumulator % self.dt
+            self.dropped_time += backlog
+            self.accumulator -= backlog
+
+        self.total_steps += steps
+        self.render(self.accumulator / self.dt)
+        return steps
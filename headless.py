@@ -0,0 +1,85 @@
+import argparse
+import time
+from pygame.locals import *
+
+from main import Game, SIMULATION_DT
+
+class ScriptedKeys:
+    """Stand-in for pygame.key.get_pressed() that reports a fixed set of keys."""
+
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+def idle_script(tick, game):
+    return (), (0, 0)
+
+def forward_script(tick, game):
+    """Holds W and jumps every second, which is enough to exercise collisions."""
+    pressed = [K_w]
+    if tick % 60 == 0:
+        pressed.append(K_SPACE)
+    return pressed, (0, 0)
+
+class HeadlessSimulation:
+    """Runs Game logic without a window or GL context."""
+
+    def __init__(self, level_index=1, script=idle_script, seed=None, level_dir=None, dt=SIMULATION_DT,
+                 prefetch=True):
+        self.game = Game(headless=True, dt=dt, start_level=level_index, seed=seed, level_dir=level_dir,
+                         prefetch=prefetch)
+        self.script = script
+        self.tick = 0
+
+    def step(self, pressed=(), mouse_delta=(0, 0)):
+        self.game.handle_input(ScriptedKeys(pressed), mouse_delta)
+        self.game.update()
+        self.tick += 1
+
+    def run(self, ticks):
+        start = time.perf_counter()
+        start_tick = self.tick
+        for _ in range(ticks):
+            pressed, mouse_delta = self.script(self.tick, self.game)
+            self.step(pressed, mouse_delta)
+            if self.game.completed:
+                break
+        elapsed = time.perf_counter() - start
+
+        ran = self.tick - start_tick
+        return {
+            'ticks': ran,
+            'seconds': elapsed,
+            'ticks_per_second': ran / elapsed if elapsed > 0 else float('inf'),
+            'level': self.game.level_index,
+            'seed': self.game.seed,
+            'fingerprint': self.game.levels[self.game.level_index]['fingerprint'],
+            'coins_collected': self.game.coins_collected,
+            'player_pos': list(self.game.player.position),
+        }
+
+SCRIPTS = {
+    'idle': idle_script,
+    'forward': forward_script,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Step the game without a display.")
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--ticks', type=int, default=10000)
+    parser.add_argument('--script', choices=sorted(SCRIPTS), default='forward')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--levels', default=None, help="load level files exported by level_file.py from this directory")
+    parser.add_argument('--dt', type=float, default=SIMULATION_DT, help="simulation step in seconds")
+    args = parser.parse_args()
+
+    sim = HeadlessSimulation(args.level, SCRIPTS[args.script], args.seed, args.levels, args.dt)
+    result = sim.run(args.ticks)
+    print(f"Level {result['level']}: {result['ticks']} ticks in {result['seconds']:.3f}s "
+          f"({result['ticks_per_second']:.0f} ticks/s), coins {result['coins_collected']}")
+    print(f"Seed {result['seed']}, layout {result['fingerprint'][:16]}")
+
+if __name__ == "__main__":
+    main()
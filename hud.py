@@ -0,0 +1,104 @@
+import pygame
+from OpenGL.GL import *
+
+PANEL_COLOR = (0, 0, 0, 180)
+CLEAR_COLOR = (0, 0, 0, 0)
+TEXT_CACHE_SIZE = 256
+
+class HudLayer:
+    """Screen-space UI composed on one surface and drawn from one texture.
+
+    Callers describe each panel every frame with panel(); a panel is only
+    re-rendered when its rectangle or text changes, and only the rectangles
+    that changed are uploaded into the HUD texture. Rendered strings are
+    cached by (font, text, color), so an unchanged line is never rendered
+    twice. Panels are assumed not to overlap. Panels that are not described
+    in a frame are erased when it is presented.
+
+    The texture covers the whole window, but present() only has the render
+    backend draw the panel rectangles (one quad each, in a single batch),
+    so the fill cost follows the UI's size rather than the window's.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.texture = None
+        self.texts = {}
+        self.panels = {}
+        self.seen = set()
+        self.dirty = []
+
+    def text(self, font, string, color):
+        key = (font, string, color)
+        surface = self.texts.pop(key, None)
+        if surface is None:
+            surface = font.render(string, True, color)
+            if len(self.texts) >= TEXT_CACHE_SIZE:
+                del self.texts[next(iter(self.texts))]
+        # Re-inserting keeps the dict in least-recently-used order
+        self.texts[key] = surface
+        return surface
+
+    def panel(self, name, rect, items):
+        """Describe a panel; items are (font, text, color, (x, y)) relative to rect."""
+        self.seen.add(name)
+        rect = pygame.Rect(rect)
+        content = (tuple(rect), tuple(items))
+        previous = self.panels.get(name)
+        if previous is not None:
+            if previous[0] == content:
+                return
+            self.erase(previous[1])
+
+        # Text is clipped to the panel so erasing the panel removes all of it
+        self.surface.set_clip(rect)
+        self.surface.fill(PANEL_COLOR, rect)
+        for font, string, color, (x, y) in items:
+            self.surface.blit(self.text(font, string, color), (rect.x + x, rect.y + y))
+        self.surface.set_clip(None)
+        self.panels[name] = (content, rect)
+        self.dirty.append(rect)
+
+    def erase(self, rect):
+        self.surface.fill(CLEAR_COLOR, rect)
+        self.dirty.append(rect)
+
+    def upload(self):
+        if self.texture is None:
+            self.texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            # Rows stay top-down; present() maps them with its texture coordinates
+            data = pygame.image.tostring(self.surface, "RGBA")
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.width, self.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+            self.dirty = []
+            return
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        bounds = self.surface.get_rect()
+        for rect in self.dirty:
+            rect = rect.clip(bounds)
+            if rect.width and rect.height:
+                data = pygame.image.tostring(self.surface.subsurface(rect), "RGBA")
+                glTexSubImage2D(GL_TEXTURE_2D, 0, rect.x, rect.y, rect.width, rect.height, GL_RGBA, GL_UNSIGNED_BYTE, data)
+        self.dirty = []
+
+    def present(self, backend):
+        """Erase panels missing this frame, upload changes and draw the panels."""
+        for name in [name for name in self.panels if name not in self.seen]:
+            self.erase(self.panels.pop(name)[1])
+        self.seen = set()
+
+        if not self.panels:
+            return
+        if self.dirty or self.texture is None:
+            self.upload()
+
+        backend.draw_overlay(self.texture, [rect for _, rect in self.panels.values()], self.width, self.height)
@@ -0,0 +1,121 @@
+import numpy as np
+
+def cube_faces(unit_cube):
+    """Describe each face of a unit cube mesh for the mesher.
+
+    Returns (axis, side, u_axis, v_axis, corners, uv_origin, uv_u, uv_v,
+    normal) per face: the plane axis and side (+1/-1), the two in-plane
+    axes, which rectangle corner each quad vertex sits on, the UV as an
+    affine function of the position within the face, and the normal.
+    """
+    faces = []
+    for first in range(0, len(unit_cube), 6):
+        # build_unit_cube emits quads as (0, 1, 2) and (0, 2, 3)
+        quad = unit_cube[[first, first + 1, first + 2, first + 5]]
+        positions = quad[:, 0:3]
+        axis = int(np.flatnonzero(np.ptp(positions, axis=0) == 0)[0])
+        side = 1 if positions[0, axis] > 0 else -1
+        u_axis, v_axis = [a for a in range(3) if a != axis]
+        corners = [(int(p[u_axis] > 0), int(p[v_axis] > 0)) for p in positions]
+        uvs = {corner: quad[i, 6:8] for i, corner in enumerate(corners)}
+        faces.append((axis, side, u_axis, v_axis, corners,
+                      uvs[(0, 0)], uvs[(1, 0)] - uvs[(0, 0)], uvs[(0, 1)] - uvs[(0, 0)],
+                      quad[0, 3:6]))
+    return faces
+
+def edges(values):
+    return np.unique(np.round(values, 6))
+
+def mesh_boxes(boxes, faces):
+    """Bake axis-aligned boxes into triangles without their hidden faces.
+
+    boxes is a list of (low, high) corners. Faces are grouped by plane;
+    in each plane the area covered by an opposite face of a touching box
+    is removed and what is left of each face is greedily merged back into
+    rectangles, whose UVs stay within 0..1.
+
+    Returns a float32 (V, 8) array of position, normal and UV.
+    """
+    planes = {}
+    for index, (low, high) in enumerate(boxes):
+        low = [float(value) for value in low]
+        high = [float(value) for value in high]
+        for face_id, face in enumerate(faces):
+            axis, side, u_axis, v_axis = face[0:4]
+            coordinate = high[axis] if side > 0 else low[axis]
+            rect = (low[u_axis], high[u_axis], low[v_axis], high[v_axis])
+            planes.setdefault((axis, round(coordinate, 6)), []).append((index, face_id, side, coordinate, rect))
+
+    # Rectangles to emit per face direction: (coordinate, bounds, source bounds)
+    rects = [[] for _ in faces]
+    for entries in planes.values():
+        for side in (1, -1):
+            owners = [entry for entry in entries if entry[2] == side]
+            if owners:
+                covers = [entry for entry in entries if entry[2] != side]
+                rects[owners[0][1]].extend(mesh_plane(owners, covers))
+
+    parts = [face_vertices(face, face_rects) for face, face_rects in zip(faces, rects) if face_rects]
+    if not parts:
+        return np.zeros((0, 8), dtype=np.float32)
+    return np.concatenate(parts)
+
+def mesh_plane(owners, covers):
+    coordinate = owners[0][3]
+    if not covers:
+        # Nothing hides these faces, which is most planes
+        return [(coordinate,) + rect + rect for _, _, _, _, rect in owners]
+
+    us = edges([value for entry in owners + covers for value in entry[4][0:2]])
+    vs = edges([value for entry in owners + covers for value in entry[4][2:4]])
+    mid_u = (us[:-1] + us[1:]) / 2
+    mid_v = (vs[:-1] + vs[1:]) / 2
+
+    # Which owner shows in each cell
+    keys = np.full((len(mid_u), len(mid_v)), -1)
+    sources = {}
+    hidden = np.zeros(keys.shape, dtype=bool)
+    for _, _, _, _, (u0, u1, v0, v1) in covers:
+        hidden |= ((mid_u > u0) & (mid_u < u1))[:, None] & ((mid_v > v0) & (mid_v < v1))[None, :]
+    for index, _, _, _, rect in owners:
+        u0, u1, v0, v1 = rect
+        inside = ((mid_u > u0) & (mid_u < u1))[:, None] & ((mid_v > v0) & (mid_v < v1))[None, :]
+        sources[index] = rect
+        keys[inside & ~hidden & (keys == -1)] = index
+
+    rects = []
+    done = np.zeros(keys.shape, dtype=bool)
+    for i in range(len(mid_u)):
+        for j in range(len(mid_v)):
+            key_id = keys[i, j]
+            if key_id == -1 or done[i, j]:
+                continue
+            # Grow along v, then widen along u while whole columns match
+            j1 = j + 1
+            while j1 < len(mid_v) and keys[i, j1] == key_id and not done[i, j1]:
+                j1 += 1
+            i1 = i + 1
+            while i1 < len(mid_u) and (keys[i1, j:j1] == key_id).all() and not done[i1, j:j1].any():
+                i1 += 1
+            done[i:i1, j:j1] = True
+            rects.append((coordinate, float(us[i]), float(us[i1]), float(vs[j]), float(vs[j1])) + sources[key_id])
+    return rects
+
+def face_vertices(face, rects):
+    """Expand (coordinate, u0, u1, v0, v1, su0, su1, sv0, sv1) rows into triangles."""
+    axis, _, u_axis, v_axis, corners, uv_origin, uv_u, uv_v, normal = face
+    rects = np.array(rects)
+    count = len(rects)
+    vertices = np.empty((count, 4, 8))
+    for corner, (cu, cv) in enumerate(corners):
+        u = rects[:, 2] if cu else rects[:, 1]
+        v = rects[:, 4] if cv else rects[:, 3]
+        vertices[:, corner, axis] = rects[:, 0]
+        vertices[:, corner, u_axis] = u
+        vertices[:, corner, v_axis] = v
+        vertices[:, corner, 3:6] = normal
+        # UVs follow the source face's mapping so textures stay where they were
+        t_u = ((u - rects[:, 5]) / (rects[:, 6] - rects[:, 5]))[:, None]
+        t_v = ((v - rects[:, 7]) / (rects[:, 8] - rects[:, 7]))[:, None]
+        vertices[:, corner, 6:8] = uv_origin + uv_u * t_u + uv_v * t_v
+    return vertices[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 8).astype(np.float32)
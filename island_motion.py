@@ -0,0 +1,130 @@
+import numpy as np
+
+MOVEMENT_TYPES = {
+    None: 0,
+    "circular": 1,
+    "horizontal": 2,
+    "vertical": 3,
+    "figure8": 4,
+}
+
+class IslandMotionSystem:
+    """Moves every island of a level in one vectorised pass per tick.
+
+    Positions, phases, speeds and amplitudes are held as structure-of-arrays
+    buffers. Each island is bound to its row: center_pos, previous_pos and
+    velocity become views into the buffers and hover_offset reads from
+    them, so the rest of the game sees the usual FloatingIsland attributes.
+    Velocities are the analytic derivatives of the movement curves plus
+    the hover, in units per second. Speeds and amplitudes are folded into
+    fixed coefficients when the system is built.
+
+    The constructor takes the per-island arrays, as a level file stores
+    them, with every island at its original position; from_islands()
+    gathers them from FloatingIslands. Islands created later are bound to
+    their rows with FloatingIsland.bind_motion().
+    """
+
+    def __init__(self, original, phase, codes, speed, amplitude, hover_speed, hover_amplitude):
+        count = len(phase)
+        self.count = count
+
+        self.original = np.array(original, dtype=float).reshape(count, 3)
+        self.positions = self.original.copy()
+        self.previous = self.positions.copy()
+        self.velocity = np.zeros((count, 3))
+
+        self.phase = np.array(phase, dtype=float)
+        self.start_phase = self.phase.copy()
+        # Seconds of movement since the system was built
+        self.elapsed = 0.0
+        self.speed = np.array(speed, dtype=float)
+        self.amplitude = np.array(amplitude, dtype=float)
+
+        self.hover_speed = np.array(hover_speed, dtype=float)
+        self.hover_amplitude = np.array(hover_amplitude, dtype=float)
+        self.hover = np.zeros(count)
+        self.previous_hover = self.hover.copy()
+
+        # Each movement curve is a sum of sin/cos(a) and sin/cos(2a) terms,
+        # and the hover is sin(h). With those six values per island in one
+        # array, positions and velocities are fixed per-island linear maps
+        # of it, which evaluates every movement type in one pass.
+        codes = np.asarray(codes, dtype=int)
+        circular = (codes == MOVEMENT_TYPES["circular"]) * self.amplitude
+        horizontal = (codes == MOVEMENT_TYPES["horizontal"]) * self.amplitude
+        vertical = (codes == MOVEMENT_TYPES["vertical"]) * self.amplitude
+        figure8 = (codes == MOVEMENT_TYPES["figure8"]) * self.amplitude
+        speed = self.speed
+
+        self.moving = (codes != 0).astype(float)
+        self.angles = np.zeros((3, count))
+        self.trig = np.zeros((6, count))
+
+        # Rows of trig: sin(a), sin(2a), sin(h), cos(a), cos(2a), cos(h)
+        self.position_terms = np.zeros((count, 3, 6))
+        self.position_terms[:, 0, 3] = circular
+        self.position_terms[:, 0, 0] = horizontal
+        self.position_terms[:, 0, 1] = figure8
+        self.position_terms[:, 1, 0] = vertical
+        self.position_terms[:, 2, 0] = circular + figure8
+
+        self.velocity_terms = np.zeros((count, 3, 6))
+        self.velocity_terms[:, 0, 0] = -circular * speed
+        self.velocity_terms[:, 0, 3] = horizontal * speed
+        self.velocity_terms[:, 0, 4] = 2 * figure8 * speed
+        self.velocity_terms[:, 1, 3] = vertical * speed
+        self.velocity_terms[:, 1, 5] = self.hover_amplitude * self.hover_speed
+        self.velocity_terms[:, 2, 3] = (circular + figure8) * speed
+
+    @classmethod
+    def from_islands(cls, islands):
+        motion = cls([island.original_pos for island in islands],
+                     [island.movement_time for island in islands],
+                     [MOVEMENT_TYPES[island.movement_type] for island in islands],
+                     [island.movement_speed for island in islands],
+                     [island.movement_amplitude for island in islands],
+                     [island.hover_speed for island in islands],
+                     [island.hover_amplitude for island in islands])
+        motion.positions[:] = np.array([island.center_pos for island in islands], dtype=float).reshape(-1, 3)
+        motion.previous[:] = motion.positions
+        motion.hover[:] = [island.hover_offset for island in islands]
+        motion.previous_hover[:] = motion.hover
+        motion.bind(islands)
+        return motion
+
+    def bind(self, islands):
+        for index, island in enumerate(islands):
+            island.bind_motion(self, index)
+
+    def update(self, dt, time_value):
+        """Advance all islands by dt; time_value drives the shared hover."""
+        self.previous[:] = self.positions
+        self.previous_hover[:] = self.hover
+
+        self.elapsed += dt
+        self.phase += self.moving * dt
+        np.multiply(self.phase, self.speed, out=self.angles[0])
+        np.multiply(self.angles[0], 2, out=self.angles[1])
+        np.multiply(self.hover_speed, time_value, out=self.angles[2])
+        np.sin(self.angles, out=self.trig[0:3])
+        np.cos(self.angles, out=self.trig[3:6])
+
+        np.multiply(self.hover_amplitude, self.trig[2], out=self.hover)
+        np.einsum('nkj,jn->nk', self.position_terms, self.trig, out=self.positions)
+        self.positions += self.original
+        np.einsum('nkj,jn->nk', self.velocity_terms, self.trig, out=self.velocity)
+
+    def positions_at(self, elapsed):
+        """Island centres, without hover, at each of the given elapsed times.
+
+        Returns a (len(elapsed), N, 3) array; the system itself is not moved.
+        """
+        elapsed = np.asarray(elapsed, dtype=float).reshape(-1, 1)
+        angles = (self.start_phase + self.moving * elapsed) * self.speed
+        trig = np.zeros((len(elapsed), 6, self.count))
+        trig[:, 0] = np.sin(angles)
+        trig[:, 1] = np.sin(2 * angles)
+        trig[:, 3] = np.cos(angles)
+        trig[:, 4] = np.cos(2 * angles)
+        return np.einsum('nkj,tjn->tnk', self.position_terms, trig) + self.original
@@ -0,0 +1,164 @@
+import numpy as np
+
+from floating_island import FloatingIsland, remap_uvs
+from texture_registry import registry
+
+class IslandRenderer:
+    """Draws a level's islands from a handful of vertex buffers.
+
+    Non-moving islands that share a block type are baked into one buffer in
+    level space and drawn with a single call. Moving islands keep their
+    island-local meshes in one shared buffer and are drawn as ranges of it,
+    each under its own translation.
+
+    With a Culler, islands outside the view are skipped: static batches
+    keep each island's range and bounding sphere, and the visible ranges
+    that sit next to each other are drawn with one call.
+
+    Baking happens in the constructor and needs no GL context, so it can run
+    on a worker thread; upload() creates the buffers through the render
+    backend on the GL thread and maps UVs into the texture atlas if one has
+    been built by then. A level file can hand over what bake() returned
+    instead.
+    """
+
+    def __init__(self, islands, baked=None):
+        self.buffers = []
+        self.static_batches = []
+        self.moving_buffer = None
+        self.atlas = False
+
+        if baked is None:
+            baked = self.bake(islands)
+        self.static_vertices, self.moving_ranges, self.moving_vertices, self.triangle_counts = baked
+
+    @staticmethod
+    def bake(islands):
+        """Return (static_vertices, moving_ranges, moving_vertices, triangle_counts)."""
+        static_vertices = []
+        moving_ranges = []
+        moving_vertices = None
+
+        static_meshes = {}
+        moving = []
+        for island in islands:
+            if island.movement_type:
+                moving.append(island)
+            else:
+                mesh = island.build_mesh(use_atlas=False)
+                mesh[:, 0] += island.center_pos[0]
+                mesh[:, 1] += island.base_y
+                mesh[:, 2] += island.center_pos[2]
+                # Every island in a batch hovers by the same amount, so the
+                # batch can take its offset from the first one.
+                key = (island.block_type, island.hover_speed, island.hover_amplitude)
+                if key not in static_meshes:
+                    static_meshes[key] = (island, [], [])
+                static_meshes[key][1].append(mesh)
+                static_meshes[key][2].append(island.bounding_sphere())
+
+        for (block_type, _, _), (first_island, meshes, spheres) in static_meshes.items():
+            counts = np.array([len(mesh) for mesh in meshes])
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            # Spheres are stored without hover; draw() adds the batch's offset
+            centers = np.array([center for center, _ in spheres])
+            centers[:, 1] -= first_island.hover_offset
+            radii = np.array([radius for _, radius in spheres])
+            bounds = (starts, counts, centers, radii)
+            static_vertices.append((block_type, first_island, np.concatenate(meshes), bounds))
+
+        if moving:
+            moving.sort(key=lambda island: island.block_type)
+            meshes = []
+            first = 0
+            for island in moving:
+                mesh = island.build_mesh(use_atlas=False)
+                meshes.append(mesh)
+                moving_ranges.append((island, first, len(mesh)))
+                first += len(mesh)
+            moving_vertices = np.concatenate(meshes)
+
+        triangle_counts = tuple(int(sum(counts)) for counts in zip(*[island.triangle_counts for island in islands])) or (0, 0)
+        return static_vertices, moving_ranges, moving_vertices, triangle_counts
+
+    @property
+    def uploaded(self):
+        return bool(self.buffers)
+
+    def upload(self, backend):
+        FloatingIsland.load_block_textures()
+        self.atlas = registry.atlas is not None
+
+        for block_type, first_island, vertices, bounds in self.static_vertices:
+            if self.atlas:
+                vertices = remap_uvs(vertices.copy(), first_island.atlas_region())
+            self.static_batches.append((block_type, first_island, self.create_buffer(backend, vertices), len(vertices), bounds))
+
+        if self.moving_vertices is not None:
+            vertices = self.moving_vertices
+            if self.atlas:
+                vertices = vertices.copy()
+                for island, first, count in self.moving_ranges:
+                    remap_uvs(vertices[first:first + count], island.atlas_region())
+            self.moving_buffer = self.create_buffer(backend, vertices)
+
+    def create_buffer(self, backend, vertices):
+        buffer = backend.create_buffer(np.ascontiguousarray(vertices, dtype=np.float32))
+        self.buffers.append(buffer)
+        return buffer
+
+    def bind_texture(self, backend, block_type):
+        if self.atlas:
+            backend.bind_texture(registry.atlas)
+        else:
+            backend.bind_texture(FloatingIsland.block_textures[block_type])
+
+    def draw_ranges(self, backend, count, bounds, hover, culler):
+        if culler is None:
+            backend.draw_arrays(0, count)
+            return
+        starts, counts, centers, radii = bounds
+        visible = culler.visible_mask(centers + (0.0, hover, 0.0), radii)
+        run_start = None
+        for index in range(len(starts) + 1):
+            if index < len(starts) and visible[index]:
+                if run_start is None:
+                    run_start = index
+            elif run_start is not None:
+                first = starts[run_start]
+                backend.draw_arrays(int(first), int(starts[index - 1] + counts[index - 1] - first))
+                run_start = None
+
+    def draw(self, backend, alpha=1.0, culler=None):
+        if not self.uploaded:
+            self.upload(backend)
+
+        backend.begin_batches()
+
+        for block_type, first_island, buffer, count, bounds in self.static_batches:
+            self.bind_texture(backend, block_type)
+            backend.bind_buffer(buffer)
+            hover = first_island.render_offset(alpha)[1] - first_island.center_pos[1]
+            backend.set_translation((0, hover, 0))
+            self.draw_ranges(backend, count, bounds, hover, culler)
+
+        if self.moving_buffer is not None:
+            backend.bind_buffer(self.moving_buffer)
+            bound_type = None
+            for island, first, count in self.moving_ranges:
+                if culler is not None and not culler.visible(*island.bounding_sphere(alpha)):
+                    continue
+                if island.block_type != bound_type:
+                    self.bind_texture(backend, island.block_type)
+                    bound_type = island.block_type
+                backend.set_translation(island.render_offset(alpha))
+                backend.draw_arrays(first, count)
+
+        backend.end_batches()
+
+    def release(self, backend):
+        if self.buffers:
+            backend.delete_buffers(self.buffers)
+        self.buffers = []
+        self.static_batches = []
+        self.moving_buffer = None
@@ -0,0 +1,319 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+from coin import Coin
+from coin_field import CoinField
+from collision_world import CollisionWorld
+from floating_island import FloatingIsland
+from island_motion import MOVEMENT_TYPES, IslandMotionSystem
+from level_fingerprint import level_fingerprint
+from nav_graph import NavGraph
+from portal import Portal
+
+MAGIC = b"SKYLEVEL"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+ALIGNMENT = 64
+EXTENSION = ".skylevel"
+LEVEL_DIR = "levels"
+
+MOVEMENT_NAMES = {code: name for name, code in MOVEMENT_TYPES.items()}
+CELL_KINDS = ('static', 'dynamic')
+
+class LevelFileError(ValueError):
+    pass
+
+class RecordList(Sequence):
+    """A list of level objects, each built from its file record when first used.
+
+    Headless runs never draw, so most islands and coins of a loaded level
+    never need their Python objects at all.
+    """
+
+    def __init__(self, count, build):
+        self.build = build
+        self.objects = [None] * count
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.objects)))]
+        item = self.objects[index]
+        if item is None:
+            item = self.objects[index] = self.build(index % len(self.objects))
+        return item
+
+def level_path(directory, level_index):
+    return os.path.join(directory, f"level{level_index}{EXTENSION}")
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_level(path, level_index, level_data, seed=None, renderer=None, nav_graph=None):
+    """Write a freshly built level, before any update has moved it.
+
+    The file is a fixed header (magic, format version, table length), a
+    JSON table of contents and then the raw arrays, each aligned to 64
+    bytes so read_level() can map them without copying. level_data needs
+    the 'collision_world' that Game.build_level adds; pass the level's
+    IslandRenderer to store its baked vertex buffers as well, and its
+    NavGraph to store the jump graph.
+    """
+    islands = level_data['islands']
+    coins = level_data['coins']
+    portal = level_data['portal']
+    collision_world = level_data['collision_world']
+
+    block_types = sorted({island.block_type for island in islands})
+    coin_textures = sorted({coin.texture_type for coin in coins})
+    block_counts = [len(island.blocks) for island in islands]
+
+    arrays = {
+        'island_position': np.array([island.original_pos for island in islands], dtype=float).reshape(-1, 3),
+        'island_size': np.array([island.size for island in islands], dtype=float),
+        'island_block_type': np.array([block_types.index(island.block_type) for island in islands], dtype=np.uint8),
+        'island_movement': np.array([MOVEMENT_TYPES[island.movement_type] for island in islands], dtype=np.uint8),
+        'island_motion': np.array([[island.movement_time, island.movement_speed, island.movement_amplitude,
+                                    island.hover_speed, island.hover_amplitude] for island in islands],
+                                  dtype=float).reshape(-1, 5),
+        'block_starts': np.concatenate([[0], np.cumsum(block_counts)]).astype(np.int32),
+        'blocks': np.array([block for island in islands for block in island.blocks], dtype=float).reshape(-1, 3),
+        'stalactites': np.array([math.nan if height is None else height
+                                 for island in islands for height in island.stalactites], dtype=float),
+        'coin_position': np.array([coin.position for coin in coins], dtype=float).reshape(-1, 3),
+        'coin_texture': np.array([coin_textures.index(coin.texture_type) for coin in coins], dtype=np.uint8),
+        'coin_phase': np.array([coin.hover_time_offset for coin in coins], dtype=float),
+    }
+
+    cells, static_boxes, static_owners, static_order, dynamic = collision_world.index
+    keys = sorted(cells)
+    arrays['cell_keys'] = np.array(keys, dtype=np.int32).reshape(-1, 2)
+    arrays['cell_starts'] = np.concatenate([[0], np.cumsum([len(cells[key]) for key in keys])]).astype(np.int32)
+    arrays['cell_entries'] = np.array([(CELL_KINDS.index(kind), index) for key in keys for kind, index in cells[key]],
+                                      dtype=np.int32).reshape(-1, 2)
+    arrays['static_boxes'] = static_boxes
+    arrays['static_owners'] = static_owners
+    arrays['static_order'] = static_order
+    arrays['dynamic'] = np.array(dynamic, dtype=np.int32).reshape(-1, 2)
+
+    toc = {
+        'level': level_index,
+        'seed': seed,
+        'fingerprint': level_data['fingerprint'],
+        'block_types': block_types,
+        'coin_textures': coin_textures,
+        'portal': None,
+    }
+    if portal:
+        toc['portal'] = {
+            'position': list(portal.position),
+            'target_level': portal.target_level,
+            'target_position': list(portal.target_position),
+            'orientation': portal.orientation,
+        }
+
+    if renderer is not None:
+        positions = {id(island): index for index, island in enumerate(islands)}
+        batches = []
+        for batch, (block_type, first_island, vertices, bounds) in enumerate(renderer.static_vertices):
+            batches.append([block_type, positions[id(first_island)]])
+            starts, counts, centers, radii = bounds
+            arrays[f'batch{batch}_vertices'] = vertices
+            arrays[f'batch{batch}_starts'] = np.asarray(starts, dtype=np.int64)
+            arrays[f'batch{batch}_counts'] = np.asarray(counts, dtype=np.int64)
+            arrays[f'batch{batch}_centers'] = centers
+            arrays[f'batch{batch}_radii'] = radii
+        if renderer.moving_vertices is not None:
+            arrays['moving_vertices'] = renderer.moving_vertices
+        arrays['moving_ranges'] = np.array([(positions[id(island)], first, count)
+                                            for island, first, count in renderer.moving_ranges],
+                                           dtype=np.int32).reshape(-1, 3)
+        toc['baked'] = {
+            'static_batches': batches,
+            'triangle_counts': list(renderer.triangle_counts),
+        }
+
+    if nav_graph is not None:
+        toc['nav'], nav_arrays = nav_graph.to_arrays()
+        arrays.update(nav_arrays)
+
+    toc['arrays'] = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        toc['arrays'][name] = [array.dtype.str, list(array.shape), offset]
+        offset = align(offset + array.nbytes)
+
+    table = json.dumps(toc, separators=(',', ':')).encode()
+    base = align(HEADER.size + len(table))
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, len(table)))
+        handle.write(table)
+        for name, array in arrays.items():
+            handle.seek(base + toc['arrays'][name][2])
+            handle.write(array.tobytes())
+        handle.truncate(base + offset)
+
+def read_level(path):
+    """Map a level file and return (table of contents, arrays).
+
+    The arrays are read-only views straight into the mapping, so only the
+    pages that are actually used get read from disk. A damaged file raises
+    LevelFileError.
+    """
+    with open(path, 'rb') as handle:
+        if os.fstat(handle.fileno()).st_size < HEADER.size:
+            raise LevelFileError(f"{path} is too short to be a level file")
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, table_length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise LevelFileError(f"{path} is not a level file")
+    if version != VERSION:
+        raise LevelFileError(f"{path} uses level format {version}, this build reads {VERSION}")
+
+    base = align(HEADER.size + table_length)
+    arrays = {}
+    try:
+        toc = json.loads(data[HEADER.size:HEADER.size + table_length])
+        for name, (dtype, shape, offset) in toc['arrays'].items():
+            dtype = np.dtype(dtype)
+            count = math.prod(shape)
+            if base + offset + count * dtype.itemsize > len(data):
+                raise LevelFileError(f"{path} is truncated in array {name}")
+            if count == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=base + offset).reshape(shape)
+    except LevelFileError:
+        raise
+    except (ValueError, KeyError, TypeError) as error:
+        raise LevelFileError(f"{path} has a damaged table of contents: {error}") from error
+    return toc, arrays
+
+def load_level(path, baked=True):
+    """Rebuild a level from a level file.
+
+    Returns the level_data Game.build_level makes: the generators' keys
+    plus 'fingerprint', 'motion', 'coin_field' and 'collision_world', and
+    'nav_graph' when the file holds one. The systems are built straight
+    from the mapped arrays; 'islands' and 'coins' are RecordLists whose
+    objects are made and bound to their rows on first use. When the file
+    holds baked island buffers and baked is set, 'baked' carries them in
+    the form IslandRenderer.bake() returns.
+    """
+    toc, arrays = read_level(path)
+
+    block_starts = arrays['block_starts']
+    island_motion = arrays['island_motion']
+    motion = IslandMotionSystem(arrays['island_position'], island_motion[:, 0], arrays['island_movement'],
+                                island_motion[:, 1], island_motion[:, 2], island_motion[:, 3], island_motion[:, 4])
+
+    def build_island(index):
+        first, last = int(block_starts[index]), int(block_starts[index + 1])
+        stalactites = [None if math.isnan(height) else height for height in arrays['stalactites'][first:last].tolist()]
+        parameters = island_motion[index].tolist()
+        island = FloatingIsland(arrays['island_position'][index].tolist(), size=float(arrays['island_size'][index]),
+                                movement_type=MOVEMENT_NAMES[int(arrays['island_movement'][index])],
+                                block_type=toc['block_types'][arrays['island_block_type'][index]],
+                                layout=(parameters[0], arrays['blocks'][first:last].tolist(), stalactites))
+        island.movement_speed, island.movement_amplitude, island.hover_speed, island.hover_amplitude = parameters[1:]
+        island.bind_motion(motion, index)
+        return island
+
+    def build_coin(index):
+        coin = Coin(arrays['coin_position'][index].tolist(), toc['coin_textures'][arrays['coin_texture'][index]],
+                    hover_time_offset=float(arrays['coin_phase'][index]))
+        coin.bind_field(coin_field, index)
+        return coin
+
+    islands = RecordList(len(island_motion), build_island)
+    coins = RecordList(len(arrays['coin_phase']), build_coin)
+    coin_field = CoinField(arrays['coin_position'], arrays['coin_phase'], coins)
+
+    portal = None
+    if toc['portal']:
+        portal = Portal(toc['portal']['position'], toc['portal']['target_level'],
+                        toc['portal']['target_position'], toc['portal']['orientation'])
+
+    cell_starts = arrays['cell_starts'].tolist()
+    entries = [(CELL_KINDS[kind], index) for kind, index in arrays['cell_entries'].tolist()]
+    cells = {(cx, cz): entries[cell_starts[cell]:cell_starts[cell + 1]]
+             for cell, (cx, cz) in enumerate(arrays['cell_keys'].tolist())}
+    dynamic = arrays['dynamic'].tolist()
+    collision_index = (cells, arrays['static_boxes'], arrays['static_owners'], arrays['static_order'], dynamic)
+    # Only moving islands keep island-local boxes
+    block_offsets = {}
+    for island_index, _ in dynamic:
+        first, last = block_starts[island_index], block_starts[island_index + 1]
+        block_offsets[island_index] = arrays['blocks'][first:last] * (arrays['island_size'][island_index] * 0.9)
+
+    level_data = {
+        'islands': islands,
+        'portal': portal,
+        'coins': coins,
+        'fingerprint': toc['fingerprint'],
+        'motion': motion,
+        'coin_field': coin_field,
+        'collision_world': CollisionWorld(islands, index=collision_index, motion=motion, block_offsets=block_offsets),
+    }
+
+    if 'nav' in toc:
+        level_data['nav_graph'] = NavGraph.from_arrays(toc['nav'], arrays)
+
+    if baked and 'baked' in toc:
+        baked = toc['baked']
+        static_vertices = []
+        for batch, (block_type, first_island) in enumerate(baked['static_batches']):
+            bounds = tuple(arrays[f'batch{batch}_{part}'] for part in ('starts', 'counts', 'centers', 'radii'))
+            static_vertices.append((block_type, islands[first_island], arrays[f'batch{batch}_vertices'], bounds))
+        moving_ranges = [(islands[island], first, count) for island, first, count in arrays['moving_ranges'].tolist()]
+        level_data['baked'] = (static_vertices, moving_ranges, arrays.get('moving_vertices'),
+                               tuple(baked['triangle_counts']))
+    return level_data
+
+def export_levels(directory, seed, levels):
+    """Generate levels with the game's generators and write them out."""
+    from main import Game
+    from island_renderer import IslandRenderer
+
+    os.makedirs(directory, exist_ok=True)
+    game = Game(headless=True, seed=seed)
+    game.prefetcher.shutdown()
+    for level_index in levels:
+        level_data = game.build_level(level_index)
+        renderer = IslandRenderer(level_data['islands'])
+        nav_graph = NavGraph.build(level_data['islands'], level_data['motion'], level_data['coins'],
+                                   level_data['portal'], game.dt)
+        path = level_path(directory, level_index)
+        write_level(path, level_index, level_data, game.seed, renderer, nav_graph)
+
+        start = time.perf_counter()
+        loaded = load_level(path)
+        elapsed = time.perf_counter() - start
+        if level_fingerprint(loaded) != level_data['fingerprint']:
+            raise LevelFileError(f"{path} does not read back as the level that was written")
+        print(f"{path}: {os.path.getsize(path) / 1024:.1f} KiB, "
+              f"layout {level_data['fingerprint'][:16]}, loads in {elapsed * 1000:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the generated levels as level files.")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the generators (random if omitted)")
+    parser.add_argument('--out', default=LEVEL_DIR, help="directory to write the files to")
+    parser.add_argument('--level', type=int, action='append', help="level to export; repeat for several (default: all)")
+    args = parser.parse_args()
+
+    export_levels(args.out, args.seed, args.level or [1, 2, 3, 4])
+
+if __name__ == "__main__":
+    main()
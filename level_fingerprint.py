@@ -0,0 +1,39 @@
+import hashlib
+
+def format_values(values):
+    return ",".join(f"{float(v):.6f}" for v in values)
+
+def level_fingerprint(level_data):
+    """Return a stable hex digest of a level's generated layout.
+
+    Covers everything that decides geometry and collisions: island
+    placement, block and stalactite layout, movement setup, coins and the
+    portal. Floats are rounded to six decimals so the digest only changes
+    when the world does. Must be taken before the level starts updating,
+    since moving islands change their positions in place.
+    """
+    digest = hashlib.sha256()
+
+    for island in level_data['islands']:
+        digest.update(b"island:")
+        digest.update(format_values(island.original_pos).encode())
+        digest.update(f"|{island.size:.6f}|{island.block_type}|{island.movement_type}".encode())
+        digest.update(f"|{island.movement_time:.6f}|{island.movement_speed:.6f}|{island.movement_amplitude:.6f}".encode())
+        for block in island.blocks:
+            digest.update(("|" + format_values(block)).encode())
+        for stalactite in island.stalactites:
+            digest.update(("|-" if stalactite is None else f"|{stalactite:.6f}").encode())
+        digest.update(b"\n")
+
+    for coin in level_data['coins']:
+        digest.update(b"coin:")
+        digest.update(format_values(coin.position).encode())
+        digest.update(f"|{coin.texture_type}|{coin.hover_time_offset:.6f}\n".encode())
+
+    portal = level_data['portal']
+    if portal:
+        digest.update(b"portal:")
+        digest.update(format_values(portal.position).encode())
+        digest.update(f"|{portal.target_level}|{portal.orientation}|{portal.radius:.6f}\n".encode())
+
+    return digest.hexdigest()
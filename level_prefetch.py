@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class LevelPrefetcher:
+    """Builds levels on a worker thread before the player reaches them.
+
+    build is called with a level index and must not touch GL; whatever it
+    returns is handed back from get() on the main thread.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self.pending = {}
+
+    def prefetch(self, level_index):
+        if level_index not in self.pending:
+            self.pending[level_index] = self.executor.submit(self.build, level_index)
+
+    def get(self, level_index):
+        """Return the level, waiting for the worker or building it in place."""
+        future = self.pending.pop(level_index, None)
+        if future is not None:
+            return future.result()
+        return self.build(level_index)
+
+    def shutdown(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=True)
@@ -1,10 +1,8 @@
 import sys
+import argparse
 import pygame
 from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
 import math
-import time
 import random
 import os
 
@@ -12,7 +10,24 @@ from player import Player, CUBE_SIZE, PLAYER_RADIUS
 from camera import Camera
 from portal import Portal
 from coin import Coin
+from coin_field import CoinField
 from floating_island import FloatingIsland
+from texture_registry import registry, image_files
+from mesh_cache import mesh_cache
+from game_loop import FixedTimestepLoop
+from level_prefetch import LevelPrefetcher
+from profiler import FrameProfiler
+from level_fingerprint import level_fingerprint
+from collision_world import CollisionWorld
+from island_motion import IslandMotionSystem
+from island_renderer import IslandRenderer
+from nav_graph import NavGraph
+from sim_clock import SimClock
+from frustum import Culler
+from hud import HudLayer
+from render_backend import FixedFunctionBackend
+from shader_backend import ShaderBackend
+from level_file import LEVEL_DIR, LevelFileError, level_path, load_level as load_level_file
 
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
@@ -20,13 +35,38 @@ FOV = 45.0
 NEAR_CLIP = 0.1
 FAR_CLIP = 100.0
 GRID_SIZE = 10  
+USE_TEXTURE_ATLAS = True
+USE_BATCHED_ISLANDS = True
+USE_CULLING = True
+RENDER_BACKENDS = {backend.name: backend for backend in (FixedFunctionBackend, ShaderBackend)}
+RENDER_BACKEND = "fixed"
+
+SIMULATION_DT = 0.016
+MAX_CATCH_UP_STEPS = 5
+VSYNC = True
+FRAME_SLEEP_MS = 0
+PROFILE_ENABLED = False
+PROFILE_TOGGLE_KEY = K_F3
+PAUSE_KEY = K_p
+FAST_FORWARD_KEY = K_f
 
 class Game:
-    def __init__(self):
-        self.player = Player([0, 2, 0])
-        self.camera = Camera()
+    def __init__(self, headless=False, dt=SIMULATION_DT, start_level=1, seed=None, backend=None, level_dir=None,
+                 prefetch=True):
+        self.headless = headless
+        # Levels exported by level_file.py are loaded from here instead of generated
+        self.level_dir = level_dir
+        self.backend = backend or RENDER_BACKENDS[RENDER_BACKEND]()
+        # One seed fixes every level; without one each run still gets a new world
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.dt = dt
+        # Everything in the simulation reads time from here, never the wall clock
+        self.clock = SimClock()
+        self.completed = False
+        self.gl_ready = False
         self.mouse_sensitivity = 0.2
-        self.level_index = 1
+        self.profiler = FrameProfiler(enabled=PROFILE_ENABLED)
+        self.culler = Culler(FOV, WINDOW_WIDTH / WINDOW_HEIGHT, NEAR_CLIP, FAR_CLIP)
         
         self.level_start_positions = {
             1: [0, 2, 0], 
@@ -35,15 +75,19 @@ class Game:
             4: [0, 2, 0]    
         }
         
-        self.levels = {
-            1: self.generate_earth_level(),   
-            2: self.generate_nether_level(),  
-            3: self.generate_end_level(),     
-            4: self.generate_diamond_level()   
+        self.level_generators = {
+            1: self.generate_earth_level,   
+            2: self.generate_nether_level,  
+            3: self.generate_end_level,     
+            4: self.generate_diamond_level   
         }
-        self.islands = self.levels[self.level_index]['islands']
-        self.portal = self.levels[self.level_index]['portal']
-        self.coins = self.levels[self.level_index]['coins']
+        # Levels are built the first time they are needed; unless prefetch is
+        # off, the one behind the current portal is prepared on a worker
+        # thread in the meantime.
+        self.levels = {}
+        self.prefetch = prefetch
+        self.prefetcher = LevelPrefetcher(self.build_level)
+        self.island_renderer = None
         
         self.sky_colors = {
             1: (0.5, 0.7, 1.0, 1.0),  
@@ -51,39 +95,46 @@ class Game:
             3: (0.1, 0.1, 0.2, 1.0), 
             4: (0.2, 0.5, 0.8, 1.0)  
         }
+        self.ground_colors = {
+            1: (0.2, 0.2, 0.3),
+            2: (0.3, 0.1, 0.1),
+            3: (0.1, 0.3, 0.1),
+            4: (0.4, 0.6, 0.8)
+        }
         
-        self.screen = pygame.display.get_surface()
-        
-        pygame.font.init()
-        self.font = pygame.font.Font(None, 36)
-        self.large_font = pygame.font.Font(None, 48)
+        if not self.headless:
+            self.screen = pygame.display.get_surface()
+            
+            pygame.font.init()
+            self.font = pygame.font.Font(None, 36)
+            self.large_font = pygame.font.Font(None, 48)
+            self.small_font = pygame.font.Font(None, 24)
+            self.hud = HudLayer(WINDOW_WIDTH, WINDOW_HEIGHT)
         
-        self.level_start_time = time.time()
         self.best_times = {1: float('inf'), 2: float('inf'), 3: float('inf'), 4: float('inf')}
         self.current_time = 0.0
-        
-        self.coins_collected = 0  
-        self.total_coins = sum(1 for coin in self.coins if not coin.collected)
         self.total_score = 0  
+        
+        self.load_level(start_level)
 
     def init_gl(self):
-        glClearColor(*self.sky_colors[self.level_index])
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_LIGHTING)
-        glEnable(GL_LIGHT0)
-        glEnable(GL_COLOR_MATERIAL)
-        
-        glLightfv(GL_LIGHT0, GL_POSITION, (5, 15, 5, 1))  
-        glLightfv(GL_LIGHT0, GL_AMBIENT, (0.4, 0.4, 0.4, 1)) 
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, (1.0, 1.0, 1.0, 1))  
-        glLightfv(GL_LIGHT0, GL_SPECULAR, (1.0, 1.0, 1.0, 1))  
-        
-        glLightModelfv(GL_LIGHT_MODEL_AMBIENT, (0.3, 0.3, 0.3, 1.0))
+        self.backend.init_gl(FOV, WINDOW_WIDTH / WINDOW_HEIGHT, NEAR_CLIP, FAR_CLIP)
+        self.backend.set_clear_color(self.sky_colors[self.level_index])
+        
+        # Decode every texture up front on a thread pool; the atlas and the
+        # per-block textures below then only upload
+        registry.preload(image_files())
+        if USE_TEXTURE_ATLAS:
+            registry.build_atlas()
+        mesh_cache.set_projection(FOV, WINDOW_HEIGHT)
+        
+        self.gl_ready = True
+        self.upload_level(self.levels[self.level_index])
 
-    def generate_earth_level(self):
+    def generate_earth_level(self, rng):
         islands = []
         
-        start_island = FloatingIsland([0, 0, 0], size=1.5)
+        start_island = FloatingIsland([0, 0, 0], size=1.5, rng=rng)
         islands.append(start_island)
         
         current_x = 0
@@ -91,16 +142,16 @@ class Game:
         
         for i in range(4):
             current_x += 4
-            current_z += random.uniform(0.5, 1.5)
+            current_z += rng.uniform(0.5, 1.5)
             movement = "horizontal" if i == 2 else None
-            islands.append(FloatingIsland([current_x, 0, current_z], movement_type=movement))
+            islands.append(FloatingIsland([current_x, 0, current_z], movement_type=movement, rng=rng))
         
         for i in range(3):
             current_x += 4
-            current_z += random.uniform(-1, 1)
+            current_z += rng.uniform(-1, 1)
             height = i * 2
             movement = "vertical" if i == 1 else None
-            islands.append(FloatingIsland([current_x, height, current_z], movement_type=movement))
+            islands.append(FloatingIsland([current_x, height, current_z], movement_type=movement, rng=rng))
         
         portal = Portal(
             [current_x + 4, 6, current_z],
@@ -109,20 +160,20 @@ class Game:
             90  
         )
         
-        coins = self.generate_coins(islands[1:-1])
+        coins = self.generate_coins(islands[1:-1], rng)
         
-        coins.append(Coin([0, 4, 0])) 
+        coins.append(Coin([0, 4, 0], rng=rng)) 
         
         mid_x = current_x / 2
         mid_z = current_z / 2
-        coins.append(Coin([mid_x, 3, mid_z])) 
+        coins.append(Coin([mid_x, 3, mid_z], rng=rng)) 
         
         return {'islands': islands, 'portal': portal, 'coins': coins}
 
-    def generate_nether_level(self):
+    def generate_nether_level(self, rng):
         islands = []
         
-        spawn_platform = FloatingIsland([0, 0, 0], size=2.0, block_type="netherrack")
+        spawn_platform = FloatingIsland([0, 0, 0], size=2.0, block_type="netherrack", rng=rng)
         islands.append(spawn_platform)
         
         for x in range(-2, 3):
@@ -130,23 +181,23 @@ class Game:
                 if abs(x) <= 0 and abs(z) <= 0:
                     continue
                     
-                if random.random() < 0.7:  
-                    movement = "circular" if random.random() < 0.3 else None
-                    islands.append(FloatingIsland([x * 4, random.uniform(-1, 1), z * 4], 
+                if rng.random() < 0.7:  
+                    movement = "circular" if rng.random() < 0.3 else None
+                    islands.append(FloatingIsland([x * 4, rng.uniform(-1, 1), z * 4], 
                                                 movement_type=movement, 
-                                                block_type="netherrack"))
+                                                block_type="netherrack", rng=rng))
   
         for _ in range(5):
-            x = random.uniform(-10, 10)
-            z = random.uniform(-10, 10)
-            y = random.uniform(2, 4)
+            x = rng.uniform(-10, 10)
+            z = rng.uniform(-10, 10)
+            y = rng.uniform(2, 4)
       
             if abs(x) < 3 and abs(z) < 3:
                 continue
-            movement = "horizontal" if random.random() < 0.5 else "vertical"
+            movement = "horizontal" if rng.random() < 0.5 else "vertical"
             islands.append(FloatingIsland([x, y, z], 
                                         movement_type=movement, 
-                                        block_type="netherrack"))
+                                        block_type="netherrack", rng=rng))
         
      
         portal = Portal(
@@ -159,17 +210,17 @@ class Game:
 
         coins = []
         for island in islands[1:]:  
-            if random.random() < 0.7: 
+            if rng.random() < 0.7: 
                 coin_pos = [
                     island.center_pos[0],
                     island.base_y + 2, 
                     island.center_pos[2]
                 ]
-                coins.append(Coin(coin_pos, texture_type="lapis"))
+                coins.append(Coin(coin_pos, texture_type="lapis", rng=rng))
         
         return {'islands': islands, 'portal': portal, 'coins': coins}
 
-    def generate_end_level(self):
+    def generate_end_level(self, rng):
         islands = []
         
         center_x = 0
@@ -183,13 +234,13 @@ class Game:
             y = i * 0.5 
             
             movement = "figure8" if i % 5 == 0 else None
-            islands.append(FloatingIsland([x, y, z], movement_type=movement, block_type="emerald"))
+            islands.append(FloatingIsland([x, y, z], movement_type=movement, block_type="emerald", rng=rng))
         
         for _ in range(5):
-            x = random.uniform(-15, 15)
-            z = random.uniform(-15, 15)
-            y = random.uniform(5, 10)
-            islands.append(FloatingIsland([x, y, z], block_type="emerald"))
+            x = rng.uniform(-15, 15)
+            z = rng.uniform(-15, 15)
+            y = rng.uniform(5, 10)
+            islands.append(FloatingIsland([x, y, z], block_type="emerald", rng=rng))
         
         portal = Portal(
             [x, y + 2, z], 
@@ -200,17 +251,17 @@ class Game:
         
         coins = []
         for island in islands:
-            if random.random() < 0.7: 
+            if rng.random() < 0.7: 
                 coin_pos = [
                     island.center_pos[0],
                     island.base_y + 2, 
                     island.center_pos[2]
                 ]
-                coins.append(Coin(coin_pos, texture_type="emerald"))
+                coins.append(Coin(coin_pos, texture_type="emerald", rng=rng))
         
         return {'islands': islands, 'portal': portal, 'coins': coins}
 
-    def generate_diamond_level(self):
+    def generate_diamond_level(self, rng):
         islands = []
         coins = []
         
@@ -227,9 +278,9 @@ class Game:
                 
                 movement = None
                 if (x + z) % 4 == 0:
-                    movement = random.choice(["circular", "figure8", "vertical"])
+                    movement = rng.choice(["circular", "figure8", "vertical"])
                 
-                islands.append(FloatingIsland([pos_x, height, pos_z], size=1.0, movement_type=movement, block_type="purple"))
+                islands.append(FloatingIsland([pos_x, height, pos_z], size=1.0, movement_type=movement, block_type="purple", rng=rng))
         
       
         portal = Portal(
@@ -251,25 +302,25 @@ class Game:
             pos_x = start_offset + (x * spacing)
             pos_z = start_offset + (z * spacing)
             height = math.sin(x * 0.5) * math.cos(z * 0.5) * 2
-            coins.append(Coin([pos_x, height + 3, pos_z]))
+            coins.append(Coin([pos_x, height + 3, pos_z], rng=rng))
         
         return {'islands': islands, 'portal': portal, 'coins': coins}
 
-    def generate_coins(self, islands):
+    def generate_coins(self, islands, rng):
         coins = []
         for island in islands:
-            if random.random() < 0.7:  
+            if rng.random() < 0.7:  
                 coin_pos = [
                     island.center_pos[0],
                     island.base_y + 2,  
                     island.center_pos[2]
                 ]
-                coins.append(Coin(coin_pos))
+                coins.append(Coin(coin_pos, rng=rng))
         return coins
 
     def check_portal_collision(self):
         if self.portal:
-            current_time = time.time()
+            current_time = self.clock.time
             
             dx = self.player.position[0] - self.portal.position[0]
             dy = self.player.position[1] - self.portal.position[1]
@@ -294,6 +345,9 @@ class Game:
                     return False
                     
                 if self.level_index == 4 and self.portal.target_level == 0:
+                    if self.headless:
+                        self.completed = True
+                        return True
                     print("Congratulations! Game completed!")
                     pygame.quit()
                     sys.exit()
@@ -308,36 +362,86 @@ class Game:
                 
                 self.total_score += self.coins_collected
                 
-                target_level = self.portal.target_level
-                
-                self.level_index = target_level
-                level_data = self.levels[self.level_index]
-                self.islands = level_data['islands']
-                self.portal = level_data['portal']
-                self.coins = level_data['coins']
-                
-                self.player = Player(self.level_start_positions[target_level])
-                self.camera = Camera()
-                
-                glClearColor(*self.sky_colors[self.level_index])
-                
-                self.level_start_time = current_time
-                self.coins_collected = 0
-                self.total_coins = sum(1 for coin in self.coins if not coin.collected)
-                
-                # Reset player's coin collection state
-                self.player.coins_collected = 0
-                self.player.current_color = self.player.color_states[0].copy()
-                self.player.target_color = self.player.color_states[0].copy()
-                self.player.glow_intensity = 0.0
+                self.load_level(self.portal.target_level, current_time)
                 
                 return True
         return False
+
+    def build_level(self, level_index):
+        """Generate a level and everything derived from it that needs no GL.
+
+        A level file in level_dir takes the place of the generator, along
+        with the systems, nav graph and island buffers built from it. Runs on
+        the prefetch worker, so it must not touch GL or Game state other
+        than the generators.
+        """
+        level_data = None
+        if self.level_dir is not None:
+            path = level_path(self.level_dir, level_index)
+            if os.path.exists(path):
+                try:
+                    level_data = load_level_file(path, baked=not self.headless and USE_BATCHED_ISLANDS)
+                except LevelFileError as error:
+                    print(f"Warning: {error}, generating level {level_index} instead")
+        if level_data is None:
+            rng = random.Random(f"{self.seed}:{level_index}")
+            level_data = self.level_generators[level_index](rng)
+            level_data['fingerprint'] = level_fingerprint(level_data)
+            level_data['motion'] = IslandMotionSystem.from_islands(level_data['islands'])
+            level_data['coin_field'] = CoinField.from_coins(level_data['coins'])
+            level_data['collision_world'] = CollisionWorld(level_data['islands'])
+        if not self.headless and USE_BATCHED_ISLANDS:
+            level_data['renderer'] = IslandRenderer(level_data['islands'],
+                                                    baked=level_data.pop('baked', None))
+        return level_data
+
+    def get_level(self, level_index):
+        if level_index not in self.levels:
+            self.levels[level_index] = self.prefetcher.get(level_index)
+        return self.levels[level_index]
+
+    def get_nav_graph(self, level_index=None):
+        """The level's jump graph, read from its level file or built on first use."""
+        level_data = self.get_level(self.level_index if level_index is None else level_index)
+        if 'nav_graph' not in level_data:
+            level_data['nav_graph'] = NavGraph.build(level_data['islands'], level_data['motion'],
+                                                     level_data['coins'], level_data['portal'], self.dt)
+        return level_data['nav_graph']
+
+    def upload_level(self, level_data):
+        renderer = level_data.get('renderer')
+        if renderer is not None and not renderer.uploaded:
+            renderer.upload(self.backend)
+        for coin in level_data['coins']:
+            self.backend.prepare_coin(coin)
+
+    def load_level(self, level_index, start_time=None):
+        self.level_index = level_index
+        level_data = self.get_level(self.level_index)
+        self.islands = level_data['islands']
+        self.portal = level_data['portal']
+        self.coins = level_data['coins']
+        self.coin_field = level_data['coin_field']
+        self.collision_world = level_data['collision_world']
+        self.island_motion = level_data['motion']
+        if self.island_renderer is not None:
+            self.island_renderer.release(self.backend)
+        self.island_renderer = level_data.get('renderer')
+        if self.gl_ready:
+            self.upload_level(level_data)
+        
+        if self.prefetch and self.portal and self.portal.target_level in self.level_generators:
+            self.prefetcher.prefetch(self.portal.target_level)
+        
+        self.player = Player(list(self.level_start_positions[level_index]))
+        self.camera = Camera()
         
-    def draw_ui_panel(self, surface, x, y, width, height):
-        panel = pygame.Surface((width, height), pygame.SRCALPHA)
-        panel.fill((0, 0, 0, 180)) 
-        surface.blit(panel, (x, y))
+        if self.gl_ready:
+            self.backend.set_clear_color(self.sky_colors[self.level_index])
+        
+        self.level_start_time = self.clock.time if start_time is None else start_time
+        self.coins_collected = 0
+        self.total_coins = self.coin_field.remaining()
         
     def draw_debug_info(self):
         if not hasattr(self, 'debug_info'):
@@ -349,24 +453,36 @@ class Game:
             f"Portal pos: ({self.debug_info['portal_pos'][0]:.1f}, {self.debug_info['portal_pos'][1]:.1f}, {self.debug_info['portal_pos'][2]:.1f})"
         ]
         
+        profile_texts = []
+        if self.profiler.enabled:
+            profile_texts.append(f"culled {self.culler.culled} / drawn {self.culler.drawn}")
+            profile_texts.append("phase             min / avg / p99 ms")
+            for row in self.profiler.summary():
+                profile_texts.append(f"{row['phase']:<16} {row['min_ms']:6.2f} / {row['avg_ms']:6.2f} / {row['p99_ms']:6.2f}")
+        
         text_height = 25
+        profile_text_height = 18
         panel_padding = 10
-        panel_width = 400
-        panel_height = (len(texts) * text_height) + (panel_padding * 2)
+        panel_width = 480 if profile_texts else 400
+        panel_height = (len(texts) * text_height) + (len(profile_texts) * profile_text_height) + (panel_padding * 2)
         
         panel_x = 10
         panel_y = WINDOW_HEIGHT - panel_height - 10
         
-        self.draw_ui_panel(self.screen, panel_x, panel_y, panel_width, panel_height)
-        
-        y = panel_y + panel_padding
+        items = []
+        y = panel_padding
         for text in texts:
-            text_surface = self.font.render(text, True, (200, 200, 200)) 
-            self.screen.blit(text_surface, (panel_x + panel_padding, y))
+            items.append((self.font, text, (200, 200, 200), (panel_padding, y)))
             y += text_height
         
+        for text in profile_texts:
+            items.append((self.small_font, text, (150, 220, 150), (panel_padding, y)))
+            y += profile_text_height
+
+        self.hud.panel('debug', (panel_x, panel_y, panel_width, panel_height), items)
+        
     def draw_scoreboard(self):
-        self.current_time = time.time() - self.level_start_time
+        self.current_time = self.clock.time - self.level_start_time
         
         if self.level_index == 4 and self.portal.target_level == 0:
             texts = [
@@ -384,28 +500,34 @@ class Game:
                 f"Coins: {self.coins_collected}/{self.total_coins}",
                 f"Need 5 coins for portal!"
             ]
+        if self.clock.paused:
+            texts.append("Paused")
+        elif self.clock.scale != 1.0:
+            texts.append(f"Speed x{self.clock.scale:g}")
+
+        lines = []
+        for text in texts:
+            if "Need 5 coins" in text:
+                color = (0, 255, 0) if self.coins_collected >= 5 else (255, 50, 50)
+            else:
+                color = (255, 255, 0) 
+            lines.append((text, color, self.hud.text(self.large_font, text, color).get_width()))
 
         text_height = 35
         panel_padding = 15
-        panel_width = 250
+        panel_width = max(250, max(width for _, _, width in lines) + panel_padding * 2)
         panel_height = (len(texts) * text_height) + (panel_padding * 2)
         
         panel_x = WINDOW_WIDTH - panel_width - 10
         panel_y = 10
 
-        self.draw_ui_panel(self.screen, panel_x, panel_y, panel_width, panel_height)
-        
-        y = panel_y + panel_padding
-        for i, text in enumerate(texts):
-            if "Need 5 coins" in text:
-                color = (0, 255, 0) if self.coins_collected >= 5 else (255, 50, 50)
-            else:
-                color = (255, 255, 0) 
-            
-            text_surface = self.large_font.render(text, True, color)
-            x = panel_x + (panel_width - text_surface.get_width()) // 2
-            self.screen.blit(text_surface, (x, y))
+        items = []
+        y = panel_padding
+        for text, color, width in lines:
+            items.append((self.large_font, text, color, ((panel_width - width) // 2, y)))
             y += text_height
+
+        self.hud.panel('scoreboard', (panel_x, panel_y, panel_width, panel_height), items)
             
     def draw_winning_message(self):
         if self.level_index == 5:  
@@ -425,15 +547,15 @@ class Game:
             panel_x = (WINDOW_WIDTH - panel_width) // 2
             panel_y = (WINDOW_HEIGHT - panel_height) // 2
             
-            self.draw_ui_panel(self.screen, panel_x, panel_y, panel_width, panel_height)
-            
-            y = panel_y + panel_padding
+            items = []
+            y = panel_padding
             for message in messages:
-                text_surface = self.large_font.render(message, True, (255, 255, 0))
-                x = panel_x + (panel_width - text_surface.get_width()) // 2
-                self.screen.blit(text_surface, (x, y))
+                text_surface = self.hud.text(self.large_font, message, (255, 255, 0))
+                items.append((self.large_font, message, (255, 255, 0), ((panel_width - text_surface.get_width()) // 2, y)))
                 y += text_height
 
+            self.hud.panel('winning', (panel_x, panel_y, panel_width, panel_height), items)
+
     def draw_total_score(self):
         panel_padding = 15
         panel_width = 200
@@ -442,107 +564,141 @@ class Game:
         panel_x = 10
         panel_y = 10
         
-        self.draw_ui_panel(self.screen, panel_x, panel_y, panel_width, panel_height)
-        
         score_text = f"Score: {self.total_score}"
-        text_surface = self.large_font.render(score_text, True, (255, 255, 0)) 
+        text_surface = self.hud.text(self.large_font, score_text, (255, 255, 0))
         
-        x = panel_x + panel_padding
-        y = panel_y + (panel_height - text_surface.get_height()) // 2
+        x = panel_padding
+        y = (panel_height - text_surface.get_height()) // 2
         
-        self.screen.blit(text_surface, (x, y))
+        self.hud.panel('score', (panel_x, panel_y, panel_width, panel_height),
+                       [(self.large_font, score_text, (255, 255, 0), (x, y))])
 
-    def draw_scene(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        
-        camera_pos = self.camera.get_position(self.player.position)
-        
-        gluLookAt(
-            camera_pos[0], camera_pos[1], camera_pos[2],
-            self.player.position[0], self.player.position[1], self.player.position[2],
-            0, 1, 0
-        )
+    def draw_scene(self, alpha=1.0):
+        with self.profiler.section('draw.world'):
+            self.draw_world(alpha)
+        
+        with self.profiler.section('draw.hud'):
+            self.draw_debug_info()
+            self.draw_scoreboard()
+            self.draw_total_score()  
+            self.hud.present(self.backend)
+        
+    def draw_world(self, alpha=1.0):
+        backend = self.backend
+        player_pos = self.player.render_position(alpha)
+        camera_pos = self.camera.get_position(player_pos)
+        
+        backend.begin_frame(camera_pos, player_pos)
 
-        self.player.draw()
+        culler = self.culler if USE_CULLING else None
+        if culler:
+            culler.begin(camera_pos, player_pos)
 
-        for island in self.islands:
-            island.draw()
+        self.player.draw(backend, alpha, camera_pos)
 
-        for coin in self.coins:
-            coin.draw()
+        if USE_BATCHED_ISLANDS:
+            if self.island_renderer is None:
+                self.island_renderer = IslandRenderer(self.islands)
+            self.island_renderer.draw(backend, alpha, culler)
+        else:
+            for island in self.islands:
+                if culler is None or culler.visible(*island.bounding_sphere(alpha)):
+                    island.draw(backend, alpha)
 
-        if self.portal:
-            self.portal.draw(self.coins_collected)
-        
-
-        glPushMatrix()
-        if self.level_index == 1:
-            glColor3f(0.2, 0.2, 0.3) 
-        elif self.level_index == 2:
-            glColor3f(0.3, 0.1, 0.1) 
-        elif self.level_index == 3:
-            glColor3f(0.1, 0.3, 0.1) 
-        elif self.level_index == 4:
-            glColor3f(0.4, 0.6, 0.8) 
-        
-        glBegin(GL_QUADS)
-        glVertex3f(-50, -20, -50)
-        glVertex3f(-50, -20, 50)
-        glVertex3f(50, -20, 50)
-        glVertex3f(50, -20, -50)
-        glEnd()
-        glPopMatrix()
-        
-    
-        pygame.display.flip()  
-        self.draw_debug_info()
-        self.draw_scoreboard()
-        self.draw_total_score()  
-        pygame.display.flip() 
+        coins = self.coin_field.active_coins()
+        if culler and coins:
+            coins = [coin for coin, visible in zip(coins, culler.visible_mask(*self.coin_field.bounding_spheres())) if visible]
+        for coin in coins:
+            coin.draw(backend, camera_pos)
+
+        if self.portal and (culler is None or culler.visible(*self.portal.bounding_sphere())):
+            self.portal.draw(backend, self.coins_collected, camera_pos)
+
+        backend.draw_ground(self.ground_colors.get(self.level_index))
         
-    def handle_input(self):
-        keys = pygame.key.get_pressed()
+    def handle_input(self, keys=None, mouse_delta=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
+        if mouse_delta is None:
+            mouse_delta = pygame.mouse.get_rel()
 
-        mouse_dx, mouse_dy = pygame.mouse.get_rel()
+        mouse_dx, mouse_dy = mouse_delta
         self.camera.update(mouse_dx * self.mouse_sensitivity, mouse_dy * self.mouse_sensitivity)
 
-        self.player.update_movement(keys, self.camera.get_forward(), 0.016)
+        self.player.update_movement(keys, self.camera.get_forward(), self.dt)
         
         if keys[K_SPACE]:
             self.player.jump()
 
     def update(self):
-        collision_boxes = []
-        for island in self.islands:
-            island.update(0.016)
-            collision_boxes.extend(island.get_collision_boxes())
+        profiler = self.profiler
+        now = self.clock.tick(self.dt)
+        
+        with profiler.section('update.islands'):
+            self.island_motion.update(self.dt, now)
         
-        self.player.update(0.016, collision_boxes)
+        with profiler.section('update.collision'):
+            # The player moves before it resolves collisions, so widen the query by
+            # the distance it can cover this tick plus the collision look-ahead.
+            speed = math.sqrt(sum(v * v for v in self.player.velocity))
+            collision_boxes = self.collision_world.query(self.player.position, self.player.radius, speed * self.dt * 2 + 0.5)
+            
+            self.player.update(self.dt, collision_boxes)
         
-        for coin in self.coins:
-            coin.update(0.016)
-            if coin.check_collection(self.player.position):
+        with profiler.section('update.coins'):
+            self.coin_field.update(self.dt, now)
+            for _ in self.coin_field.collect(self.player.position):
                 self.coins_collected += 1
                 self.player.collect_coin()
         
-        self.check_portal_collision()
+        with profiler.section('update.portal'):
+            if self.portal:
+                self.portal.update(self.dt)
+            
+            self.check_portal_collision()
+
+    def step(self):
+        with self.profiler.section('input'):
+            self.handle_input()
+        with self.profiler.section('update'):
+            self.update()
+
+def create_window(backend, vsync=VSYNC, flags=0):
+    """Open the GL window with the context the backend asks for."""
+    for attribute, value in backend.context_attributes:
+        pygame.display.gl_set_attribute(attribute, value)
+    display = (WINDOW_WIDTH, WINDOW_HEIGHT)
+    try:
+        pygame.display.set_mode(display, DOUBLEBUF | OPENGL | flags, vsync=1 if vsync else 0)
+    except pygame.error:
+        pygame.display.set_mode(display, DOUBLEBUF | OPENGL | flags)
 
 def main():
+    parser = argparse.ArgumentParser(description="Sky Island Hopper")
+    parser.add_argument('--profile', action='store_true', help="start with the frame profiler enabled")
+    parser.add_argument('--profile-out', help="write profiler stats to this .csv or .json file on exit")
+    parser.add_argument('--renderer', choices=sorted(RENDER_BACKENDS), default=RENDER_BACKEND,
+                        help="fixed-function GL or the GL 3.3 core-profile shader path")
+    parser.add_argument('--levels', default=LEVEL_DIR,
+                        help="load levels exported by level_file.py from this directory when present")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="simulated seconds per real second; toggle pause and fast-forward in game")
+    args = parser.parse_args()
+
     pygame.init()
-    display = (WINDOW_WIDTH, WINDOW_HEIGHT)
-    pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
+    backend = RENDER_BACKENDS[args.renderer]()
+    create_window(backend)
     pygame.display.set_caption("Sky Island Hopper")
     
     pygame.mouse.set_visible(False)
     pygame.event.set_grab(True)
 
-    game = Game()
+    game = Game(backend=backend, level_dir=args.levels)
+    game.clock.set_scale(args.time_scale)
+    game.profiler.enabled = PROFILE_ENABLED or args.profile or bool(args.profile_out)
     game.init_gl()
 
-    glMatrixMode(GL_PROJECTION)
-    gluPerspective(FOV, (display[0]/display[1]), NEAR_CLIP, FAR_CLIP)
-    glMatrixMode(GL_MODELVIEW)
+    loop = FixedTimestepLoop(game.step, game.draw_scene, game.dt, MAX_CATCH_UP_STEPS, sim_clock=game.clock)
 
     running = True
     while running:
@@ -554,16 +710,30 @@ def main():
                     running = False
                     pygame.mouse.set_visible(True)
                     pygame.event.set_grab(False)
-        
-        game.handle_input()
-        
-        game.update()
-        
-        game.draw_scene()
+                elif event.key == PROFILE_TOGGLE_KEY:
+                    game.profiler.enabled = not game.profiler.enabled
+                elif event.key == PAUSE_KEY:
+                    game.clock.toggle_pause()
+                elif event.key == FAST_FORWARD_KEY:
+                    game.clock.toggle_fast_forward()
+        
+        if game.clock.paused:
+            # No ticks run while paused; drop the mouse motion so the camera
+            # does not jump on resume
+            pygame.mouse.get_rel()
 
-        pygame.display.flip()
-        pygame.time.wait(10)
-        
+        with game.profiler.section('frame'):
+            loop.advance()
+
+            with game.profiler.section('present'):
+                pygame.display.flip()
+            if FRAME_SLEEP_MS:
+                with game.profiler.section('sleep'):
+                    pygame.time.wait(FRAME_SLEEP_MS)
+        
+    if args.profile_out:
+        game.profiler.dump(args.profile_out)
+    game.prefetcher.shutdown()
     pygame.quit()
 
 if __name__ == "__main__":
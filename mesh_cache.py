@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+# (minimum projected diameter in pixels, tessellation), finest first
+SPHERE_LODS = ((200, 64), (80, 32), (30, 16), (0, 8))
+DISC_LODS = ((60, 32), (20, 16), (0, 8))
+
+class MeshCache:
+    """Display lists for tessellated primitives, compiled once per detail level.
+
+    Callers pick a level with select(), which estimates the object's
+    on-screen diameter from its distance to the eye and the vertical field
+    of view, then fetch the matching list with get(). Lists are keyed by
+    the caller, so objects that look the same share them.
+    """
+
+    def __init__(self, fov=45.0, viewport_height=600):
+        self.lists = {}
+        self.circles = {}
+        self.set_projection(fov, viewport_height)
+
+    def set_projection(self, fov, viewport_height):
+        self.pixels_per_unit = viewport_height / (2.0 * math.tan(math.radians(fov) / 2.0))
+
+    def projected_size(self, radius, distance):
+        return 2.0 * radius * self.pixels_per_unit / max(distance, 1e-6)
+
+    def select(self, lods, radius, position, eye=None):
+        """Return the tessellation for an object of this radius seen from eye."""
+        if eye is None:
+            return lods[0][1]
+        size = self.projected_size(radius, math.dist(eye, position))
+        for min_size, detail in lods:
+            if size >= min_size:
+                return detail
+        return lods[-1][1]
+
+    def get(self, key, build):
+        display_list = self.lists.get(key)
+        if display_list is None:
+            display_list = glGenLists(1)
+            glNewList(display_list, GL_COMPILE)
+            build()
+            glEndList()
+            self.lists[key] = display_list
+        return display_list
+
+    def sphere(self, radius, detail):
+        def build():
+            quad = gluNewQuadric()
+            gluQuadricNormals(quad, GLU_SMOOTH)
+            gluQuadricTexture(quad, GL_TRUE)
+            gluSphere(quad, radius, detail, detail)
+            gluDeleteQuadric(quad)
+        return self.get(('sphere', radius, detail), build)
+
+    def circle(self, segments):
+        """Return the closed ring of (angle, cos, sin) for a segment count."""
+        circle = self.circles.get(segments)
+        if circle is None:
+            circle = []
+            for i in range(segments + 1):
+                angle = (i / segments) * 2 * math.pi
+                circle.append((angle, math.cos(angle), math.sin(angle)))
+            self.circles[segments] = circle
+        return circle
+
+    def clear(self):
+        for display_list in self.lists.values():
+            glDeleteLists(display_list, 1)
+        self.lists = {}
+
+def sphere_vertices(radius, detail):
+    """Triangles of a UV sphere with detail slices and stacks, poles on y.
+
+    Returns a float32 (V, 8) array of position, normal and UV, the layout
+    the island meshes use, for backends that cannot record gluSphere.
+    """
+    stacks = np.linspace(0.0, math.pi, detail + 1)[:, None]
+    slices = np.linspace(0.0, 2 * math.pi, detail + 1)[None, :]
+    grid = np.empty((detail + 1, detail + 1, 8), dtype=np.float32)
+    grid[:, :, 3] = np.sin(stacks) * np.cos(slices)
+    grid[:, :, 4] = np.cos(stacks)
+    grid[:, :, 5] = np.sin(stacks) * np.sin(slices)
+    grid[:, :, 0:3] = grid[:, :, 3:6] * radius
+    grid[:, :, 6] = slices / (2 * math.pi)
+    grid[:, :, 7] = 1.0 - stacks / math.pi
+    quads = np.stack([grid[:-1, :-1], grid[1:, :-1], grid[1:, 1:],
+                      grid[:-1, :-1], grid[1:, 1:], grid[:-1, 1:]], axis=2)
+    return quads.reshape(-1, 8)
+
+mesh_cache = MeshCache()
@@ -0,0 +1,245 @@
+import heapq
+import math
+
+import numpy as np
+
+from player import AIR_CONTROL, CUBE_SIZE, Player
+
+# Samples of the movement period used to find when moving islands line up
+WINDOW_SAMPLES = 64
+# Share of the ideal jump distance a route may rely on
+JUMP_MARGIN = 0.85
+
+class JumpModel:
+    """How far and how high a Player can jump, from its tuning.
+
+    A jump leaves the ground at the friction-limited running speed and
+    keeps accelerating through the air at the air-control share of full
+    speed, under gravity from jump_force. Heights are between the surfaces
+    the player stands on.
+    """
+
+    def __init__(self, dt):
+        template = Player()
+        self.jump_force = template.jump_force
+        self.gravity = -template.gravity[1]
+        self.stand = CUBE_SIZE + template.radius
+        # Ground friction scales velocity every tick, which caps running speed
+        self.run_speed = (template.friction * template.max_move_speed * dt) / (1 - template.friction)
+        self.air_acceleration = AIR_CONTROL * template.max_move_speed
+        self.max_rise = self.jump_force ** 2 / (2 * self.gravity)
+
+    def air_time(self, rise):
+        """Seconds from take-off to landing rise higher up; NaN above the apex."""
+        disc = self.jump_force ** 2 - 2 * self.gravity * np.asarray(rise, dtype=float)
+        return (self.jump_force + np.sqrt(np.where(disc >= 0, disc, np.nan))) / self.gravity
+
+    def reach(self, air_time):
+        """Horizontal distance covered in air_time, with JUMP_MARGIN applied."""
+        return (self.run_speed * air_time + 0.5 * self.air_acceleration * air_time ** 2) * JUMP_MARGIN
+
+class NavGraph:
+    """Which islands of a level can be jumped to from which, and routes between them.
+
+    Nodes are islands. An edge a -> b exists when a jump from a's standing
+    area lands in b's at some point of the level's movement period; edges
+    touching moving islands carry the windows of elapsed movement time
+    (IslandMotionSystem.elapsed, modulo period) in which they are open, and
+    an edge without windows is always open. Each edge costs the running time
+    between the island centres plus the air time and the average wait for
+    its window. Edges are sorted by their source island, so each island's
+    edges are one slice of the arrays; the slices are only turned into
+    neighbour lists when a route first expands that island. Routes are
+    found with A* and cached, together with every suffix of a found route,
+    since those are optimal too.
+    """
+
+    def __init__(self, centres, tops, edges, costs, window_starts, windows, coin_islands,
+                 portal_island, period, run_speed):
+        self.centres = centres
+        self.tops = tops
+        self.edges = edges
+        self.costs = costs
+        self.window_starts = window_starts
+        self.windows = windows
+        self.coin_islands = coin_islands
+        self.portal_island = portal_island
+        self.period = period
+        self.run_speed = run_speed
+
+        self.edge_starts = np.searchsorted(edges[:, 0], np.arange(len(centres) + 1)).tolist()
+        self.neighbour_lists = {}
+        self.paths = {}
+
+    @classmethod
+    def build(cls, islands, motion, coins, portal, dt):
+        """Build the graph for a level freshly out of Game.build_level."""
+        model = JumpModel(dt)
+        count = len(islands)
+        speeds = [island.movement_speed for island in islands if island.movement_type]
+        period = 2 * math.pi / min(speeds) if speeds else 0.0
+        samples = WINDOW_SAMPLES if speeds else 1
+        times = np.arange(samples) * (period / samples)
+
+        # Block layout relative to each island's centre; boxes span
+        # [y, y + CUBE_SIZE] and can be stood on within model.stand in x and z
+        low = np.array([island.block_offsets.min(axis=0) for island in islands]).reshape(count, 3)
+        high = np.array([island.block_offsets.max(axis=0) for island in islands]).reshape(count, 3)
+        positions = motion.positions_at(times)
+        centres = positions[0]
+        tops = positions[:, :, 1] + high[:, 1] + CUBE_SIZE
+
+        # Gaps between standing areas, shape (samples, from, to)
+        gap_x = np.maximum(0, np.maximum((positions[:, None, :, 0] + low[:, 0]) - (positions[:, :, None, 0] + high[:, None, 0]),
+                                         (positions[:, :, None, 0] + low[:, None, 0]) - (positions[:, None, :, 0] + high[:, 0]))
+                           - 2 * model.stand)
+        gap_z = np.maximum(0, np.maximum((positions[:, None, :, 2] + low[:, 2]) - (positions[:, :, None, 2] + high[:, None, 2]),
+                                         (positions[:, :, None, 2] + low[:, None, 2]) - (positions[:, None, :, 2] + high[:, 2]))
+                           - 2 * model.stand)
+        rise = tops[:, None, :] - tops[:, :, None]
+        air_time = model.air_time(rise)
+        with np.errstate(invalid='ignore'):
+            open_ = (rise <= model.max_rise * JUMP_MARGIN) & (np.hypot(gap_x, gap_z) <= model.reach(air_time))
+        open_[:, np.arange(count), np.arange(count)] = False
+
+        distance = np.hypot(centres[None, :, 0] - centres[:, None, 0], centres[None, :, 2] - centres[:, None, 2])
+        step = period / samples
+        edges, costs, window_starts, windows = [], [], [0], []
+        for a, b in zip(*np.nonzero(open_.any(axis=0))):
+            feasible = open_[:, a, b]
+            wait = 0.0
+            if not feasible.all():
+                # Runs of open samples become windows; one wrapping past the
+                # end of the period is joined to the run at its start
+                changes = np.flatnonzero(np.diff(np.concatenate([[False], feasible, [False]]).astype(int)))
+                runs = changes.reshape(-1, 2).tolist()
+                if feasible[0] and feasible[-1] and len(runs) > 1:
+                    first = runs.pop(0)
+                    runs[-1][1] = samples + first[1]
+                windows.extend((start * step, end * step) for start, end in runs)
+                # Arriving at a uniformly random time, a closed stretch of
+                # length g costs g^2 / (2 * period) of waiting on average
+                reopen = [start for start, _ in runs[1:]] + [runs[0][0] + samples]
+                wait = sum(((start - end) * step) ** 2 for (_, end), start in zip(runs, reopen)) / (2 * period)
+            edges.append((a, b))
+            costs.append(distance[a, b] / model.run_speed + np.nanmin(air_time[feasible, a, b]) + wait)
+            window_starts.append(len(windows))
+
+        coin_islands = [cls.nearest(centres, low, high, tops[0], coin.position, model.stand) for coin in coins]
+        portal_island = cls.nearest(centres, low, high, tops[0], portal.position, model.stand) if portal else -1
+        return cls(centres, tops[0], np.array(edges, dtype=np.int32).reshape(-1, 2), np.array(costs, dtype=float),
+                   np.array(window_starts, dtype=np.int32), np.array(windows, dtype=float).reshape(-1, 2),
+                   np.array(coin_islands, dtype=np.int32), portal_island, period, model.run_speed)
+
+    @staticmethod
+    def nearest(centres, low, high, tops, position, stand):
+        """The island whose standing area is horizontally closest to position, below it if possible."""
+        gap_x = np.maximum(0, np.abs(position[0] - centres[:, 0] - (low[:, 0] + high[:, 0]) / 2)
+                           - (high[:, 0] - low[:, 0]) / 2 - stand)
+        gap_z = np.maximum(0, np.abs(position[2] - centres[:, 2] - (low[:, 2] + high[:, 2]) / 2)
+                           - (high[:, 2] - low[:, 2]) / 2 - stand)
+        distance = np.hypot(gap_x, gap_z) + (tops > position[1]) * 1e3
+        return int(np.argmin(distance))
+
+    def to_arrays(self):
+        """Return (metadata, arrays) for storing the graph in a level file."""
+        meta = {'period': self.period, 'portal_island': self.portal_island, 'run_speed': self.run_speed}
+        arrays = {
+            'nav_centres': self.centres,
+            'nav_tops': self.tops,
+            'nav_edges': self.edges,
+            'nav_costs': self.costs,
+            'nav_window_starts': self.window_starts,
+            'nav_windows': self.windows,
+            'nav_coin_islands': self.coin_islands,
+        }
+        return meta, arrays
+
+    @classmethod
+    def from_arrays(cls, meta, arrays):
+        return cls(arrays['nav_centres'], arrays['nav_tops'], arrays['nav_edges'], arrays['nav_costs'],
+                   arrays['nav_window_starts'], arrays['nav_windows'], arrays['nav_coin_islands'],
+                   meta['portal_island'], meta['period'], meta['run_speed'])
+
+    def edge_windows(self, edge):
+        return self.windows[self.window_starts[edge]:self.window_starts[edge + 1]]
+
+    def is_open(self, edge, elapsed):
+        """Whether a jump along edge works at this elapsed movement time."""
+        windows = self.edge_windows(edge)
+        if not len(windows):
+            return True
+        t = elapsed % self.period
+        return bool((((windows[:, 0] <= t) & (t < windows[:, 1])) |
+                     ((windows[:, 0] <= t + self.period) & (t + self.period < windows[:, 1]))).any())
+
+    def neighbours(self, node):
+        """(island, edge, cost) for every edge leaving node."""
+        entries = self.neighbour_lists.get(node)
+        if entries is None:
+            first, last = self.edge_starts[node], self.edge_starts[node + 1]
+            entries = list(zip(self.edges[first:last, 1].tolist(), range(first, last),
+                               self.costs[first:last].tolist()))
+            self.neighbour_lists[node] = entries
+        return entries
+
+    def heuristic(self, a, b):
+        return math.hypot(self.centres[a, 0] - self.centres[b, 0], self.centres[a, 2] - self.centres[b, 2]) / self.run_speed
+
+    def path(self, start, goal):
+        """Islands from start to goal, both included, or None when goal cannot be reached."""
+        key = (start, goal)
+        if key in self.paths:
+            return self.paths[key]
+
+        best = {start: 0.0}
+        came_from = {}
+        frontier = [(self.heuristic(start, goal), 0.0, start)]
+        route = None
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == goal:
+                route = [node]
+                while route[-1] != start:
+                    route.append(came_from[route[-1]])
+                route.reverse()
+                break
+            if cost > best[node]:
+                continue
+            for neighbour, _, edge_cost in self.neighbours(node):
+                total = cost + edge_cost
+                if total < best.get(neighbour, math.inf):
+                    best[neighbour] = total
+                    came_from[neighbour] = node
+                    heapq.heappush(frontier, (total + self.heuristic(neighbour, goal), total, neighbour))
+
+        if route is None:
+            self.paths[key] = None
+            return None
+        for index in range(len(route)):
+            self.paths.setdefault((route[index], goal), route[index:])
+        return route
+
+    def path_to_coin(self, start, coin_index):
+        return self.path(start, int(self.coin_islands[coin_index]))
+
+    def path_to_portal(self, start):
+        if self.portal_island < 0:
+            return None
+        return self.path(start, self.portal_island)
+
+    def island_at(self, position, centres=None):
+        """The nearest island whose top is not above a player at position.
+
+        centres gives the islands' current positions, such as
+        IslandMotionSystem.positions; by default they are taken at the start
+        of the movement period.
+        """
+        tops = self.tops
+        if centres is None:
+            centres = self.centres
+        else:
+            tops = tops + (centres[:, 1] - self.centres[:, 1])
+        below = tops <= position[1] + 0.5
+        distance = np.hypot(centres[:, 0] - position[0], centres[:, 2] - position[2])
+        return int(np.argmin(np.where(below, distance, np.inf)))
@@ -3,10 +3,20 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
+import numpy as np
 from utils import normalize_vector, cross_product
+from mesh_cache import mesh_cache, SPHERE_LODS
 
 CUBE_SIZE = 1.0
 PLAYER_RADIUS = 0.5
+# Share of the ground movement the player keeps while airborne
+AIR_CONTROL = 0.3
+# Players below this height start over
+FALL_LIMIT = -5
+# Contacts resolved along one step's motion before the rest is dropped
+MAX_SWEEP_CONTACTS = 4
+# Stands in for 1 / 0 on axes the sweep does not move along
+STILL_AXIS_SCALE = 1e300
 
 def normalize_vector(v):
     length = math.sqrt(v[0]**2 + v[1]**2 + v[2]**2)
@@ -25,6 +35,7 @@ class Player:
     def __init__(self, position=[0, 0, 0]):
         self.start_position = position.copy() 
         self.position = position
+        self.previous_position = position.copy()
         self.velocity = [0, 0, 0]
         self.acceleration = [0, 0, 0]
         self.radius = 0.5
@@ -57,14 +68,9 @@ class Player:
         self.current_platform = None
         self.platform_velocity = [0, 0, 0] 
 
-        self.sphere_list = glGenLists(1)
-        glNewList(self.sphere_list, GL_COMPILE)
-        quad = gluNewQuadric()
-        gluSphere(quad, self.radius, 32, 32)
-        glEndList()
-
     def reset_position(self):
         self.position = self.start_position.copy()
+        self.previous_position = self.start_position.copy()
         self.velocity = [0, 0, 0]
         self.acceleration = [0, 0, 0]
         self.grounded = False
@@ -119,8 +125,8 @@ class Player:
             movement[2] *= self.current_speed
             
             if not self.grounded:
-                movement[0] *= 0.3
-                movement[2] *= 0.3
+                movement[0] *= AIR_CONTROL
+                movement[2] *= AIR_CONTROL
                 
             self.acceleration[0] = movement[0]
             self.acceleration[2] = movement[2]
@@ -128,69 +134,159 @@ class Player:
             self.acceleration[0] = 0
             self.acceleration[2] = 0
 
-    def handle_collision(self, platforms):
+    def sweep(self, platforms, start):
+        """Move from start to the current position, stopping at boxes on the way.
+
+        Each box is grown by the player's radius and the centre's path is
+        tested against it, so the time of impact is found however far the
+        player moves in one step. The earliest contact is resolved first:
+        the motion is cut at the face it reaches, velocity into the face is
+        dropped and the rest of the motion slides on, up to
+        MAX_SWEEP_CONTACTS times. Side faces only stop the player while its
+        centre is between the box's bottom and top, as in the overlap test,
+        so low ledges are still stepped onto. Boxes the path starts inside
+        are left to the overlap test. Returns whether anything was hit.
+        """
+        reach = CUBE_SIZE + self.radius
+        bottoms = platforms[:, 1]
+        tops = bottoms + CUBE_SIZE
+        # Low and high corners of every grown box, shape (2, N, 3)
+        corners = platforms[:, 0:3] + np.array([[[-reach, -self.radius, -reach]],
+                                                 [[reach, CUBE_SIZE + self.radius, reach]]])
+
+        origin = list(start)
+        target = list(self.position)
+        hit = False
+        for _ in range(MAX_SWEEP_CONTACTS):
+            delta = [b - a for a, b in zip(origin, target)]
+            if not any(delta):
+                break
+
+            # Slab test: the fraction of the path spent within each axis'
+            # range of each box. An axis without motion spans the whole path
+            # inside the range and none of it outside.
+            scale = [1.0 / d if d else STILL_AXIS_SCALE for d in delta]
+            times = (corners - origin) * scale
+            near = times.min(axis=0)
+            enter = near.max(axis=1)
+            candidates = np.flatnonzero((enter >= 0) & (enter <= np.minimum(times.max(axis=0).min(axis=1), 1.0)))
+
+            contact = None
+            for t, i, box_near in sorted(zip(enter[candidates].tolist(), candidates.tolist(), near[candidates].tolist())):
+                # The face crossed is on the moving axis whose range was
+                # entered last; if a still axis decides, the path only grazes
+                axis = max((k for k in range(3) if delta[k]), key=box_near.__getitem__)
+                if box_near[axis] != t:
+                    continue
+                if axis != 1 and not bottoms[i] < origin[1] + delta[1] * t < tops[i]:
+                    continue
+                contact = (t, i, axis)
+                break
+            if contact is None:
+                break
+
+            t, i, axis = contact
+            origin = [a + d * t for a, d in zip(origin, delta)]
+            # Sit exactly on the face so rounding cannot leave us inside the box
+            origin[axis] = float(corners[0 if delta[axis] > 0 else 1, i, axis])
+            target[axis] = origin[axis]
+            self.velocity[axis] = 0
+            hit = True
+        else:
+            # Out of contacts with motion left that was never swept
+            target = origin
+
+        if hit:
+            self.position = target
+        return hit
+
+    def handle_collision(self, platforms, lookahead=0.016, start=None):
+        """Resolve the player sphere against an (N, 3) array of block centres.
+
+        Extra columns 3:6, when present, carry the platform velocity. With
+        start, a move from there to the current position of at least the
+        player's radius along some axis is swept first so it cannot pass
+        through a block; shorter steps cannot skip past the overlap reach.
+        The overlap test then tests all boxes in one pass at the final
+        position. Landing wins over
+        a ceiling bump, which wins over a side push; within a branch the
+        earliest contact along the vertical motion (or the deepest side
+        overlap) is resolved.
+        """
         self.grounded = False
-        old_platform = self.current_platform
         self.current_platform = None
         self.platform_velocity = [0, 0, 0]
-        
-        next_pos = [
-            self.position[0] + self.velocity[0] * 0.016,
-            self.position[1] + self.velocity[1] * 0.016,
-            self.position[2] + self.velocity[2] * 0.016
-        ]
 
-        for platform in platforms:
-            if (abs(self.position[0] - platform[0]) < CUBE_SIZE + self.radius and
-                abs(self.position[2] - platform[2]) < CUBE_SIZE + self.radius):
-
-                platform_top = platform[1] + CUBE_SIZE
-                platform_bottom = platform[1]
-
-                if (self.velocity[1] <= 0 and 
-                    self.position[1] >= platform_top and  
-                    next_pos[1] - self.radius <= platform_top): 
-                    
-                    self.position[1] = platform_top + self.radius
-                    self.velocity[1] = 0
-                    self.grounded = True
-                    self.current_platform = platform
-                    
-                    if isinstance(platform, list) and len(platform) > 3:
-                        self.platform_velocity = platform[3:]
-                    
-                    return True
-
-                elif (self.velocity[1] > 0 and  
-                      self.position[1] <= platform_bottom and  
-                      next_pos[1] + self.radius >= platform_bottom):
-                    
-                    self.position[1] = platform_bottom - self.radius
-                    self.velocity[1] = 0
-                    return True
-                
-                if self.position[1] > platform_bottom and self.position[1] < platform_top:
-                    depth_x = (CUBE_SIZE + self.radius) - abs(self.position[0] - platform[0])
-                    depth_z = (CUBE_SIZE + self.radius) - abs(self.position[2] - platform[2])
-
-                    if depth_x < depth_z:
-                        self.velocity[0] = 0
-                        if self.position[0] > platform[0]:
-                            self.position[0] = platform[0] + CUBE_SIZE + self.radius
-                        else:
-                            self.position[0] = platform[0] - CUBE_SIZE - self.radius
-                    else:
-                        self.velocity[2] = 0
-                        if self.position[2] > platform[2]:
-                            self.position[2] = platform[2] + CUBE_SIZE + self.radius
-                        else:
-                            self.position[2] = platform[2] - CUBE_SIZE - self.radius
-                    return True
-        
-        return False
+        platforms = np.asarray(platforms, dtype=float)
+        if platforms.size == 0:
+            return False
+        platforms = platforms.reshape(len(platforms), -1)
+
+        hit = False
+        if start is not None and max(abs(b - a) for a, b in zip(start, self.position)) >= self.radius:
+            hit = self.sweep(platforms, start)
+
+        px, py, pz = self.position
+        next_y = py + self.velocity[1] * lookahead
+        reach = CUBE_SIZE + self.radius
+
+        dx = px - platforms[:, 0]
+        dz = pz - platforms[:, 2]
+        overlap = (np.abs(dx) < reach) & (np.abs(dz) < reach)
+        if not overlap.any():
+            return hit
+
+        bottoms = platforms[:, 1]
+        tops = bottoms + CUBE_SIZE
+
+        if self.velocity[1] <= 0:
+            landing = overlap & (py >= tops) & (next_y - self.radius <= tops)
+            if landing.any():
+                i = np.argmax(np.where(landing, tops, -np.inf))
+                self.position[1] = float(tops[i]) + self.radius
+                self.velocity[1] = 0
+                self.grounded = True
+                self.current_platform = platforms[i]
+
+                if platforms.shape[1] >= 6:
+                    self.platform_velocity = platforms[i, 3:6].tolist()
+
+                return True
+        else:
+            ceiling = overlap & (py <= bottoms) & (next_y + self.radius >= bottoms)
+            if ceiling.any():
+                i = np.argmin(np.where(ceiling, bottoms, np.inf))
+                self.position[1] = float(bottoms[i]) - self.radius
+                self.velocity[1] = 0
+                return True
+
+        side = overlap & (py > bottoms) & (py < tops)
+        if side.any():
+            depth_x = reach - np.abs(dx)
+            depth_z = reach - np.abs(dz)
+            i = np.argmax(np.where(side, np.minimum(depth_x, depth_z), -np.inf))
+            platform = platforms[i]
+
+            if depth_x[i] < depth_z[i]:
+                self.velocity[0] = 0
+                if px > platform[0]:
+                    self.position[0] = float(platform[0]) + reach
+                else:
+                    self.position[0] = float(platform[0]) - reach
+            else:
+                self.velocity[2] = 0
+                if pz > platform[2]:
+                    self.position[2] = float(platform[2]) + reach
+                else:
+                    self.position[2] = float(platform[2]) - reach
+            return True
+
+        return hit
 
     def update(self, dt, platforms):
-        if self.position[1] < -5:
+        self.previous_position = self.position.copy()
+
+        if self.position[1] < FALL_LIMIT:
             self.reset_position()
             return
 
@@ -208,16 +304,18 @@ class Player:
             self.velocity[0] *= self.friction
             self.velocity[2] *= self.friction
             
-            self.velocity[0] += self.platform_velocity[0]
-            self.velocity[1] += self.platform_velocity[1]
-            self.velocity[2] += self.platform_velocity[2]
+            # Ride along with the platform without folding its motion into our
+            # own velocity, where friction would compound it every tick
+            self.position[0] += self.platform_velocity[0] * dt
+            self.position[1] += self.platform_velocity[1] * dt
+            self.position[2] += self.platform_velocity[2] * dt
 
-        old_pos = self.position.copy()
+        start = self.position.copy()
         self.position[0] += self.velocity[0] * dt
         self.position[1] += self.velocity[1] * dt
         self.position[2] += self.velocity[2] * dt
         
-        self.handle_collision(platforms)
+        self.handle_collision(platforms, dt, start)
         self.acceleration = [0, 0, 0]
 
     def collect_coin(self):
@@ -227,34 +325,21 @@ class Player:
             self.target_color = self.color_states[self.coins_collected].copy()
             self.glow_intensity = min(0.5, self.coins_collected * 0.1)
 
-    def draw(self):
-        glPushMatrix()
-        glTranslatef(self.position[0], self.position[1], self.position[2])
-        
-        glEnable(GL_LIGHTING)
+    def render_position(self, alpha=1.0):
+        return [p + (c - p) * alpha for p, c in zip(self.previous_position, self.position)]
+
+    def draw(self, backend, alpha=1.0, eye=None):
+        position = self.render_position(alpha)
+        detail = mesh_cache.select(SPHERE_LODS, self.radius, position, eye)
         
         ambient = [c * 0.3 for c in self.current_color]
         diffuse = self.current_color.copy()
         specular = [1.0, 1.0, 1.0, 1.0]
         
         if self.glow_intensity > 0:
-            emission = [c * self.glow_intensity for c in self.current_color]
+            emission = [c * self.glow_intensity for c in self.current_color] + [1.0]
         else:
             emission = [0.0, 0.0, 0.0, 1.0]
-            
-        glMaterialfv(GL_FRONT, GL_AMBIENT, ambient + [1.0])
-        glMaterialfv(GL_FRONT, GL_DIFFUSE, diffuse + [1.0])
-        glMaterialfv(GL_FRONT, GL_SPECULAR, specular)
-        glMaterialfv(GL_FRONT, GL_EMISSION, emission)
-        glMaterialf(GL_FRONT, GL_SHININESS, 100.0)  
-        
-        glShadeModel(GL_SMOOTH)
-        
-        quad = gluNewQuadric()
-        gluQuadricNormals(quad, GLU_SMOOTH)
-        gluQuadricTexture(quad, GL_TRUE)
-        gluSphere(quad, self.radius, 64, 64)  
-        
-        glMaterialfv(GL_FRONT, GL_EMISSION, [0.0, 0.0, 0.0, 1.0])
         
-        glPopMatrix() 
\ No newline at end of file
+        material = (ambient + [1.0], diffuse + [1.0], specular, emission, 100.0)
+        backend.draw_sphere(position, self.radius, detail, material)
\ No newline at end of file
@@ -0,0 +1,226 @@
+import numpy as np
+
+from player import AIR_CONTROL, CUBE_SIZE, FALL_LIMIT, MAX_SWEEP_CONTACTS, STILL_AXIS_SCALE, Player
+
+# Pads the per-player box lists; far enough away never to be touched
+FAR_AWAY = 1e6
+# Widens the candidate test so a player resting exactly on a face keeps the
+# box despite rounding in the box centre
+CANDIDATE_SLACK = 0.01
+
+class PlayerBatch:
+    """Steps many players together, for bots and simulated runs.
+
+    Positions, velocities, speeds, grounded flags and platform velocities
+    are held as (N, ...) arrays and each tick runs movement, gravity,
+    friction, platform carry and collision over all rows in one vectorised
+    pass. The physics and tuning are Player's, so a row moves exactly as a
+    Player given the same input would; movement comes in as world-space
+    directions rather than keys and a camera.
+    """
+
+    def __init__(self, positions):
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        count = len(positions)
+        self.count = count
+        self.start_positions = positions.copy()
+        self.positions = positions
+        self.previous = positions.copy()
+        self.velocity = np.zeros((count, 3))
+        self.acceleration = np.zeros((count, 3))
+        self.current_speed = np.zeros(count)
+        self.grounded = np.zeros(count, dtype=bool)
+        self.platform_velocity = np.zeros((count, 3))
+
+        template = Player()
+        self.radius = template.radius
+        self.jump_force = template.jump_force
+        self.max_move_speed = template.max_move_speed
+        self.acceleration_rate = template.acceleration_rate
+        self.deceleration_rate = template.deceleration_rate
+        self.friction = template.friction
+        self.gravity = template.gravity[1]
+
+    def steer(self, directions, dt):
+        """Player.update_movement for every row.
+
+        directions is (N, 3); only x and z are used and a zero row means no
+        key is held.
+        """
+        directions = np.asarray(directions, dtype=float).reshape(self.count, 3)
+        length = np.hypot(directions[:, 0], directions[:, 2])
+        moving = length > 0
+
+        self.current_speed = np.where(moving,
+                                      np.minimum(self.max_move_speed, self.current_speed + self.acceleration_rate * dt),
+                                      np.maximum(0.0, self.current_speed - self.deceleration_rate * dt))
+        scale = self.current_speed / np.where(moving, length, 1.0) * moving
+        scale = np.where(self.grounded, scale, scale * AIR_CONTROL)
+        self.acceleration[:, 0] = directions[:, 0] * scale
+        self.acceleration[:, 2] = directions[:, 2] * scale
+
+    def jump(self, mask):
+        jumping = np.asarray(mask, dtype=bool) & self.grounded
+        self.velocity[jumping, 1] = self.jump_force
+        self.grounded[jumping] = False
+
+    def candidates(self, boxes, start):
+        """Pad the boxes each player could touch into an (N, M, 6) array.
+
+        A box is kept when it is within reach of the xz span of the step
+        from start to the current position, which covers both the sweep and
+        the overlap test. Boxes keep their get_collision_boxes order so ties
+        resolve as they do for a single Player.
+        """
+        reach = CUBE_SIZE + self.radius + CANDIDATE_SLACK
+        low = np.minimum(start, self.positions) - reach
+        high = np.maximum(start, self.positions) + reach
+        near = ((boxes[:, 0] >= low[:, 0, None]) & (boxes[:, 0] <= high[:, 0, None]) &
+                (boxes[:, 2] >= low[:, 2, None]) & (boxes[:, 2] <= high[:, 2, None]))
+        rows, columns = np.nonzero(near)
+        counts = np.bincount(rows, minlength=self.count)
+
+        padded = np.zeros((self.count, max(1, counts.max(initial=0)), 6))
+        padded[:, :, 0:3] = FAR_AWAY
+        slots = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        padded[rows, slots] = boxes[columns]
+        return padded
+
+    def update(self, dt, collision_world):
+        self.previous[:] = self.positions
+        fallen = self.positions[:, 1] < FALL_LIMIT
+
+        self.acceleration[:, 1] += self.gravity
+        self.velocity += self.acceleration * dt
+
+        grounded = self.grounded
+        self.velocity[grounded, 0] *= self.friction
+        self.velocity[grounded, 2] *= self.friction
+        self.positions[grounded] += self.platform_velocity[grounded] * dt
+
+        start = self.positions.copy()
+        self.positions += self.velocity * dt
+        boxes = self.candidates(collision_world.all_boxes(), start)
+        self.handle_collision(boxes, dt, start)
+        self.acceleration[:] = 0
+
+        if fallen.any():
+            self.reset(fallen)
+
+    def reset(self, mask):
+        self.positions[mask] = self.start_positions[mask]
+        self.previous[mask] = self.start_positions[mask]
+        self.velocity[mask] = 0
+        self.acceleration[mask] = 0
+        self.grounded[mask] = False
+
+    def sweep(self, boxes, start):
+        """Player.sweep for every row against its (M, 6) slice of boxes.
+
+        As in Player.handle_collision, only rows that moved at least the
+        player's radius along some axis are swept.
+        """
+        rows = np.arange(self.count)
+        reach = CUBE_SIZE + self.radius
+        bottoms = boxes[:, :, 1]
+        tops = bottoms + CUBE_SIZE
+        # Low and high corners of every grown box, shape (2, N, M, 3)
+        corners = boxes[None, :, :, 0:3] + np.array([[[[-reach, -self.radius, -reach]]],
+                                                     [[[reach, CUBE_SIZE + self.radius, reach]]]])
+
+        origin = start.copy()
+        target = self.positions.copy()
+        hit = np.zeros(self.count, dtype=bool)
+        active = np.abs(target - origin).max(axis=1) >= self.radius
+        for _ in range(MAX_SWEEP_CONTACTS):
+            delta = target - origin
+            moving = delta != 0
+            active &= moving.any(axis=1)
+            if not active.any():
+                break
+
+            scale = np.where(moving, 1.0 / np.where(moving, delta, 1.0), STILL_AXIS_SCALE)
+            times = (corners - origin[:, None, :]) * scale[:, None, :]
+            near = times.min(axis=0)
+            enter = near.max(axis=2)
+
+            # Entry axis among the moving axes, as in Player.sweep
+            moving_near = np.where(moving[:, None, :], near, -np.inf)
+            axes = moving_near.argmax(axis=2)
+            entered = np.take_along_axis(moving_near, axes[..., None], axis=2)[..., 0] == enter
+            contact_y = origin[:, 1, None] + delta[:, 1, None] * enter
+            valid = (active[:, None] & entered & (enter >= 0) &
+                     (enter <= np.minimum(times.max(axis=0).min(axis=2), 1.0)) &
+                     ((axes == 1) | ((bottoms < contact_y) & (contact_y < tops))))
+
+            best = np.where(valid, enter, np.inf).argmin(axis=1)
+            contact = valid[rows, best]
+            if not contact.any():
+                break
+
+            players = rows[contact]
+            box = best[contact]
+            axis = axes[players, box]
+            origin[players] += delta[players] * enter[players, box][:, None]
+            face = corners[np.where(delta[players, axis] > 0, 0, 1), players, box, axis]
+            origin[players, axis] = face
+            target[players, axis] = face
+            self.velocity[players, axis] = 0
+            hit |= contact
+            active = contact
+        else:
+            # Players still colliding ran out of contacts with motion left
+            target[active] = origin[active]
+
+        self.positions[hit] = target[hit]
+
+    def handle_collision(self, boxes, lookahead, start):
+        """Player.handle_collision for every row, sweep included."""
+        self.grounded[:] = False
+        self.platform_velocity[:] = 0
+        self.sweep(boxes, start)
+
+        rows = np.arange(self.count)
+        reach = CUBE_SIZE + self.radius
+        px, py, pz = (self.positions[:, axis, None] for axis in range(3))
+        next_y = py + self.velocity[:, 1, None] * lookahead
+        bottoms = boxes[:, :, 1]
+        tops = bottoms + CUBE_SIZE
+
+        dx = px - boxes[:, :, 0]
+        dz = pz - boxes[:, :, 2]
+        overlap = (np.abs(dx) < reach) & (np.abs(dz) < reach)
+        falling = self.velocity[:, 1] <= 0
+
+        landing = overlap & falling[:, None] & (py >= tops) & (next_y - self.radius <= tops)
+        lands = landing.any(axis=1)
+        if lands.any():
+            players = rows[lands]
+            box = np.where(landing, tops, -np.inf)[lands].argmax(axis=1)
+            self.positions[players, 1] = tops[players, box] + self.radius
+            self.velocity[players, 1] = 0
+            self.grounded[players] = True
+            self.platform_velocity[players] = boxes[players, box, 3:6]
+
+        ceiling = overlap & ~falling[:, None] & (py <= bottoms) & (next_y + self.radius >= bottoms)
+        bumps = ceiling.any(axis=1)
+        if bumps.any():
+            players = rows[bumps]
+            box = np.where(ceiling, bottoms, np.inf)[bumps].argmin(axis=1)
+            self.positions[players, 1] = bottoms[players, box] - self.radius
+            self.velocity[players, 1] = 0
+
+        side = overlap & (py > bottoms) & (py < tops) & ~(lands | bumps)[:, None]
+        pushes = side.any(axis=1)
+        if pushes.any():
+            players = rows[pushes]
+            depth_x = reach - np.abs(dx[players])
+            depth_z = reach - np.abs(dz[players])
+            box = np.where(side[players], np.minimum(depth_x, depth_z), -np.inf).argmax(axis=1)
+            slot = np.arange(len(players))
+            # Push out along x when that overlap is shallower, else along z
+            axis = np.where(depth_x[slot, box] < depth_z[slot, box], 0, 2)
+            centre = boxes[players, box, axis]
+            self.velocity[players, axis] = 0
+            self.positions[players, axis] = np.where(self.positions[players, axis] > centre,
+                                                     centre + reach, centre - reach)
@@ -1,6 +1,72 @@
 import math
 from OpenGL.GL import *
-import time
+import numpy as np
+from mesh_cache import mesh_cache, DISC_LODS
+
+LAYERS = 5
+LAYER_DEPTH = 0.05
+LAYER_SHRINK = 0.15
+LAYER_TWIST = 30.0
+WOBBLE = 0.2
+
+# (emission, ambient, diffuse)
+LOCKED_MATERIAL = ((0.5, 0.0, 0.0, 1.0), (0.4, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 1.0))
+UNLOCKED_MATERIAL = ((0.3, 0.0, 0.5, 1.0), (0.2, 0.0, 0.4, 1.0), (0.5, 0.0, 1.0, 1.0))
+
+class RingGeometry:
+    """Precomputed triangle fans for the portal swirl at one segment count.
+
+    Each layer's rim radius is r + WOBBLE * sin(3a + phase). Expanding the
+    sine splits that into a fixed ring plus two wobble terms weighted by
+    cos(phase) and sin(phase), so a frame only blends three arrays and
+    twists each layer, whatever the frame rate.
+    """
+
+    def __init__(self, radius, segments):
+        angles = np.linspace(0.0, 2 * np.pi, segments + 1)
+        rim = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        self.layer_size = segments + 2
+        self.layer_starts = [layer * self.layer_size for layer in range(LAYERS)]
+
+        scales = 1.0 - np.arange(LAYERS) * LAYER_SHRINK
+        self.ring = np.zeros((LAYERS, self.layer_size, 2))
+        self.ring[:, 1:] = radius * scales[:, None, None] * rim
+        self.wobble_sin = np.zeros((self.layer_size, 2))
+        self.wobble_sin[1:] = WOBBLE * np.sin(3 * angles)[:, None] * rim
+        self.wobble_cos = np.zeros((self.layer_size, 2))
+        self.wobble_cos[1:] = WOBBLE * np.cos(3 * angles)[:, None] * rim
+        self.twist = np.radians(np.arange(LAYERS) * LAYER_TWIST)[:, None]
+
+        self.buffer = np.zeros((LAYERS, self.layer_size, 3), dtype=np.float32)
+        self.buffer[:, :, 2] = -np.arange(LAYERS)[:, None] * LAYER_DEPTH
+
+        self.locked_colors = self.fan_colors((1.0, 0.0, 0.0, 0.9), (0.5, 0.0, 0.0, 0.7))
+        self.unlocked_colors = self.fan_colors((0.5, 0.0, 1.0, 0.9), (0.0, 0.5, 1.0, 0.7))
+
+    def fan_colors(self, center, rim):
+        colors = np.empty((LAYERS, self.layer_size, 4), dtype=np.float32)
+        colors[:, :] = rim
+        colors[:, 0] = center
+        return colors
+
+    def vertices(self, rotation):
+        """Fill and return the vertex buffer for a swirl rotation in degrees."""
+        phase = math.radians(rotation)
+        ring = self.ring + math.cos(phase) * self.wobble_sin + math.sin(phase) * self.wobble_cos
+        twist = self.twist + phase
+        cos = np.cos(twist)
+        sin = np.sin(twist)
+        self.buffer[:, :, 0] = ring[:, :, 0] * cos - ring[:, :, 1] * sin
+        self.buffer[:, :, 1] = ring[:, :, 0] * sin + ring[:, :, 1] * cos
+        return self.buffer
+
+ring_geometries = {}
+
+def ring_geometry(radius, segments):
+    geometry = ring_geometries.get((radius, segments))
+    if geometry is None:
+        geometry = ring_geometries[(radius, segments)] = RingGeometry(radius, segments)
+    return geometry
 
 class Portal:
     def __init__(self, position, target_level, target_position, orientation=0):
@@ -8,86 +74,31 @@ class Portal:
         self.target_level = target_level
         self.target_position = target_position
         self.radius = 2.0  
-        self.rotation = 0  
+        self.time = 0.0
         self.rotation_speed = 180.0  
         self.orientation = orientation  
 
-    def draw(self, coins_collected=0):
-        glPushMatrix()
-        glTranslatef(self.position[0], self.position[1], self.position[2])
-        
-        glRotatef(self.orientation, 0, 1, 0)
-        
-        self.rotation += self.rotation_speed * 0.016 
-        if self.rotation >= 360:
-            self.rotation -= 360
-            
-  
-        for i in range(5):
-            depth = i * 0.05 
-            scale = 1.0 - (i * 0.15)  
-            
-            glPushMatrix()
-            glTranslatef(0, 0, -depth)
-            glRotatef(self.rotation + (i * 30), 0, 0, 1) 
-
-            if coins_collected < 5:  
-                glMaterialfv(GL_FRONT, GL_EMISSION, [0.5, 0.0, 0.0, 1.0]) 
-                glMaterialfv(GL_FRONT, GL_AMBIENT, [0.4, 0.0, 0.0, 1.0])
-                glMaterialfv(GL_FRONT, GL_DIFFUSE, [1.0, 0.0, 0.0, 1.0])
-            else:  
-                glMaterialfv(GL_FRONT, GL_EMISSION, [0.3, 0.0, 0.5, 1.0])  
-                glMaterialfv(GL_FRONT, GL_AMBIENT, [0.2, 0.0, 0.4, 1.0])
-                glMaterialfv(GL_FRONT, GL_DIFFUSE, [0.5, 0.0, 1.0, 1.0])
-            
-            glBegin(GL_TRIANGLE_FAN)
-            if coins_collected < 5:
-                glColor4f(1.0, 0.0, 0.0, 0.9) 
-            else:
-                glColor4f(0.5, 0.0, 1.0, 0.9) 
-            glVertex3f(0, 0, 0)  
-            
-            segments = 32
-            for j in range(segments + 1):
-                angle = (j / segments) * 2 * math.pi
-                r = self.radius * scale
-
-                r += 0.2 * math.sin(angle * 3 + self.rotation * math.pi / 180)
-                x = r * math.cos(angle)
-                y = r * math.sin(angle)
-
-                if coins_collected < 5:
-                    glColor4f(0.5, 0.0, 0.0, 0.7)  
-                else:
-                    glColor4f(0.0, 0.5, 1.0, 0.7)  
-                glVertex3f(x, y, 0)
-            glEnd()
-            
-            glPopMatrix()
-        
+    def update(self, dt):
+        self.time += dt
 
-        glMaterialfv(GL_FRONT, GL_EMISSION, [0.0, 0.0, 0.0, 1.0])
-        
-        glPopMatrix()
-        
-    def get_bounding_box(self):
-        return {
-            'min': self.position - np.array([self.radius, self.radius, 0.1]),
-            'max': self.position + np.array([self.radius, self.radius, 0.1])
-        }
-        
-    def check_collision(self, player):
-        portal_box = self.get_bounding_box()
-        player_box = player.get_bounding_box()
-        
-        return (
-            player_box['min'][0] <= portal_box['max'][0] and
-            player_box['max'][0] >= portal_box['min'][0] and
-            player_box['min'][1] <= portal_box['max'][1] and
-            player_box['max'][1] >= portal_box['min'][1] and
-            player_box['min'][2] <= portal_box['max'][2] and
-            player_box['max'][2] >= portal_box['min'][2]
-        )
+    @property
+    def rotation(self):
+        return (self.time * self.rotation_speed) % 360
+
+    def draw(self, backend, coins_collected=0, eye=None, time_value=None):
+        """Draw the swirl; time_value defaults to the portal's own clock."""
+        if time_value is None:
+            time_value = self.time
+        segments = mesh_cache.select(DISC_LODS, self.radius, self.position, eye)
+        geometry = ring_geometry(self.radius, segments)
+        vertices = geometry.vertices(time_value * self.rotation_speed)
+        if coins_collected < 5:
+            backend.draw_portal(self, geometry, vertices, geometry.locked_colors, LOCKED_MATERIAL)
+        else:
+            backend.draw_portal(self, geometry, vertices, geometry.unlocked_colors, UNLOCKED_MATERIAL)
         
+    def bounding_sphere(self):
+        return self.position, self.radius + WOBBLE
+
     def activate(self):
         return self.target_level, self.target_position 
\ No newline at end of file
@@ -0,0 +1,82 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+
+class FrameProfiler:
+    """Keeps the last few hundred timings of each named phase.
+
+    Every phase gets a fixed-size ring buffer, so profiling a long session
+    costs no more memory than a short one. Times are stored in seconds and
+    reported in milliseconds.
+    """
+
+    def __init__(self, capacity=600, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.buffers = {}
+        self.counts = {}
+
+    @contextmanager
+    def section(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = np.zeros(self.capacity)
+            self.counts[name] = 0
+        buffer[self.counts[name] % self.capacity] = seconds
+        self.counts[name] += 1
+
+    def samples(self, name):
+        count = min(self.counts.get(name, 0), self.capacity)
+        return self.buffers[name][:count] if count else np.empty(0)
+
+    def stats(self, name):
+        """Return (min, avg, p99) in milliseconds for a phase."""
+        samples = self.samples(name) * 1000.0
+        if not len(samples):
+            return (0.0, 0.0, 0.0)
+        return (float(samples.min()), float(samples.mean()), float(np.percentile(samples, 99)))
+
+    def summary(self):
+        rows = []
+        for name in self.buffers:
+            low, avg, p99 = self.stats(name)
+            rows.append({'phase': name, 'samples': self.counts[name],
+                         'min_ms': round(low, 4), 'avg_ms': round(avg, 4), 'p99_ms': round(p99, 4)})
+        return rows
+
+    def reset(self):
+        self.buffers = {}
+        self.counts = {}
+
+    def dump_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['phase', 'samples', 'min_ms', 'avg_ms', 'p99_ms'])
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+    def dump_json(self, path):
+        data = {
+            'capacity': self.capacity,
+            'phases': self.summary(),
+            'samples_ms': {name: (self.samples(name) * 1000.0).tolist() for name in self.buffers},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def dump(self, path):
+        if path.endswith('.json'):
+            self.dump_json(path)
+        else:
+            self.dump_csv(path)
@@ -0,0 +1,292 @@
+from abc import ABC, abstractmethod
+import ctypes
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+from mesh_cache import mesh_cache
+from texture_registry import registry
+
+VERTEX_STRIDE = 8 * 4
+
+# The light is given in eye space, as init_gl always placed it
+LIGHT_POSITION = (5, 15, 5, 1)
+LIGHT_AMBIENT = (0.4, 0.4, 0.4, 1)
+LIGHT_DIFFUSE = (1.0, 1.0, 1.0, 1)
+LIGHT_SPECULAR = (1.0, 1.0, 1.0, 1)
+SCENE_AMBIENT = (0.3, 0.3, 0.3, 1.0)
+NO_EMISSION = (0.0, 0.0, 0.0, 1.0)
+
+GROUND_Y = -20
+GROUND_HALF_SIZE = 50
+
+class RenderBackend(ABC):
+    """Everything the game draws goes through one of these.
+
+    Game objects decide what to draw (position, level of detail, material,
+    vertex arrays) and hand it to the backend, which owns the GL calls and
+    the GL objects built for them. Vertex arrays use the island layout: a
+    float32 (V, 8) array of position, normal and UV. Materials are
+    (ambient, diffuse, specular, emission, shininess).
+
+    Islands drawn by IslandRenderer use the buffer calls: create_buffer()
+    once per baked array, then per frame begin_batches(), any number of
+    bind_buffer() / bind_texture() / set_translation() / draw_arrays(), and
+    end_batches().
+
+    context_attributes lists the pygame GL attributes the backend needs
+    set before the window is created.
+    """
+
+    name = None
+    context_attributes = ()
+
+    @abstractmethod
+    def init_gl(self, fov, aspect, near, far):
+        pass
+
+    def set_clear_color(self, color):
+        glClearColor(*color)
+
+    @abstractmethod
+    def begin_frame(self, eye, target, up=(0, 1, 0)):
+        pass
+
+    @abstractmethod
+    def draw_sphere(self, position, radius, detail, material):
+        pass
+
+    @abstractmethod
+    def draw_island(self, island, offset):
+        pass
+
+    @abstractmethod
+    def prepare_coin(self, coin):
+        """Create what draw_coin() needs ahead of the first frame."""
+
+    @abstractmethod
+    def draw_coin(self, coin, segments):
+        pass
+
+    @abstractmethod
+    def draw_portal(self, portal, geometry, vertices, colors, material):
+        pass
+
+    @abstractmethod
+    def draw_ground(self, color=None):
+        pass
+
+    @abstractmethod
+    def draw_overlay(self, texture, rects, width, height):
+        """Draw screen-space rects of a texture that covers the whole window."""
+
+    @abstractmethod
+    def create_buffer(self, vertices):
+        pass
+
+    @abstractmethod
+    def delete_buffers(self, buffers):
+        pass
+
+    @abstractmethod
+    def begin_batches(self):
+        pass
+
+    @abstractmethod
+    def bind_buffer(self, buffer):
+        pass
+
+    def bind_texture(self, texture):
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+    @abstractmethod
+    def set_translation(self, offset):
+        pass
+
+    def draw_arrays(self, first, count):
+        glDrawArrays(GL_TRIANGLES, first, count)
+
+    @abstractmethod
+    def end_batches(self):
+        pass
+
+class FixedFunctionBackend(RenderBackend):
+    """The OpenGL 1.x pipeline: matrix stack, GL lighting, display lists."""
+
+    name = "fixed"
+
+    def init_gl(self, fov, aspect, near, far):
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_LIGHTING)
+        glEnable(GL_LIGHT0)
+        glEnable(GL_COLOR_MATERIAL)
+
+        glLightfv(GL_LIGHT0, GL_POSITION, LIGHT_POSITION)
+        glLightfv(GL_LIGHT0, GL_AMBIENT, LIGHT_AMBIENT)
+        glLightfv(GL_LIGHT0, GL_DIFFUSE, LIGHT_DIFFUSE)
+        glLightfv(GL_LIGHT0, GL_SPECULAR, LIGHT_SPECULAR)
+
+        glLightModelfv(GL_LIGHT_MODEL_AMBIENT, SCENE_AMBIENT)
+
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(fov, aspect, near, far)
+        glMatrixMode(GL_MODELVIEW)
+
+    def begin_frame(self, eye, target, up=(0, 1, 0)):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        gluLookAt(eye[0], eye[1], eye[2], target[0], target[1], target[2], up[0], up[1], up[2])
+
+        if registry.atlas is not None:
+            glBindTexture(GL_TEXTURE_2D, registry.atlas)
+
+    def draw_sphere(self, position, radius, detail, material):
+        ambient, diffuse, specular, emission, shininess = material
+        glPushMatrix()
+        glTranslatef(position[0], position[1], position[2])
+
+        glEnable(GL_LIGHTING)
+        glMaterialfv(GL_FRONT, GL_AMBIENT, ambient)
+        glMaterialfv(GL_FRONT, GL_DIFFUSE, diffuse)
+        glMaterialfv(GL_FRONT, GL_SPECULAR, specular)
+        glMaterialfv(GL_FRONT, GL_EMISSION, emission)
+        glMaterialf(GL_FRONT, GL_SHININESS, shininess)
+        glShadeModel(GL_SMOOTH)
+
+        glCallList(mesh_cache.sphere(radius, detail))
+
+        glMaterialfv(GL_FRONT, GL_EMISSION, NO_EMISSION)
+        glPopMatrix()
+
+    def draw_island(self, island, offset):
+        if island.display_list is None:
+            island.init_gl_resources()
+        glPushMatrix()
+        glTranslatef(*offset)
+        glCallList(island.display_list)
+        glPopMatrix()
+
+    def prepare_coin(self, coin):
+        if coin.coin_lists is None:
+            coin.init_gl_resources()
+
+    def draw_coin(self, coin, segments):
+        self.prepare_coin(coin)
+        glPushMatrix()
+        glTranslatef(coin.position[0], coin.position[1] + coin.hover_offset, coin.position[2])
+        glRotatef(coin.rotation, 0, 1, 0)
+        glRotatef(15, 1, 0, 0)
+        glCallList(coin.coin_lists[segments])
+        glPopMatrix()
+
+    def draw_portal(self, portal, geometry, vertices, colors, material):
+        emission, ambient, diffuse = material
+        glPushMatrix()
+        glTranslatef(portal.position[0], portal.position[1], portal.position[2])
+        glRotatef(portal.orientation, 0, 1, 0)
+
+        glMaterialfv(GL_FRONT, GL_EMISSION, emission)
+        glMaterialfv(GL_FRONT, GL_AMBIENT, ambient)
+        glMaterialfv(GL_FRONT, GL_DIFFUSE, diffuse)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, vertices)
+        glColorPointer(4, GL_FLOAT, 0, colors)
+        for first in geometry.layer_starts:
+            glDrawArrays(GL_TRIANGLE_FAN, first, geometry.layer_size)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        glMaterialfv(GL_FRONT, GL_EMISSION, NO_EMISSION)
+        glPopMatrix()
+
+    def draw_ground(self, color=None):
+        glPushMatrix()
+        if color is not None:
+            glColor3f(*color)
+
+        glBegin(GL_QUADS)
+        glVertex3f(-GROUND_HALF_SIZE, GROUND_Y, -GROUND_HALF_SIZE)
+        glVertex3f(-GROUND_HALF_SIZE, GROUND_Y, GROUND_HALF_SIZE)
+        glVertex3f(GROUND_HALF_SIZE, GROUND_Y, GROUND_HALF_SIZE)
+        glVertex3f(GROUND_HALF_SIZE, GROUND_Y, -GROUND_HALF_SIZE)
+        glEnd()
+        glPopMatrix()
+
+    def draw_overlay(self, texture, rects, width, height):
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, width, height, 0, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glPushAttrib(GL_ENABLE_BIT | GL_TEXTURE_BIT | GL_COLOR_BUFFER_BIT)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+
+        glBegin(GL_QUADS)
+        for rect in rects:
+            u0 = rect.left / width
+            u1 = rect.right / width
+            v0 = rect.top / height
+            v1 = rect.bottom / height
+            glTexCoord2f(u0, v0)
+            glVertex2f(rect.left, rect.top)
+            glTexCoord2f(u0, v1)
+            glVertex2f(rect.left, rect.bottom)
+            glTexCoord2f(u1, v1)
+            glVertex2f(rect.right, rect.bottom)
+            glTexCoord2f(u1, v0)
+            glVertex2f(rect.right, rect.top)
+        glEnd()
+
+        glPopAttrib()
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+    def create_buffer(self, vertices):
+        vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return vbo
+
+    def delete_buffers(self, buffers):
+        glDeleteBuffers(len(buffers), buffers)
+
+    def begin_batches(self):
+        glEnable(GL_TEXTURE_2D)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glPushMatrix()
+
+    def bind_buffer(self, buffer):
+        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(12))
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(24))
+
+    def set_translation(self, offset):
+        glPopMatrix()
+        glPushMatrix()
+        glTranslatef(*offset)
+
+    def end_batches(self):
+        glPopMatrix()
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisable(GL_TEXTURE_2D)
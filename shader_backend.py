@@ -0,0 +1,449 @@
+import ctypes
+import math
+import numpy as np
+import pygame
+from OpenGL.GL import *
+
+from render_backend import (RenderBackend, VERTEX_STRIDE, LIGHT_POSITION, LIGHT_AMBIENT, LIGHT_DIFFUSE,
+                            LIGHT_SPECULAR, SCENE_AMBIENT, NO_EMISSION, GROUND_Y, GROUND_HALF_SIZE)
+from mesh_cache import DISC_LODS, sphere_vertices
+from coin import coin_vertices
+from floating_island import FloatingIsland
+from texture_registry import registry
+
+# Vertex attribute locations
+POSITION = 0
+NORMAL = 1
+UV = 2
+COLOR = 3
+ATTRIBUTES = ((POSITION, 3, 0), (NORMAL, 3, 12), (UV, 2, 24))
+
+FRAME_BINDING = 0
+
+# One program per texture mode, after GL_TEXTURE_ENV_MODE
+NO_TEXTURE = 0
+MODULATE = 1
+REPLACE = 2
+
+WHITE = (1.0, 1.0, 1.0, 1.0)
+NO_SPECULAR = (0.0, 0.0, 0.0, 1.0)
+FULL_UV = (0.0, 0.0, 1.0, 1.0)
+
+VERTEX_SHADER = """
+#version 330 core
+
+layout(std140, row_major) uniform Frame {
+    mat4 projection;
+    mat4 view;
+    vec4 light_position;
+    vec4 light_ambient;
+    vec4 light_diffuse;
+    vec4 light_specular;
+    vec4 scene_ambient;
+};
+
+uniform mat4 model;
+uniform vec4 ambient;
+uniform vec4 diffuse;
+uniform vec4 specular;
+uniform vec4 emission;
+uniform float shininess;
+uniform int lighting;
+uniform int vertex_color;
+uniform int screen;
+uniform vec4 uv_rect;
+
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec2 uv;
+layout(location = 3) in vec4 color;
+
+out vec4 shade;
+out vec2 texcoord;
+
+void main() {
+    texcoord = mix(uv_rect.xy, uv_rect.zw, uv);
+    vec4 material_ambient = vertex_color != 0 ? color : ambient;
+    vec4 material_diffuse = vertex_color != 0 ? color : diffuse;
+    if (screen != 0) {
+        gl_Position = model * vec4(position, 1.0);
+        shade = material_diffuse;
+        return;
+    }
+
+    // Bracketed so each vertex does matrix-vector products only
+    vec4 eye_position = view * (model * vec4(position, 1.0));
+    gl_Position = projection * eye_position;
+    if (lighting == 0) {
+        shade = material_diffuse;
+        return;
+    }
+
+    // GL's per-vertex light equation for one point light and a non-local viewer
+    vec3 n = normalize(mat3(view) * (mat3(model) * normal));
+    vec3 l = normalize(light_position.xyz - eye_position.xyz);
+    float lambert = max(dot(n, l), 0.0);
+    vec3 lit = emission.rgb
+        + (scene_ambient.rgb + light_ambient.rgb) * material_ambient.rgb
+        + lambert * light_diffuse.rgb * material_diffuse.rgb;
+    if (lambert > 0.0) {
+        float highlight = max(dot(n, normalize(l + vec3(0.0, 0.0, 1.0))), 0.0);
+        lit += (shininess > 0.0 ? pow(highlight, shininess) : 1.0) * light_specular.rgb * specular.rgb;
+    }
+    shade = vec4(clamp(lit, 0.0, 1.0), material_diffuse.a);
+}
+"""
+
+# Compiled once per texture mode: a branch on a uniform would still have
+# software rasterisers fetch texels for untextured draws.
+FRAGMENT_SHADER = """
+#version 330 core
+#define TEXTURE_MODE %d
+
+uniform sampler2D image;
+
+in vec4 shade;
+in vec2 texcoord;
+
+out vec4 fragment;
+
+void main() {
+#if TEXTURE_MODE == 0
+    fragment = shade;
+#elif TEXTURE_MODE == 1
+    fragment = shade * texture(image, texcoord);
+#else
+    fragment = texture(image, texcoord);
+#endif
+}
+"""
+
+UNIFORM_SETTERS = {
+    'ambient': glUniform4f,
+    'diffuse': glUniform4f,
+    'specular': glUniform4f,
+    'emission': glUniform4f,
+    'shininess': glUniform1f,
+    'lighting': glUniform1i,
+    'vertex_color': glUniform1i,
+    'screen': glUniform1i,
+    'uv_rect': glUniform4f,
+}
+
+def compile_program(sources):
+    program = glCreateProgram()
+    shaders = []
+    for kind, source in sources:
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source)
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            raise RuntimeError(glGetShaderInfoLog(shader).decode())
+        glAttachShader(program, shader)
+        shaders.append(shader)
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(glGetProgramInfoLog(program).decode())
+    for shader in shaders:
+        glDetachShader(program, shader)
+        glDeleteShader(shader)
+    return program
+
+def perspective(fov, aspect, near, far):
+    """The matrix gluPerspective builds."""
+    f = 1.0 / math.tan(math.radians(fov) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ], dtype=np.float32)
+
+def ortho(left, right, bottom, top, near, far):
+    return np.array([
+        [2 / (right - left), 0, 0, -(right + left) / (right - left)],
+        [0, 2 / (top - bottom), 0, -(top + bottom) / (top - bottom)],
+        [0, 0, -2 / (far - near), -(far + near) / (far - near)],
+        [0, 0, 0, 1],
+    ], dtype=np.float32)
+
+def look_at(eye, target, up):
+    """The matrix gluLookAt builds."""
+    eye = np.asarray(eye, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[0, 0:3] = side
+    matrix[1, 0:3] = np.cross(side, forward)
+    matrix[2, 0:3] = -forward
+    matrix[0:3, 3] = -matrix[0:3, 0:3] @ eye
+    return matrix
+
+def translation(offset):
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[0:3, 3] = offset
+    return matrix
+
+def rotation(angle, x, y, z):
+    """The matrix glRotatef builds for an angle in degrees about a unit axis."""
+    radians = math.radians(angle)
+    c = math.cos(radians)
+    s = math.sin(radians)
+    axis = np.array([x, y, z], dtype=np.float64)
+    cross = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]], dtype=np.float64)
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[0:3, 0:3] = c * np.identity(3) + s * cross + (1 - c) * np.outer(axis, axis)
+    return matrix
+
+COIN_TILT = rotation(15, 1, 0, 0)
+
+class ShaderBackend(RenderBackend):
+    """An OpenGL 3.3 core-profile pipeline built on one shader program.
+
+    Camera and light live in a uniform block that is written once per
+    frame and shared by the programs (one per texture mode); each draw
+    only sets its model matrix and whichever material uniforms differ from
+    the last draw with the same program. Geometry lives in vertex array
+    objects: meshes are built once from the same vertex arrays the game
+    uses, and the portal swirl is streamed into its buffer every frame.
+
+    Lighting follows GL's fixed-function equation per vertex, but takes
+    materials from what the objects pass in. The fixed-function backend
+    has GL_COLOR_MATERIAL track whatever colour was set last (the ground's,
+    from the previous frame), so there the player and the islands come out
+    tinted, while here they keep their own colours.
+    """
+
+    name = "core"
+    context_attributes = (
+        (pygame.GL_CONTEXT_MAJOR_VERSION, 3),
+        (pygame.GL_CONTEXT_MINOR_VERSION, 3),
+        (pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE),
+        (pygame.GL_CONTEXT_FLAGS, pygame.GL_CONTEXT_FORWARD_COMPATIBLE_FLAG),
+    )
+
+    def __init__(self):
+        self.programs = {}
+        self.mode = None
+        self.locations = {}
+        self.values = {}
+        self.frame = np.zeros(52, dtype=np.float32)
+        self.frame_buffer = None
+        self.vertex_buffers = {}
+        self.meshes = {}
+        self.island_meshes = {}
+        self.portals = {}
+        self.ground = None
+        self.overlay = None
+
+    def init_gl(self, fov, aspect, near, far):
+        for mode in (NO_TEXTURE, MODULATE, REPLACE):
+            program = compile_program(((GL_VERTEX_SHADER, VERTEX_SHADER), (GL_FRAGMENT_SHADER, FRAGMENT_SHADER % mode)))
+            glUniformBlockBinding(program, glGetUniformBlockIndex(program, "Frame"), FRAME_BINDING)
+            self.programs[mode] = program
+            self.locations[mode] = {name: glGetUniformLocation(program, name) for name in list(UNIFORM_SETTERS) + ['model']}
+            self.values[mode] = {}
+        self.mode = None
+
+        # Frame block: projection, view, then the light and scene ambient
+        self.frame[0:16] = perspective(fov, aspect, near, far).ravel()
+        self.frame[32:52] = np.concatenate([LIGHT_POSITION, LIGHT_AMBIENT, LIGHT_DIFFUSE, LIGHT_SPECULAR, SCENE_AMBIENT])
+        self.frame_buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.frame.nbytes, self.frame, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_BINDING, self.frame_buffer)
+
+        ground = np.zeros((6, 8), dtype=np.float32)
+        ground[:, 0:3] = [(-1, 0, -1), (-1, 0, 1), (1, 0, 1), (-1, 0, -1), (1, 0, 1), (1, 0, -1)]
+        ground[:, 0:3] *= (GROUND_HALF_SIZE, 1, GROUND_HALF_SIZE)
+        ground[:, 1] = GROUND_Y
+        ground[:, 4] = 1.0
+        self.ground = self.create_buffer(ground)
+        self.overlay = self.create_buffer(np.zeros((6, 8), dtype=np.float32), GL_STREAM_DRAW)
+
+        glEnable(GL_DEPTH_TEST)
+
+    def use_program(self, mode):
+        if mode != self.mode:
+            glUseProgram(self.programs[mode])
+            self.mode = mode
+
+    def set_uniforms(self, **values):
+        """Set uniforms of the current program, skipping unchanged ones."""
+        cache = self.values[self.mode]
+        locations = self.locations[self.mode]
+        for name, value in values.items():
+            if cache.get(name) != value:
+                cache[name] = value
+                if isinstance(value, tuple):
+                    UNIFORM_SETTERS[name](locations[name], *value)
+                else:
+                    UNIFORM_SETTERS[name](locations[name], value)
+
+    def set_material(self, ambient, diffuse, specular=NO_SPECULAR, emission=NO_EMISSION, shininess=0.0):
+        self.set_uniforms(ambient=tuple(ambient), diffuse=tuple(diffuse), specular=tuple(specular),
+                          emission=tuple(emission), shininess=float(shininess))
+
+    def set_model(self, matrix):
+        glUniformMatrix4fv(self.locations[self.mode]['model'], 1, GL_TRUE, matrix)
+
+    def mesh(self, key, build):
+        """Return (vertex array, vertex count) for key, building it once."""
+        mesh = self.meshes.get(key)
+        if mesh is None:
+            vertices = build()
+            mesh = self.meshes[key] = (self.create_buffer(vertices), len(vertices))
+        return mesh
+
+    def begin_frame(self, eye, target, up=(0, 1, 0)):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.frame[16:32] = look_at(eye, target, up).ravel()
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.frame.nbytes, self.frame)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def draw_sphere(self, position, radius, detail, material):
+        vao, count = self.mesh(('sphere', radius, detail), lambda: sphere_vertices(radius, detail))
+        self.use_program(NO_TEXTURE)
+        self.set_uniforms(lighting=1, vertex_color=0)
+        self.set_material(*material)
+        self.set_model(translation(position))
+        glBindVertexArray(vao)
+        glDrawArrays(GL_TRIANGLES, 0, count)
+
+    def draw_island(self, island, offset):
+        mesh = self.island_meshes.get(island)
+        if mesh is None:
+            FloatingIsland.load_block_textures()
+            region = island.atlas_region()
+            vertices = island.build_mesh()
+            texture = registry.atlas if region else FloatingIsland.block_textures[island.block_type]
+            mesh = self.island_meshes[island] = (self.create_buffer(vertices), len(vertices), texture)
+        vao, count, texture = mesh
+        self.begin_batches()
+        self.bind_texture(texture)
+        self.bind_buffer(vao)
+        self.set_translation(offset)
+        self.draw_arrays(0, count)
+
+    def prepare_coin(self, coin):
+        if coin.texture is None:
+            coin.load_texture()
+        for _, segments in DISC_LODS:
+            self.mesh(('coin', coin.radius, segments), lambda: coin_vertices(coin.radius, segments))
+
+    def draw_coin(self, coin, segments):
+        self.prepare_coin(coin)
+        vao, count = self.meshes[('coin', coin.radius, segments)]
+        position = (coin.position[0], coin.position[1] + coin.hover_offset, coin.position[2])
+        self.use_program(REPLACE)
+        self.set_uniforms(lighting=0, vertex_color=0, uv_rect=tuple(coin.atlas_region or FULL_UV))
+        self.set_model(translation(position) @ rotation(coin.rotation, 0, 1, 0) @ COIN_TILT)
+        self.bind_texture(registry.atlas if coin.atlas_region else coin.texture)
+        glBindVertexArray(vao)
+        glDrawArrays(GL_TRIANGLES, 0, count)
+
+    def draw_portal(self, portal, geometry, vertices, colors, material):
+        buffers = self.portals.get(geometry)
+        if buffers is None:
+            vao = glGenVertexArrays(1)
+            position_buffer, color_buffer = (int(buffer) for buffer in glGenBuffers(2))
+            glBindVertexArray(vao)
+            for location, size, buffer, data in ((POSITION, 3, position_buffer, vertices), (COLOR, 4, color_buffer, colors)):
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+                glEnableVertexAttribArray(location)
+                glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, 0, None)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            buffers = self.portals[geometry] = [vao, position_buffer, color_buffer, colors]
+        vao, position_buffer, color_buffer, uploaded_colors = buffers
+
+        glBindBuffer(GL_ARRAY_BUFFER, position_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+        if uploaded_colors is not colors:
+            glBindBuffer(GL_ARRAY_BUFFER, color_buffer)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, colors.nbytes, colors)
+            buffers[3] = colors
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        emission, ambient, diffuse = material
+        self.use_program(NO_TEXTURE)
+        self.set_uniforms(lighting=1, vertex_color=1)
+        self.set_material(ambient, diffuse, emission=emission)
+        self.set_model(translation(portal.position) @ rotation(portal.orientation, 0, 1, 0))
+        # The swirl has no normal array; it faces along its local z
+        glVertexAttrib3f(NORMAL, 0.0, 0.0, 1.0)
+        glBindVertexArray(vao)
+        for first in geometry.layer_starts:
+            glDrawArrays(GL_TRIANGLE_FAN, first, geometry.layer_size)
+
+    def draw_ground(self, color=None):
+        color = WHITE if color is None else tuple(color) + (1.0,)
+        self.use_program(NO_TEXTURE)
+        self.set_uniforms(lighting=1, vertex_color=0)
+        self.set_material(color, color)
+        self.set_model(translation((0, 0, 0)))
+        glBindVertexArray(self.ground)
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+
+    def draw_overlay(self, texture, rects, width, height):
+        vertices = np.zeros((len(rects), 6, 8), dtype=np.float32)
+        for index, rect in enumerate(rects):
+            corners = ((rect.left, rect.top), (rect.left, rect.bottom), (rect.right, rect.bottom),
+                       (rect.left, rect.top), (rect.right, rect.bottom), (rect.right, rect.top))
+            vertices[index, :, 0:2] = corners
+            vertices[index, :, 6:8] = corners
+        vertices[:, :, 6] /= width
+        vertices[:, :, 7] /= height
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffers[self.overlay])
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.use_program(REPLACE)
+        self.set_uniforms(screen=1, lighting=0, vertex_color=0, uv_rect=FULL_UV)
+        self.set_model(ortho(0, width, height, 0, -1, 1))
+        self.bind_texture(texture)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glBindVertexArray(self.overlay)
+        glDrawArrays(GL_TRIANGLES, 0, len(rects) * 6)
+        glDisable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
+        self.set_uniforms(screen=0)
+
+    def create_buffer(self, vertices, usage=GL_STATIC_DRAW):
+        vao = glGenVertexArrays(1)
+        vbo = glGenBuffers(1)
+        glBindVertexArray(vao)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, usage)
+        for location, size, offset in ATTRIBUTES:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes.c_void_p(offset))
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.vertex_buffers[vao] = vbo
+        return vao
+
+    def delete_buffers(self, buffers):
+        glDeleteBuffers(len(buffers), [self.vertex_buffers.pop(vao) for vao in buffers])
+        glDeleteVertexArrays(len(buffers), buffers)
+
+    def begin_batches(self):
+        self.use_program(MODULATE)
+        self.set_uniforms(lighting=1, vertex_color=0, uv_rect=FULL_UV)
+        self.set_material(WHITE, WHITE)
+
+    def bind_buffer(self, buffer):
+        glBindVertexArray(buffer)
+
+    def set_translation(self, offset):
+        self.set_model(translation(offset))
+
+    def end_batches(self):
+        glBindVertexArray(0)
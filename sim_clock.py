@@ -0,0 +1,42 @@
+FAST_FORWARD_SCALE = 10.0
+
+class SimClock:
+    """The game's simulated time, the only clock the simulation reads.
+
+    time advances by exactly dt per simulation tick, so it is monotonic and
+    the same for every run of the same ticks. scale and paused say how fast
+    simulated time should run against real time; FixedTimestepLoop applies
+    them by running more, fewer or no ticks per frame, so the step size and
+    with it the physics never change. base_scale is the speed fast forward
+    returns to.
+    """
+
+    def __init__(self, scale=1.0):
+        self.time = 0.0
+        self.ticks = 0
+        self.base_scale = scale
+        self.scale = scale
+        self.paused = False
+
+    def tick(self, dt):
+        """Advance by one simulation step and return the new time."""
+        self.ticks += 1
+        self.time += dt
+        return self.time
+
+    def simulated(self, real_elapsed):
+        """Simulated seconds that real_elapsed seconds of wall time are worth."""
+        if self.paused:
+            return 0.0
+        return real_elapsed * self.scale
+
+    def set_scale(self, scale):
+        """Run at scale from now on and return to it after fast forward."""
+        self.base_scale = scale
+        self.scale = scale
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    def toggle_fast_forward(self, scale=FAST_FORWARD_SCALE):
+        self.scale = self.base_scale if self.scale != self.base_scale else scale
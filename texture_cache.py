@@ -0,0 +1,120 @@
+import hashlib
+import mmap
+import os
+import struct
+
+import numpy as np
+import pygame
+
+CACHE_DIR = "texture_cache"
+MAGIC = b"SKYMIPS\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIII")
+CHANNELS = {
+    'RGBA': 4,
+    'RGB': 3,
+}
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def downsample(pixels):
+    """Halve an (H, W, C) uint8 image with a 2x2 box filter.
+
+    Odd sizes drop their last row or column, as GL's mip sizes do.
+    """
+    height, width = pixels.shape[:2]
+    half_height = max(1, height // 2)
+    half_width = max(1, width // 2)
+    rows = (0, 1) if height > 1 else (0, 0)
+    columns = (0, 1) if width > 1 else (0, 0)
+    total = np.full((half_height, half_width, pixels.shape[2]), 2, dtype=np.uint16)
+    for row in rows:
+        for column in columns:
+            total += pixels[row:row + 2 * half_height:2, column:column + 2 * half_width:2]
+    return (total >> 2).astype(np.uint8)
+
+def mip_chain(pixels):
+    """Return [pixels, half, quarter, ..., 1x1]."""
+    levels = [pixels]
+    while max(levels[-1].shape[:2]) > 1:
+        levels.append(downsample(levels[-1]))
+    return levels
+
+class TextureCache:
+    """Decoded images and their mip chains, kept on disk between runs.
+
+    Entries are keyed by a hash of the source file, so an edited image is
+    decoded again and an unchanged one is only mapped back in. Pixels stay
+    in the bottom-up row order GL expects. Needs no GL context and is safe
+    to use from several threads at once. With directory=None nothing is
+    written and every image is decoded.
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".mips")
+
+    def read(self, key):
+        """Return the cached mip chain as views into the mapped file, or None."""
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), 'rb') as handle:
+                data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(data) < HEADER.size:
+            return None
+        magic, version, width, height, channels, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        levels = []
+        offset = HEADER.size
+        for _ in range(count):
+            size = width * height * channels
+            if offset + size > len(data):
+                return None
+            levels.append(np.frombuffer(data, dtype=np.uint8, count=size, offset=offset).reshape(height, width, channels))
+            offset += size
+            width = max(1, width // 2)
+            height = max(1, height // 2)
+        return levels
+
+    def write(self, key, levels):
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        height, width, channels = levels[0].shape
+        # Written aside and renamed so a reader never maps a partial file
+        temporary = f"{self.path(key)}.{os.getpid()}.{id(levels)}.tmp"
+        with open(temporary, 'wb') as handle:
+            handle.write(HEADER.pack(MAGIC, VERSION, width, height, channels, len(levels)))
+            for level in levels:
+                handle.write(np.ascontiguousarray(level).data)
+        os.replace(temporary, self.path(key))
+
+    def load(self, key, build):
+        """Return the mip chain stored under key, calling build() to make it on a miss."""
+        levels = self.read(key)
+        if levels is None:
+            levels = build()
+            self.write(key, levels)
+        return levels
+
+    def decode(self, path, fmt="RGBA"):
+        """Return the mip chain of the image at path."""
+        def build():
+            surface = pygame.image.load(path)
+            data = pygame.image.tostring(surface, fmt, 1)
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(surface.get_height(), surface.get_width(), CHANNELS[fmt])
+            return mip_chain(pixels)
+        return self.load(f"{file_hash(path)}-{fmt}", build)
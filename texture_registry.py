@@ -0,0 +1,210 @@
+import hashlib
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pygame
+from OpenGL.GL import *
+
+from texture_cache import TextureCache, file_hash, mip_chain
+
+TEXTURE_DIR = "textures"
+ATLAS_TILE_SIZE = 256
+# Smallest tile the atlas is mipmapped down to; below it the filter would
+# blend neighbouring tiles into each other.
+ATLAS_MIN_TILE_SIZE = 16
+
+GL_FORMATS = {
+    'RGBA': GL_RGBA,
+    'RGB': GL_RGB,
+}
+
+def upload_surface(surface, fmt="RGBA", filter=GL_LINEAR):
+    """Upload a pygame surface as a new GL texture and return its id."""
+    data = pygame.image.tostring(surface, fmt, 1)
+    width = surface.get_width()
+    height = surface.get_height()
+
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_FORMATS[fmt], width, height, 0, GL_FORMATS[fmt], GL_UNSIGNED_BYTE, data)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, filter)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, filter)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+
+    return texture
+
+def upload_mipmaps(levels, fmt="RGBA"):
+    """Upload a mip chain of (H, W, C) bottom-up pixel arrays with trilinear filtering."""
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    for level, pixels in enumerate(levels):
+        height, width = pixels.shape[:2]
+        glTexImage2D(GL_TEXTURE_2D, level, GL_FORMATS[fmt], width, height, 0, GL_FORMATS[fmt], GL_UNSIGNED_BYTE, pixels)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+
+    return texture
+
+def image_files(directory=TEXTURE_DIR):
+    files = sorted(f for f in os.listdir(directory) if f.endswith(('.png', '.jpg', '.jpeg')))
+    return [os.path.join(directory, filename) for filename in files]
+
+def scale_tile(pixels, tile_size):
+    """Smooth-scale (H, W, 4) pixels to a tile_size square."""
+    height, width = pixels.shape[:2]
+    surface = pygame.image.frombuffer(np.ascontiguousarray(pixels).tobytes(), (width, height), "RGBA")
+    tile = pygame.transform.smoothscale(surface, (tile_size, tile_size))
+    return np.frombuffer(pygame.image.tostring(tile, "RGBA"), dtype=np.uint8).reshape(tile_size, tile_size, 4)
+
+class TextureRegistry:
+    """Owns every GL texture in the game so each image is uploaded once.
+
+    Images are decoded into mip chains through a TextureCache. preload()
+    decodes a batch of them on a thread pool ahead of the GL uploads that
+    get() and build_atlas() do on the GL thread.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or TextureCache()
+        self.textures = {}
+        self.decoded = {}
+        self.atlas = None
+        self.atlas_regions = {}
+
+    def key(self, path, fmt):
+        return (os.path.normcase(os.path.normpath(path)), fmt)
+
+    def preload(self, paths, fmt="RGBA", workers=None):
+        """Decode images on worker threads so later get() calls only upload.
+
+        Images that fail to decode are left for get() to report.
+        """
+        pending = {}
+        for path in paths:
+            key = self.key(path, fmt)
+            if key not in self.textures and key not in self.decoded:
+                pending[key] = path
+        if not pending:
+            return
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="texture-decode") as executor:
+            futures = {key: executor.submit(self.cache.decode, path, fmt) for key, path in pending.items()}
+            for key, future in futures.items():
+                try:
+                    self.decoded[key] = future.result()
+                except (pygame.error, OSError):
+                    pass
+
+    def decode(self, path, fmt="RGBA"):
+        levels = self.decoded.get(self.key(path, fmt))
+        if levels is None:
+            levels = self.cache.decode(path, fmt)
+        return levels
+
+    def get(self, path, fmt="RGBA"):
+        """Return the shared texture id for path, decoding it on first use."""
+        key = self.key(path, fmt)
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = upload_mipmaps(self.decode(path, fmt), fmt)
+            self.textures[key] = texture
+            self.decoded.pop(key, None)
+        return texture
+
+    def add(self, path, texture, fmt="RGBA"):
+        self.textures[self.key(path, fmt)] = texture
+
+    def build_atlas(self, directory=TEXTURE_DIR, tile_size=ATLAS_TILE_SIZE):
+        """Pack every image in directory into one texture.
+
+        Each image is scaled to a tile_size square. Regions are inset by half
+        a texel so linear filtering does not bleed between tiles, and the mip
+        chain stops at ATLAS_MIN_TILE_SIZE tiles, where that inset is still
+        most of a texel. The packed chain is cached under the hashes of its
+        images.
+        """
+        paths = image_files(directory)
+        if not paths:
+            return None
+
+        columns = math.ceil(math.sqrt(len(paths)))
+        rows = math.ceil(len(paths) / columns)
+        atlas_width = columns * tile_size
+        atlas_height = rows * tile_size
+        levels = self.atlas_levels(paths, tile_size)
+
+        regions = {}
+        for i, path in enumerate(paths):
+            column = i % columns
+            row = i // columns
+            u0 = (column * tile_size + 0.5) / atlas_width
+            u1 = ((column + 1) * tile_size - 0.5) / atlas_width
+            v1 = 1.0 - (row * tile_size + 0.5) / atlas_height
+            v0 = 1.0 - ((row + 1) * tile_size - 0.5) / atlas_height
+            regions[self.key(path, "RGBA")[0]] = (u0, v0, u1, v1)
+
+        self.atlas = upload_mipmaps(levels, "RGBA")
+        self.atlas_regions = regions
+        return self.atlas
+
+    def atlas_levels(self, paths, tile_size=ATLAS_TILE_SIZE):
+        """Return the atlas mip chain for build_atlas(); needs no GL."""
+        columns = math.ceil(math.sqrt(len(paths)))
+        rows = math.ceil(len(paths) / columns)
+        atlas_width = columns * tile_size
+        atlas_height = rows * tile_size
+
+        digest = hashlib.sha256(f"{tile_size}:{ATLAS_MIN_TILE_SIZE}".encode())
+        for path in paths:
+            digest.update(f"|{os.path.basename(path)}:{file_hash(path)}".encode())
+
+        def build():
+            self.preload(paths)
+            pixels = np.zeros((atlas_height, atlas_width, 4), dtype=np.uint8)
+            for i, path in enumerate(paths):
+                levels = self.decode(path)
+                # Scale from the smallest mip that still covers the tile
+                source = levels[0]
+                for level in levels:
+                    if min(level.shape[:2]) < tile_size:
+                        break
+                    source = level
+                column = i % columns
+                row = i // columns
+                # Pixel rows run bottom-up, so row 0 of the grid is at the top
+                top = atlas_height - (row + 1) * tile_size
+                pixels[top:top + tile_size, column * tile_size:(column + 1) * tile_size] = scale_tile(source, tile_size)
+            levels = mip_chain(pixels)
+            return levels[:int(math.log2(tile_size // ATLAS_MIN_TILE_SIZE)) + 1]
+
+        return self.cache.load(f"atlas-{digest.hexdigest()}", build)
+
+    def atlas_region(self, path):
+        """Return (u0, v0, u1, v1) for path inside the atlas, or None."""
+        if self.atlas is None:
+            return None
+        return self.atlas_regions.get(self.key(path, "RGBA")[0])
+
+    def clear(self):
+        if self.textures:
+            glDeleteTextures(list(self.textures.values()))
+        if self.atlas is not None:
+            glDeleteTextures([self.atlas])
+        self.textures = {}
+        self.decoded = {}
+        self.atlas = None
+        self.atlas_regions = {}
+
+registry = TextureRegistry()
+
+def load_texture(filename, fmt="RGBA"):
+    return registry.get(filename, fmt)
@@ -1,6 +1,5 @@
 import math
-import pygame
-from OpenGL.GL import *
+from texture_registry import load_texture
 
 def normalize_vector(v):
     length = math.sqrt(v[0]**2 + v[1]**2 + v[2]**2)
@@ -14,18 +13,3 @@ def cross_product(v1, v2):
         v1[2] * v2[0] - v1[0] * v2[2],
         v1[0] * v2[1] - v1[1] * v2[0]
     ]
-
-def load_texture(filename):
-    textureSurface = pygame.image.load(filename)
-    textureData = pygame.image.tostring(textureSurface, "RGBA", 1)
-    width = textureSurface.get_width()
-    height = textureSurface.get_height()
-    
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, textureData)
-    
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    
-    return texture 
\ No newline at end of file
@@ -1,33 +1,11 @@
 from OpenGL.GL import *
-from PIL import Image
+from texture_registry import registry
 import os
 
 def load_texture(filename):
-    """Load a texture from file and return the texture ID."""
+    """Load a texture through the shared registry and return the texture ID."""
     try:
-        image = Image.open(filename)
-        image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = image.convert("RGBA").tobytes()
-        
-        width, height = image.size
-        
-        # Generate texture ID
-        texture_id = glGenTextures(1)
-        
-        # Bind texture
-        glBindTexture(GL_TEXTURE_2D, texture_id)
-        
-        # Set texture parameters
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        
-        # Upload texture data
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-        
-        return texture_id
-        
+        return registry.get(filename)
     except Exception as e:
         print(f"Error loading texture {filename}: {e}")
         return None
@@ -40,7 +18,10 @@ def load_textures(texture_dir):
     if not os.path.exists(texture_dir):
         os.makedirs(texture_dir)
         
-    # Load each texture file in the directory
+    # Decode them all in parallel first, then upload each one
+    paths = [os.path.join(texture_dir, filename) for filename in os.listdir(texture_dir)
+             if filename.endswith(('.png', '.jpg', '.jpeg'))]
+    registry.preload(paths)
     for filename in os.listdir(texture_dir):
         if filename.endswith(('.png', '.jpg', '.jpeg')):
             texture_path = os.path.join(texture_dir, filename)